@@ -1,17 +1,16 @@
-import logging
 import pycountry
-from flask import Flask
+from flask import Flask, has_request_context
 from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
-from flask_login import LoginManager
+from flask_login import LoginManager, current_user
 from flask_babel import Babel, format_date
 from config import Config
 from slugify import slugify
-
-logging.basicConfig(level=logging.DEBUG)
+import logconfig
 
 app = Flask(__name__, instance_relative_config = True)
 app.config.from_object(Config())
+logconfig.configure(app)
 
 db = SQLAlchemy(app)
 migrate = Migrate(app, db, compare_type=True, render_as_batch=True)
@@ -28,17 +27,15 @@ def load_user(user_id):
     return User.query.get(int(user_id))
 
 
-from models import Setting  # noqa
+import fragments, images, instrumentation, scaling, usersettings  # noqa
 
 def get_locale():
     """Get the selected locale from user settings."""
-    setting = Setting.query.filter(Setting.name == 'default_language').first()
-
-    if setting is not None:
-        return setting.value
+    if has_request_context():
+        return usersettings.locale(current_user)
 
-    # Return default language when none found
-    return 'en'
+    # Return default language outside of requests
+    return app.config['LANGUAGES'][0]
 
 babel.init_app(app, locale_selector=get_locale)
 
@@ -48,6 +45,24 @@ def slug(value):
     return slugify(value)
 
 
+@app.template_filter('image_url')
+def image_url(recipe, width=None, ext='jpg'):
+    """Jinja2 filter to get the url of a recipe image at least width wide."""
+    return images.url(recipe, width, ext)
+
+
+@app.template_filter('srcset')
+def image_srcset(recipe, ext='jpg'):
+    """Jinja2 filter to get the srcset of all variants of a recipe image."""
+    return images.srcset(recipe, ext)
+
+
+@app.template_filter('amount')
+def amount(value):
+    """Jinja2 filter to format an ingredient amount with fractions."""
+    return scaling.friendly(value)
+
+
 @app.template_filter('language_name')
 def language_name(value):
     """Jinja2 filter to get language object from language code."""
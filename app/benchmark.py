@@ -0,0 +1,289 @@
+"""Latency and query count benchmarks of the main routes.
+
+measure() runs a fixed set of requests through the Flask test client against
+the configured database and reports, for every scenario, latency percentiles
+in milliseconds and the number of SQL statements per request. The requests
+(recipes, search terms, filters) are drawn from the data with a seeded
+random generator, so two runs against the same database issue the same
+requests.
+
+Every distinct request is sent once as warm-up before the timed rounds, so
+the numbers are those of a running site with warm caches; with cold=True the
+fragment cache is cleared before every request instead.
+
+run() does this for several database sizes. Each size is a SQLite database
+filled by ``flask generate`` and measured in a subprocess of its own (the
+database is part of the configuration). Databases are kept between runs and
+upgraded to the current schema, so results of different commits are taken
+from the same data. Results are written as JSON, compare() lines up two of
+them.
+"""
+import json
+import logging
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+from datetime import datetime
+from app import app, db
+from slugify import slugify
+from sqlalchemy import event, func
+import fragments
+import queryplan
+import synthetic
+from models import Category, Recipe, Tag, User, recipe_tag
+
+LOGGER = logging.getLogger(__name__)
+
+PERCENTILES = (50, 90, 95, 99)
+
+# Number of distinct requests per scenario (recipes, search terms, ...)
+VARIETY = 20
+
+
+class BenchmarkError(RuntimeError):
+    pass
+
+
+class QueryCounter:
+    """Count the statements executed through the engine."""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.count = 0
+
+    def _executed(self, *args):
+        self.count += 1
+
+    def __enter__(self):
+        event.listen(self.engine, 'before_cursor_execute', self._executed)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(self.engine, 'before_cursor_execute', self._executed)
+
+
+def percentile(values, point):
+    """Return the point-th percentile (nearest rank) of sorted values."""
+    rank = max(1, -(-len(values) * point // 100))
+    return values[rank - 1]
+
+
+def summarize(latencies, queries, statuses=None):
+    """Return the statistics of a scenario as a dict."""
+    latencies = sorted(latencies)
+    summary = {'requests': len(latencies),
+               'mean_ms': round(sum(latencies) / len(latencies), 3),
+               'min_ms': round(latencies[0], 3),
+               'max_ms': round(latencies[-1], 3)}
+    for point in PERCENTILES:
+        summary['p{}_ms'.format(point)] = round(percentile(latencies, point), 3)
+    summary['queries_mean'] = round(sum(queries) / len(queries), 2)
+    summary['queries_max'] = max(queries)
+    if statuses is not None:
+        summary['statuses'] = {str(status): statuses.count(status)
+                               for status in sorted(set(statuses))}
+    return summary
+
+
+def _login(client, name, password):
+    return client.post('/login', data={'username': name, 'password': password})
+
+
+def scenarios(rng, client, user, password):
+    """Return the (name, send) pairs to measure.
+
+    send(client, round) sends the request of the given round and returns
+    the response.
+    """
+    top = db.session.query(Recipe.id).order_by(Recipe.id.desc()).limit(1).scalar()
+    if top is None:
+        raise BenchmarkError('The database holds no recipes, run flask generate first')
+    ids = rng.sample(range(1, top + 1), min(top, VARIETY * 5))
+    recipes = db.session.query(Recipe.id, Recipe.name).filter(Recipe.id.in_(ids)) \
+                        .order_by(Recipe.id).limit(VARIETY).all()
+    terms = [name.split()[1] for id, name in recipes if len(name.split()) > 1] or ['a']
+
+    categories = [name for name, in db.session.query(Category.name)
+                  .join(Recipe).group_by(Category.name)
+                  .order_by(func.count().desc()).limit(VARIETY)] or ['main']
+    tags = [name for name, in db.session.query(Tag.name)
+            .join(recipe_tag).group_by(Tag.name)
+            .order_by(func.count().desc()).limit(VARIETY)] or ['vegetarian']
+
+    cursor = client.get('/api/recipes').get_json()['next']
+
+    def get(urls):
+        return lambda client, round: client.get(urls[round % len(urls)])
+
+    def patch_profile(client, round):
+        servings = ('2', '4')[round % 2]
+        return client.patch('/profile', json={'settings': [
+            {'default_servings': servings}, {'grocery_day': 'sat'}]})
+
+    def login(client, round):
+        return _login(client, user.name, password)
+
+    return [
+        ('home', get(['/'])),
+        ('recipes', get(['/recipes'])),
+        ('recipes: category filter', get(['/recipes?category=' + name for name in categories])),
+        ('recipes: tag filter', get(['/recipes?tag=' + name for name in tags])),
+        ('recipes: query', get(['/recipes?query=' + term for term in terms])),
+        ('recipes: next page', get(['/api/recipes?after=' + cursor] if cursor else ['/api/recipes'])),
+        ('search', get(['/recipes/search?q=' + term for term in terms])),
+        ('recipe', get(['/recipes/{}/{}'.format(id, slugify(name)) for id, name in recipes])),
+        ('settings', get(['/settings'])),
+        ('profile: update settings', patch_profile),
+        ('login', login),
+    ]
+
+
+def _time(function, counter):
+    """Return the result, duration in milliseconds and statements of a call."""
+    counter.count = 0
+    start = time.perf_counter()
+    result = function()
+    return result, (time.perf_counter() - start) * 1000, counter.count
+
+
+def measure_queries(rounds, counter):
+    """Time the core queries (see queryplan.py) directly."""
+    results = {}
+    for name, query in queryplan.core_queries().items():
+        query.all()
+        latencies, queries = [], []
+        for _ in range(rounds):
+            result, duration, count = _time(query.all, counter)
+            latencies.append(duration)
+            queries.append(count)
+        db.session.rollback()
+        results[name] = summarize(latencies, queries)
+    return results
+
+
+def measure(rounds=50, seed=0, user=None, password=synthetic.PASSWORD, cold=False):
+    """Benchmark all scenarios against the configured database.
+
+    Requests are sent as user (default: the first user). Returns a dict with
+    the statistics of the routes and of the core queries.
+    """
+    app.config['WTF_CSRF_ENABLED'] = False
+    if not app.secret_key:
+        app.secret_key = 'benchmark'
+
+    rng = random.Random(seed)
+    query = User.query.filter_by(name=user) if user else User.query.order_by(User.id)
+    account = query.first()
+    if account is None:
+        raise BenchmarkError('No user to log in with, run flask generate first')
+
+    client = app.test_client()
+    if _login(client, account.name, password).status_code != 302 \
+            or client.get('/settings').status_code != 200:
+        raise BenchmarkError('Logging in as {} failed'.format(account.name))
+
+    results = {'routes': {}, 'queries': {}}
+    with QueryCounter(db.engine) as counter:
+        for name, send in scenarios(rng, client, account, password):
+            LOGGER.info("Measuring %s", name)
+            if name == 'login':
+                before = lambda: client.get('/logout')
+            elif cold and fragments.backend is not None:
+                before = fragments.backend.clear
+            else:
+                before = None
+
+            for round in range(VARIETY):
+                if before:
+                    before()
+                send(client, round)
+
+            latencies, queries, statuses = [], [], []
+            for round in range(rounds):
+                if before:
+                    before()
+                response, duration, count = _time(lambda: send(client, round), counter)
+                latencies.append(duration)
+                queries.append(count)
+                statuses.append(response.status_code)
+            results['routes'][name] = summarize(latencies, queries, statuses)
+
+        results['queries'] = measure_queries(rounds, counter)
+
+    results['data'] = {
+        'recipes': db.session.query(func.count(Recipe.id)).scalar(),
+        'users': db.session.query(func.count(User.id)).scalar(),
+    }
+    return results
+
+
+def revision():
+    """Return the current git commit of the source, or None."""
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=app.root_path,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _flask(args, database, capture=False):
+    """Run a flask command of this application against database."""
+    env = dict(os.environ, FLASK_APP='app.py',
+               SQLALCHEMY_DATABASE_URI='sqlite:///' + os.path.abspath(database))
+    env.pop('FLASK_DEBUG', None)
+    result = subprocess.run([sys.executable, '-m', 'flask'] + args, cwd=app.root_path,
+                            env=env, capture_output=True, text=True)
+    if result.returncode:
+        raise BenchmarkError('flask {} failed:\n{}{}'.format(
+            ' '.join(args), result.stdout, result.stderr))
+    return result.stdout
+
+
+def prepare(directory, size, seed=0, users=100, rebuild=False):
+    """Create (or upgrade) the database of a size, returns its path."""
+    os.makedirs(directory, exist_ok=True)
+    database = os.path.join(directory, 'benchmark-{}-{}.db'.format(size, seed))
+    if rebuild and os.path.exists(database):
+        os.remove(database)
+
+    created = not os.path.exists(database)
+    _flask(['db', 'upgrade'], database)
+    if created:
+        LOGGER.info("Generating %s recipes in %s", size, database)
+        _flask(['generate', '--seed', str(seed), '--users', str(users),
+                '--recipes', str(size)], database)
+    return database
+
+
+def run(sizes, directory, rounds=50, seed=0, users=100, rebuild=False, cold=False):
+    """Benchmark databases of several sizes, returns the results as a dict."""
+    results = {
+        'commit': revision(),
+        'created': datetime.utcnow().replace(microsecond=0).isoformat() + 'Z',
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'seed': seed,
+        'rounds': rounds,
+        'cold': cold,
+        'sizes': {},
+    }
+    for size in sizes:
+        database = prepare(directory, size, seed, users, rebuild)
+        args = ['benchmark', 'measure', '--rounds', str(rounds), '--seed', str(seed)]
+        if cold:
+            args.append('--cold')
+        LOGGER.info("Measuring %s recipes", size)
+        results['sizes'][str(size)] = json.loads(_flask(args, database))
+    return results
+
+
+def compare(base, head, statistic='p50_ms'):
+    """Yield (size, group, name, base value, head value) of two results."""
+    for size, measured in head['sizes'].items():
+        for group in ('routes', 'queries'):
+            for name, stats in measured[group].items():
+                before = base['sizes'].get(size, {}).get(group, {}).get(name, {})
+                yield size, group, name, before.get(statistic), stats.get(statistic)
@@ -1,6 +1,17 @@
-from app import app
+from app import app, db
+import json
 import os
+import time
 import click
+import benchmark
+import fulltext
+import grocerylist
+import images
+import queryplan
+import recommendations
+import sampling
+import synthetic
+import transfer
 
 
 @app.cli.group()
@@ -36,3 +47,223 @@ def init(lang):
             'pybabel init -i messages.pot -d translations -l ' + lang):
         raise RuntimeError('init command failed')
     os.remove('messages.pot')
+
+
+@app.cli.group()
+def search():
+    """Full-text search commands."""
+    pass
+
+
+@search.command('rebuild')
+def rebuild_search():
+    """Rebuild the full-text index of all recipes."""
+    with db.engine.begin() as connection:
+        fulltext.rebuild(connection)
+    click.echo('Full-text index rebuilt for {} database'.format(
+        fulltext.dialect()))
+
+
+@app.cli.group()
+def recipes():
+    """Recipe maintenance commands."""
+    pass
+
+
+@recipes.command()
+def reshuffle():
+    """Draw new random shuffle keys for all recipes."""
+    count = sampling.reshuffle(db.session)
+    db.session.commit()
+    click.echo('Reshuffled {} recipes'.format(count))
+
+
+@recipes.command()
+@click.option('--if-empty', is_flag=True,
+              help='Only when no similar recipes were computed yet.')
+def similar(if_empty):
+    """Compute the similar recipes of all recipes."""
+    if if_empty and recommendations.computed():
+        click.echo('Similar recipes were computed already')
+        return
+    recommendations.rebuild(db.session.connection())
+    db.session.commit()
+    click.echo('Similar recipes computed')
+
+
+@recipes.command('export')
+@click.argument('output', type=click.File('w', encoding='utf-8'), default='-')
+@click.option('--batch-size', default=transfer.BATCH_SIZE, show_default=True)
+def export_recipes(output, batch_size):
+    """Export all recipes as JSON Lines to OUTPUT (default: stdout)."""
+    count = transfer.export(output, batch_size)
+    click.echo('Exported {} recipes'.format(count), err=True)
+
+
+@recipes.command('import')
+@click.argument('input', type=click.Path(exists=True, dir_okay=False))
+@click.option('--batch-size', default=transfer.BATCH_SIZE, show_default=True)
+@click.option('--checkpoint', type=click.Path(dir_okay=False),
+              help='Progress file, default: INPUT.checkpoint')
+@click.option('--author', default='import', show_default=True,
+              help='Author of recipes without one.')
+@click.option('--strict', is_flag=True, help='Stop at the first invalid line.')
+def import_recipes(input, batch_size, checkpoint, author, strict):
+    """Import recipes from the JSON Lines file INPUT.
+
+    An interrupted import continues after the last committed batch when run
+    again with the same checkpoint.
+    """
+    checkpoint = checkpoint or input + '.checkpoint'
+    resumed, _ = transfer.load_checkpoint(checkpoint)
+    if resumed:
+        click.echo('Resuming after line {}'.format(resumed))
+
+    start = time.monotonic()
+    try:
+        with open(input, encoding='utf-8') as lines:
+            imported, skipped = transfer.import_(lines, checkpoint, batch_size, author, strict)
+    except transfer.InvalidRecord as e:
+        raise click.ClickException('Invalid record at {}'.format(e))
+    click.echo('Imported {} recipes in {:.1f}s ({} skipped)'.format(
+        imported, time.monotonic() - start, skipped))
+
+
+@app.cli.command()
+@click.option('--seed', default=0, show_default=True, help='Random seed.')
+@click.option('--users', 'users_count', default=100, show_default=True)
+@click.option('--recipes', 'recipes_count', default=10000, show_default=True)
+@click.option('--months', default=3, show_default=True,
+              help='Months of meal plans before today.')
+@click.option('--ratings', default=20, show_default=True,
+              help='Average number of ratings per user.')
+@click.option('--reset', is_flag=True, help='Delete all existing data first.')
+@click.option('--yes', is_flag=True, help='Don\'t ask before deleting data.')
+def generate(seed, users_count, recipes_count, months, ratings, reset, yes):
+    """Fill the database with reproducible synthetic data."""
+    if reset:
+        if not yes:
+            click.confirm('Delete all users, recipes and meals?', abort=True)
+        synthetic.reset()
+
+    start = time.monotonic()
+    created = synthetic.generate(seed, users_count, recipes_count, months, ratings)
+    click.echo('Created {} in {:.1f}s'.format(
+        ', '.join('{} {}'.format(count, name) for name, count in created.items()),
+        time.monotonic() - start))
+
+
+@app.cli.command()
+@click.option('--sql', is_flag=True, help='Print the SQL of every query.')
+def explain(sql):
+    """Show the query plans of the core queries."""
+    for name, statement, plan in queryplan.report():
+        click.secho(name, bold=True)
+        if sql:
+            click.echo(statement)
+        for row in plan:
+            click.echo('  ' + ' | '.join(str(column) for column in row))
+        click.echo()
+
+
+@app.cli.group()
+def groceries():
+    """Grocery list commands."""
+    pass
+
+
+@groceries.command('rebuild')
+def rebuild_groceries():
+    """Recompute all grocery lists and report drift."""
+    for user_id in grocerylist.users():
+        drift = grocerylist.drift(user_id)
+        if drift:
+            click.echo('User {}: {} ingredient(s) drifted'.format(
+                user_id or 'household', len(drift)))
+            for ingredient_id, (stored, expected) in sorted(drift.items()):
+                click.echo('  ingredient {}: {} != {}'.format(
+                    ingredient_id, stored, expected))
+        grocerylist.rebuild(user_id)
+    db.session.commit()
+    click.echo('Grocery lists rebuilt')
+
+
+@app.cli.group('images')
+def images_():
+    """Recipe image commands."""
+    pass
+
+
+@images_.command('gc')
+@click.option('--grace', default=3600, show_default=True,
+              help='Keep files younger than this many seconds.')
+@click.option('--dry-run', is_flag=True, help='Only list the files to remove.')
+def collect_images(grace, dry_run):
+    """Remove image files no recipe refers to."""
+    removed = images.collect(grace, dry_run)
+    for name in removed:
+        click.echo(name)
+    click.echo('{} {} orphaned file(s)'.format(
+        'Found' if dry_run else 'Removed', len(removed)))
+
+
+@app.cli.group('benchmark')
+def benchmark_():
+    """Latency and query count benchmarks."""
+    pass
+
+
+@benchmark_.command('run')
+@click.option('--sizes', default='1000,10000', show_default=True,
+              help='Comma separated numbers of recipes.')
+@click.option('--rounds', default=50, show_default=True, help='Timed requests per scenario.')
+@click.option('--seed', default=0, show_default=True, help='Random seed.')
+@click.option('--users', default=100, show_default=True)
+@click.option('--data-dir', type=click.Path(file_okay=False),
+              help='Directory of the databases, default: instance/benchmark')
+@click.option('--rebuild', is_flag=True, help='Generate the databases again.')
+@click.option('--cold', is_flag=True, help='Clear the fragment cache before every request.')
+@click.option('--output', type=click.File('w'), default='-', help='JSON result file.')
+def run_benchmark(sizes, rounds, seed, users, data_dir, rebuild, cold, output):
+    """Benchmark all routes on generated databases of several sizes."""
+    sizes = [int(size) for size in sizes.split(',')]
+    data_dir = data_dir or os.path.join(app.instance_path, 'benchmark')
+    try:
+        results = benchmark.run(sizes, data_dir, rounds, seed, users, rebuild, cold)
+    except benchmark.BenchmarkError as e:
+        raise click.ClickException(str(e))
+    json.dump(results, output, indent=2)
+    output.write('\n')
+
+
+@benchmark_.command('measure')
+@click.option('--rounds', default=50, show_default=True, help='Timed requests per scenario.')
+@click.option('--seed', default=0, show_default=True, help='Random seed.')
+@click.option('--user', help='User to log in as, default: the first.')
+@click.option('--password', default=synthetic.PASSWORD, show_default=True)
+@click.option('--cold', is_flag=True, help='Clear the fragment cache before every request.')
+def measure_benchmark(rounds, seed, user, password, cold):
+    """Benchmark all routes on the configured database, prints JSON."""
+    try:
+        results = benchmark.measure(rounds, seed, user, password, cold)
+    except benchmark.BenchmarkError as e:
+        raise click.ClickException(str(e))
+    click.echo(json.dumps(results, indent=2))
+
+
+@benchmark_.command('compare')
+@click.argument('base', type=click.File())
+@click.argument('head', type=click.File())
+@click.option('--statistic', default='p50_ms', show_default=True,
+              help='Statistic to compare, e.g. p95_ms or queries_mean.')
+def compare_benchmark(base, head, statistic):
+    """Compare the results of two benchmark runs."""
+    base, head = json.load(base), json.load(head)
+    click.echo('{} -> {} ({})'.format(base.get('commit'), head.get('commit'), statistic))
+    for size, group, name, before, after in benchmark.compare(base, head, statistic):
+        if before and after is not None:
+            change = '{:+.1f}%'.format((after - before) / before * 100)
+        else:
+            change = ''
+        click.echo('{:>8} {:<8} {:<36} {:>10} {:>10} {:>8}'.format(
+            size, group, name, str(before), str(after), change))
@@ -0,0 +1,79 @@
+"""HTTP conditional GET.
+
+Views derive a weak ETag from a few cheap values (update times, versions,
+counts, the request arguments) before querying or rendering anything::
+
+    tag = conditional.etag(recipe.id, recipe.version)
+    response = conditional.not_modified(tag, recipe.updated_at)
+    if response:
+        return response
+    ...
+    return conditional.validated(render_template(...), tag, recipe.updated_at)
+
+Tags always include the current user and locale. Responses are private and
+must be revalidated on every use, so a 304 is the only thing ever served
+from a browser cache.
+"""
+import hashlib
+import os
+from app import app
+from flask import g, make_response, request, session
+from flask_babel import get_locale
+from flask_login import current_user
+
+# Part of every tag, changes whenever templates or scripts are deployed
+_RELEASE = app.config['RELEASE'] or max(
+    (entry.stat().st_mtime for folder in ('templates', 'static/scripts')
+     for entry in os.scandir(os.path.join(app.root_path, folder))), default=0)
+
+
+def etag(*values):
+    """Return an ETag for the given values."""
+    values += (_RELEASE, current_user.get_id(), str(get_locale()))
+    return hashlib.sha1(repr(values).encode()).hexdigest()
+
+
+def _flashing():
+    """Check whether the response shows flashed messages.
+
+    Rendering pops the messages from the session, so the outcome of the
+    first check in a request is kept.
+    """
+    if 'flashing' not in g:
+        g.flashing = bool(session.get('_flashes'))
+    return g.flashing
+
+
+def not_modified(tag, last_modified=None):
+    """Return a 304 response if the client holds the current representation.
+
+    The ETag is compared first, Last-Modified is only used when the client
+    sent no If-None-Match. Returns None when the response must be built.
+    """
+    if request.method not in ('GET', 'HEAD') or _flashing():
+        return None
+
+    if request.if_none_match:
+        fresh = request.if_none_match.contains_weak(tag)
+    elif last_modified is not None and request.if_modified_since:
+        fresh = last_modified.replace(microsecond=0) <= request.if_modified_since.replace(tzinfo=None)
+    else:
+        fresh = False
+
+    if not fresh:
+        return None
+    return validated(make_response('', 304), tag, last_modified)
+
+
+def validated(response, tag, last_modified=None):
+    """Add the validators and cache headers to a response."""
+    response = make_response(response)
+    if _flashing():
+        return response
+
+    response.set_etag(tag, weak=True)
+    if last_modified is not None:
+        response.last_modified = last_modified
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response
@@ -8,9 +8,67 @@ class Config:
 
     UPLOAD_FOLDER = 'static/food/'
     ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif'}
+
+    # Recipe image variants (comma separated widths in pixels), their JPEG
+    # and WebP quality and the number of processing threads
+    IMAGE_WIDTHS = '320,640,1280'
+    IMAGE_QUALITY = 80
+    IMAGE_WORKERS = 2
     
     LANGUAGES = ['en', 'nl']
 
+    # Per process cache of user settings (number of users, seconds)
+    SETTINGS_CACHE_SIZE = 1024
+    SETTINGS_CACHE_TTL = 60
+
+    # Per process cache of collection statistics (seconds)
+    STATS_CACHE_TTL = 300
+
+    # Per process cache of recipe ingredients scaled to other servings
+    # (entries, seconds)
+    SCALING_CACHE_SIZE = 4096
+    SCALING_CACHE_TTL = 3600
+
+    # Seconds before the per process copy of the unit table is read again
+    UNITS_CACHE_TTL = 300
+
+    # Cache of rendered recipe fragments: 'memory' (per process),
+    # 'sqlite:///<path>' (shared by processes) or '' (disabled)
+    FRAGMENT_CACHE = 'memory'
+    FRAGMENT_CACHE_SIZE = 4096
+    FRAGMENT_CACHE_TTL = 24 * 3600
+
+    # Release identifier, part of all HTTP validators (default: modification
+    # time of the templates and scripts)
+    RELEASE = ''
+
+    # Level of all loggers and per logger levels ('views=DEBUG,...'), output
+    # to stderr or LOG_FILE as 'text' or 'json', written by a background
+    # thread unless LOG_ASYNC is empty (see logconfig.py)
+    LOG_LEVEL = 'INFO'
+    LOG_LEVELS = ''
+    LOG_FORMAT = 'text'
+    LOG_FILE = ''
+    LOG_ASYNC = '1'
+
+    # Opt-in request instrumentation: Server-Timing header, a log line per
+    # request, /metrics (see instrumentation.py). Requests slower than
+    # INSTRUMENTATION_SLOW_REQUEST seconds log their slowest statements.
+    INSTRUMENTATION = ''
+    INSTRUMENTATION_SLOW_QUERIES = 3
+    INSTRUMENTATION_SLOW_REQUEST = 0.5
+
+    # /metrics answers requests with 'Authorization: Bearer <METRICS_TOKEN>'
+    # and from the comma separated addresses of METRICS_ALLOW
+    METRICS_TOKEN = ''
+    METRICS_ALLOW = '127.0.0.1,::1'
+
+    # Comma separated path prefixes of requests to profile at PROFILE_RATE
+    # (fraction of the requests), profiles go to PROFILE_FOLDER in instance/
+    PROFILE_PATHS = ''
+    PROFILE_RATE = 0.01
+    PROFILE_FOLDER = 'profiles'
+
     def __init__(self):
         for name, var in os.environ.items():
             if hasattr(Config, name):
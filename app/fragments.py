@@ -0,0 +1,154 @@
+"""Cache of rendered template fragments.
+
+Templates wrap the expensive parts of a recipe in a call block::
+
+    {% call fragment('card', recipe) %} ... {% endcall %}
+
+The rendered HTML is stored under the fragment name, the recipe id, its
+version, the locale and an optional variant (e.g. the servings shown). Every flush which changes a recipe, its ingredient
+listing or tags, or renames one of its tags, ingredients or its category
+increments the version of the recipe (see models.touch), so a stale
+fragment is never looked up again and simply ages out of the cache. As the
+version comes from the database, this holds for every process sharing it,
+whatever the backend.
+
+The backend is chosen by FRAGMENT_CACHE: ``memory`` is an LRU per process,
+``sqlite:///<path>`` a file shared by all processes of a host (e.g. the uWSGI
+workers), an empty value disables the cache.
+"""
+import logging
+import sqlite3
+import threading
+import time
+from app import app
+from cache import TTLCache
+from flask import g, has_request_context
+from flask_babel import get_locale
+from markupsafe import Markup
+
+LOGGER = logging.getLogger(__name__)
+
+
+class SQLiteBackend:
+    """Fragment store in a SQLite file, shared by the processes of a host.
+
+    Entries expire after ttl seconds, beyond maxsize entries the oldest are
+    removed. Errors are logged and handled as cache misses.
+    """
+
+    # Number of writes between removing expired and surplus entries
+    PURGE_INTERVAL = 256
+
+    def __init__(self, path, maxsize=8192, ttl=None):
+        self.path = path
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._local = threading.local()
+        self._writes = 0
+
+    def _connection(self):
+        """Return the connection of the current thread."""
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            connection.execute('CREATE TABLE IF NOT EXISTS fragment ('
+                               'key TEXT PRIMARY KEY, value TEXT NOT NULL, '
+                               'stored REAL NOT NULL, expires REAL)')
+            self._local.connection = connection
+        return connection
+
+    def get(self, key, default=None):
+        try:
+            row = self._connection().execute(
+                'SELECT value FROM fragment WHERE key = ? '
+                'AND (expires IS NULL OR expires > ?)', (key, time.time())).fetchone()
+        except sqlite3.Error:
+            LOGGER.exception("Reading fragment %s failed", key)
+            return default
+        return row[0] if row else default
+
+    def set(self, key, value):
+        now = time.time()
+        expires = now + self.ttl if self.ttl is not None else None
+        try:
+            connection = self._connection()
+            connection.execute('INSERT OR REPLACE INTO fragment (key, value, stored, expires) '
+                               'VALUES (?, ?, ?, ?)', (key, value, now, expires))
+            self._writes += 1
+            if self._writes % self.PURGE_INTERVAL == 0:
+                self.purge(connection, now)
+        except sqlite3.Error:
+            LOGGER.exception("Storing fragment %s failed", key)
+
+    def purge(self, connection, now):
+        """Remove expired entries and the oldest beyond maxsize."""
+        connection.execute('DELETE FROM fragment WHERE expires <= ?', (now,))
+        connection.execute('DELETE FROM fragment WHERE key IN (SELECT key FROM fragment '
+                           'ORDER BY stored DESC LIMIT -1 OFFSET ?)', (self.maxsize,))
+
+    def delete(self, key):
+        try:
+            self._connection().execute('DELETE FROM fragment WHERE key = ?', (key,))
+        except sqlite3.Error:
+            LOGGER.exception("Deleting fragment %s failed", key)
+
+    def clear(self):
+        try:
+            self._connection().execute('DELETE FROM fragment')
+        except sqlite3.Error:
+            LOGGER.exception("Clearing fragments failed")
+
+
+def create_backend(url, maxsize, ttl):
+    """Create the backend configured by url (None: caching disabled)."""
+    if not url:
+        return None
+    if url == 'memory':
+        return TTLCache(maxsize, ttl)
+    if url.startswith('sqlite:///'):
+        return SQLiteBackend(url[len('sqlite:///'):], maxsize, ttl)
+    raise ValueError('Unknown fragment cache backend: {}'.format(url))
+
+
+backend = create_backend(app.config['FRAGMENT_CACHE'],
+                         int(app.config['FRAGMENT_CACHE_SIZE']),
+                         int(app.config['FRAGMENT_CACHE_TTL']))
+
+
+def key(name, recipe, variant=None):
+    """Return the cache key of a fragment of recipe."""
+    locale = get_locale() if has_request_context() else None
+    fragment_key = '{}:{}:{}:{}'.format(name, recipe.id, recipe.version, locale)
+    if variant is not None:
+        fragment_key += ':{}'.format(variant)
+    return fragment_key
+
+
+def get(name, recipe, variant=None):
+    """Return the cached HTML of a fragment, or None.
+
+    Lookups are remembered for the rest of the request, so checking a
+    fragment in a view before rendering it costs nothing extra.
+    """
+    if backend is None:
+        return None
+    fragment_key = key(name, recipe, variant)
+    if has_request_context():
+        seen = g.setdefault('fragments', {})
+        if fragment_key not in seen:
+            seen[fragment_key] = backend.get(fragment_key)
+        return seen[fragment_key]
+    return backend.get(fragment_key)
+
+
+@app.template_global()
+def fragment(name, recipe, variant=None, caller=None):
+    """Render the body of a call block at most once per recipe version."""
+    html = get(name, recipe, variant)
+    if html is None:
+        html = str(caller())
+        if backend is not None:
+            backend.set(key(name, recipe, variant), html)
+    return Markup(html)
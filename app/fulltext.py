@@ -0,0 +1,214 @@
+"""Full-text search over recipes.
+
+The index covers the recipe name, intro, description and directions together
+with the names of its tags and ingredients. SQLite uses an FTS5 virtual table
+ranked with bm25, MySQL a shadow table with a FULLTEXT index. Other databases
+fall back to plain ``LIKE`` matching on the recipe and ingredient names.
+
+The index is kept in sync by session events: every flush which touches a
+recipe (or renames a tag or ingredient) re-indexes the affected recipes inside
+the same transaction.
+"""
+import logging
+import re
+from app import db
+from sqlalchemy import bindparam, event, inspect, or_, text, Float, Integer
+from sqlalchemy.sql import column, literal
+from models import Recipe, RecipeIngredient, Ingredient, touched_recipe_ids
+
+LOGGER = logging.getLogger(__name__)
+
+SQLITE_TABLE = 'recipe_fts'
+MYSQL_TABLE = 'recipe_search'
+
+# Relative bm25 weights of the indexed columns (SQLite only)
+WEIGHTS = {
+    'name': 10.0,
+    'intro': 2.0,
+    'description': 1.0,
+    'directions': 1.0,
+    'tags': 5.0,
+    'ingredients': 5.0,
+}
+
+_SQLITE_CREATE = """
+CREATE VIRTUAL TABLE IF NOT EXISTS recipe_fts USING fts5(
+    name, intro, description, directions, tags, ingredients,
+    tokenize = 'unicode61 remove_diacritics 2',
+    prefix = '2 3'
+)"""
+
+_SQLITE_DELETE = "DELETE FROM recipe_fts WHERE rowid IN :ids"
+
+_SQLITE_INSERT = """
+INSERT INTO recipe_fts (rowid, name, intro, description, directions, tags, ingredients)
+SELECT r.id, r.name, r.intro, r.description, r.directions,
+       (SELECT group_concat(t.name, ' ') FROM recipe_tag rt
+          JOIN tag t ON t.id = rt.tag_id WHERE rt.recipe_id = r.id),
+       (SELECT group_concat(i.name, ' ') FROM recipe_ingredient ri
+          JOIN ingredient i ON i.id = ri.ingredient_id WHERE ri.recipe_id = r.id)
+FROM recipe r"""
+
+_SQLITE_MATCH = """
+SELECT rowid AS id, bm25(recipe_fts, {weights}) AS score
+FROM recipe_fts WHERE recipe_fts MATCH :match"""
+
+_MYSQL_CREATE = """
+CREATE TABLE IF NOT EXISTS recipe_search (
+    recipe_id INTEGER NOT NULL PRIMARY KEY,
+    name VARCHAR(128), intro TEXT, description TEXT, directions TEXT,
+    tags TEXT, ingredients TEXT,
+    FULLTEXT KEY recipe_search_fulltext
+        (name, intro, description, directions, tags, ingredients)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4"""
+
+_MYSQL_DELETE = "DELETE FROM recipe_search WHERE recipe_id IN :ids"
+
+_MYSQL_INSERT = """
+INSERT INTO recipe_search (recipe_id, name, intro, description, directions, tags, ingredients)
+SELECT r.id, r.name, r.intro, r.description, r.directions,
+       (SELECT GROUP_CONCAT(t.name SEPARATOR ' ') FROM recipe_tag rt
+          JOIN tag t ON t.id = rt.tag_id WHERE rt.recipe_id = r.id),
+       (SELECT GROUP_CONCAT(i.name SEPARATOR ' ') FROM recipe_ingredient ri
+          JOIN ingredient i ON i.id = ri.ingredient_id WHERE ri.recipe_id = r.id)
+FROM recipe r"""
+
+_MYSQL_MATCH = """
+SELECT recipe_id AS id,
+       -MATCH (name, intro, description, directions, tags, ingredients)
+        AGAINST (:match IN BOOLEAN MODE) AS score
+FROM recipe_search
+WHERE MATCH (name, intro, description, directions, tags, ingredients)
+      AGAINST (:match IN BOOLEAN MODE)"""
+
+_available = {}
+
+
+def dialect(bind=None):
+    """Return the name of the dialect of the given (or default) bind."""
+    return (bind or db.engine).dialect.name
+
+
+def terms(query):
+    """Split a user query into plain word terms."""
+    return re.findall(r'\w+', query or '', re.UNICODE)
+
+
+def available(bind=None):
+    """Check whether the full-text index exists for the current database."""
+    bind = bind or db.engine
+    key = str(bind.engine.url)
+    if key not in _available:
+        table = {'sqlite': SQLITE_TABLE, 'mysql': MYSQL_TABLE}.get(dialect(bind))
+        _available[key] = table in inspect(bind).get_table_names()
+    return _available[key]
+
+
+def create(bind):
+    """Create the full-text index table (no-op when it already exists)."""
+    name = dialect(bind)
+    if name == 'sqlite':
+        bind.execute(text(_SQLITE_CREATE))
+    elif name == 'mysql':
+        bind.execute(text(_MYSQL_CREATE))
+    else:
+        LOGGER.info("No full-text index support for %s, using LIKE search", name)
+        return
+    _available[str(bind.engine.url)] = True
+
+
+def drop(bind):
+    """Drop the full-text index table."""
+    table = {'sqlite': SQLITE_TABLE, 'mysql': MYSQL_TABLE}.get(dialect(bind))
+    if table is not None:
+        bind.execute(text('DROP TABLE IF EXISTS {}'.format(table)))
+    _available.pop(str(bind.engine.url), None)
+
+
+def rebuild(bind):
+    """Drop, create and fill the full-text index for all recipes."""
+    drop(bind)
+    create(bind)
+    name = dialect(bind)
+    if name == 'sqlite':
+        bind.execute(text(_SQLITE_INSERT))
+    elif name == 'mysql':
+        bind.execute(text(_MYSQL_INSERT))
+
+
+def reindex(bind, ids):
+    """Refresh the index rows of the recipes with given ids.
+
+    Ids of deleted recipes are removed from the index.
+    """
+    ids = sorted(i for i in ids if i is not None)
+    if not ids or not available(bind):
+        return
+
+    if dialect(bind) == 'sqlite':
+        delete, insert = _SQLITE_DELETE, _SQLITE_INSERT
+    else:
+        delete, insert = _MYSQL_DELETE, _MYSQL_INSERT
+
+    ids_param = bindparam('ids', expanding=True)
+    bind.execute(text(delete).bindparams(ids_param), ids=ids)
+    bind.execute(text(insert + " WHERE r.id IN :ids").bindparams(ids_param), ids=ids)
+
+
+def ranked(query):
+    """Return a selectable with (id, score) rows of recipes matching query.
+
+    Lower scores are better matches. Every term must match, where the last
+    characters of a term may be missing to support type-ahead searches.
+    Returns None when the query holds no searchable terms.
+    """
+    words = terms(query)
+    if not words:
+        return None
+
+    name = dialect()
+    if available() and name == 'sqlite':
+        match = ' '.join('"{}"*'.format(w) for w in words)
+        weights = ', '.join(str(w) for w in WEIGHTS.values())
+        sql = text(_SQLITE_MATCH.format(weights=weights))
+    elif available() and name == 'mysql':
+        match = ' '.join('+{}*'.format(w) for w in words)
+        sql = text(_MYSQL_MATCH)
+    else:
+        return _like(words)
+
+    return sql.bindparams(match=match) \
+              .columns(column('id', Integer), column('score', Float)) \
+              .alias('hits')
+
+
+def _like(words):
+    """Fallback matching on recipe and ingredient names without ranking."""
+    clauses = []
+    for word in words:
+        pattern = '%{}%'.format(word)
+        clauses.append(or_(
+            Recipe.name.ilike(pattern),
+            Recipe.ingredients.any(RecipeIngredient.ingredient.has(
+                Ingredient.name.ilike(pattern)))
+        ))
+
+    return db.session.query(Recipe.id.label('id'),
+                            literal(0.0, Float).label('score')) \
+                     .filter(*clauses).subquery('hits')
+
+
+@event.listens_for(db.session, 'after_flush')
+def _collect(session, flush_context):
+    """Remember which recipes need re-indexing after this flush."""
+    ids = touched_recipe_ids(session)
+    if ids:
+        session.info.setdefault('fulltext_ids', set()).update(ids)
+
+
+@event.listens_for(db.session, 'after_flush_postexec')
+def _reindex(session, flush_context):
+    """Re-index touched recipes within the flushing transaction."""
+    ids = session.info.pop('fulltext_ids', None)
+    if ids:
+        reindex(session.connection(), ids)
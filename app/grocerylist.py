@@ -0,0 +1,321 @@
+"""Grocery list aggregation.
+
+All ingredients of the meals planned in a date window are summed per
+ingredient in a single GROUP BY query. The amount of every ingredient is
+scaled from the recipe's servings to the servings of the meal, following
+the scaling factor of the ingredient listing: with a scaling of 1 the amount
+grows linearly with the servings, with a scaling of 0.5 doubling the
+servings only adds half of the original amount. Pantry items are left out.
+
+Besides lists for arbitrary windows, every user has a materialized grocery
+list in the Grocery table covering all upcoming meals, with a row per
+ingredient and meal day. Session events apply the difference of every added,
+removed or changed meal to the affected rows, and of every ingredient moved
+in or out of the pantry. Reading the list is a single indexed select which
+leaves out the days past, so meals eaten drop off without a recompute.
+rebuild() recomputes the lists from scratch, which also removes the rows of
+past days.
+
+Lists show ingredients of the same name once: amounts of compatible units
+are converted and summed by the database (see units.py).
+"""
+import logging
+from collections import defaultdict, namedtuple
+from datetime import date, datetime, timedelta
+import units
+import usersettings
+from app import db
+from sqlalchemy import event, func, inspect, literal, select
+from models import Grocery, Ingredient, Meal, Recipe, RecipeIngredient
+
+LOGGER = logging.getLogger(__name__)
+
+# Number of days covered by a grocery list by default
+WINDOW_DAYS = 7
+
+# Row of a grocery list, manual items have no ingredient id or unit
+Item = namedtuple('Item', 'id name amount unit')
+
+
+def default_window(today=None):
+    """Return the (start, end) dates of the default grocery list window."""
+    start = today or date.today()
+    return start, start + timedelta(days=WINDOW_DAYS)
+
+
+def servings(default_servings=None, meal_servings=Meal.servings):
+    """Expression for the servings of a meal.
+
+    Meals without servings use the given default, or the recipe's servings
+    when there is no default.
+    """
+    if default_servings is None:
+        return func.coalesce(meal_servings, Recipe.servings)
+    return func.coalesce(meal_servings, literal(default_servings), Recipe.servings)
+
+
+def scaled_amount(meal_servings):
+    """Expression for the amount of an ingredient scaled to meal_servings."""
+    ratio = meal_servings * 1.0 / Recipe.servings
+    scaling = func.coalesce(RecipeIngredient.scaling, 1.0)
+    return RecipeIngredient.amount * (1 + scaling * (ratio - 1))
+
+
+def aggregate(user_id, start, end, default_servings=None):
+    """Return the grocery list for the meals of a user and the household
+    planned from start until end (user None: only the household).
+
+    Returns a list of Items sorted by ingredient name, the id is the lowest
+    id of the ingredients summed.
+    """
+    owner = Meal.user_id.is_(None)
+    if user_id is not None:
+        owner = (Meal.user_id == user_id) | owner
+    query = db.session.query(Ingredient.id) \
+                      .select_from(Meal) \
+                      .join(Recipe, Meal.recipe_id == Recipe.id) \
+                      .join(RecipeIngredient, RecipeIngredient.recipe_id == Recipe.id) \
+                      .join(Ingredient, RecipeIngredient.ingredient_id == Ingredient.id) \
+                      .filter(owner, Meal.day >= start, Meal.day < end) \
+                      .filter(Ingredient.pantry.is_(False)) \
+                      .order_by(Ingredient.name)
+    return [Item(*row) for row in units.convert_sum(
+        query, scaled_amount(servings(default_servings)), Ingredient.unit,
+        [Ingredient.name], [func.min(Ingredient.id), Ingredient.name])]
+
+
+def default_servings(user_id):
+    """Return the default servings setting of a user as number."""
+    try:
+        return int(usersettings.effective(user_id)['default_servings'])
+    except (TypeError, ValueError):
+        return None
+
+
+def _owner(user_id):
+    """Condition selecting the grocery rows of a user (None: household)."""
+    if user_id is None:
+        return Grocery.user_id.is_(None)
+    return Grocery.user_id == user_id
+
+
+def listing(user_id):
+    """Return the materialized grocery list of a user.
+
+    Household items (without user) are included. Returns a list of Items
+    sorted by name.
+    """
+    name = func.coalesce(Ingredient.name, Grocery.name)
+    today = datetime.combine(date.today(), datetime.min.time())
+    query = db.session.query(Grocery.id) \
+                      .outerjoin(Ingredient, Grocery.ingredient_id == Ingredient.id) \
+                      .filter((Grocery.user_id == user_id) | Grocery.user_id.is_(None)) \
+                      .filter(Grocery.day.is_(None) | (Grocery.day >= today)) \
+                      .order_by(name)
+    return [Item(*row) for row in units.convert_sum(
+        query, Grocery.amount, Ingredient.unit,
+        [name], [func.min(Grocery.ingredient_id), name])]
+
+
+def _upcoming(user_id, ingredient_ids=None):
+    """Query (ingredient id, day, amount) for all upcoming meals of a user,
+    optionally of the given ingredients only."""
+    amount = func.sum(scaled_amount(servings(default_servings(user_id))))
+    owner = Meal.user_id.is_(None) if user_id is None else Meal.user_id == user_id
+    query = db.session.query(Ingredient.id, Meal.day, amount) \
+                      .select_from(Meal) \
+                      .join(Recipe, Meal.recipe_id == Recipe.id) \
+                      .join(RecipeIngredient, RecipeIngredient.recipe_id == Recipe.id) \
+                      .join(Ingredient, RecipeIngredient.ingredient_id == Ingredient.id) \
+                      .filter(owner, Meal.day >= date.today()) \
+                      .filter(Ingredient.pantry.is_(False)) \
+                      .group_by(Ingredient.id, Meal.day)
+    if ingredient_ids is not None:
+        query = query.filter(Ingredient.id.in_(ingredient_ids))
+    return query
+
+
+def drift(user_id, tolerance=0.001):
+    """Compare the materialized list of a user with a full recompute.
+
+    Returns a dict of ingredient id to (stored, expected) amounts for every
+    ingredient which differs more than tolerance.
+    """
+    today = datetime.combine(date.today(), datetime.min.time())
+    stored = dict(db.session.query(Grocery.ingredient_id, func.sum(Grocery.amount))
+                            .filter(_owner(user_id), Grocery.ingredient_id.isnot(None))
+                            .filter(Grocery.day >= today)
+                            .group_by(Grocery.ingredient_id))
+    expected = defaultdict(float)
+    for id, _, amount in _upcoming(user_id):
+        expected[id] += amount or 0
+
+    differences = {}
+    for id in set(stored) | set(expected):
+        # Sums over listings without amount are NULL
+        if abs((stored.get(id) or 0) - (expected.get(id) or 0)) > tolerance:
+            differences[id] = (stored.get(id), expected.get(id))
+    return differences
+
+
+def users():
+    """Return the ids of all users with meals or a grocery list (None: household)."""
+    ids = {row[0] for row in db.session.query(Meal.user_id).distinct()}
+    ids.update(row[0] for row in db.session.query(Grocery.user_id).distinct())
+    return ids
+
+
+def rebuild(user_id, ingredient_ids=None):
+    """Recompute the materialized grocery list of a user, or only the rows
+    of the given ingredients.
+
+    Manually added items are kept.
+    """
+    table = Grocery.__table__
+    delete = table.delete().where(_owner(user_id)).where(table.c.ingredient_id.isnot(None))
+    if ingredient_ids is not None:
+        delete = delete.where(table.c.ingredient_id.in_(ingredient_ids))
+    db.session.execute(delete)
+    upcoming = _upcoming(user_id, ingredient_ids).add_columns(literal(user_id)).subquery()
+    db.session.execute(table.insert().from_select(
+        ['ingredient_id', 'day', 'amount', 'user_id'], select(list(upcoming.c))))
+
+
+def _meal_state(meal):
+    """Return the (user, recipe, servings, day) of a meal object."""
+    return (meal.user_id, meal.recipe_id, meal.servings, meal.day)
+
+
+def _counts(state, today):
+    """Check whether a meal state contributes to the materialized list."""
+    user_id, recipe_id, servings, day = state
+    if recipe_id is None or day is None:
+        return False
+    if hasattr(day, 'date'):
+        day = day.date()
+    return day >= today
+
+
+@event.listens_for(db.session, 'before_flush')
+def _collect_previous(session, flush_context, instances):
+    """Read the stored state of meals about to be changed or deleted."""
+    ids = [meal.id for meal in set(session.dirty) | set(session.deleted)
+           if isinstance(meal, Meal) and meal.id is not None]
+    if not ids:
+        return
+
+    table = Meal.__table__
+    rows = session.connection().execute(
+        select([table.c.id, table.c.user_id, table.c.recipe_id,
+                table.c.servings, table.c.day]).where(table.c.id.in_(ids)))
+    previous = session.info.setdefault('grocery_previous', {})
+    for id, *state in rows:
+        previous.setdefault(id, tuple(state))
+
+
+@event.listens_for(db.session, 'after_flush')
+def _collect(session, flush_context):
+    """Remember the meal states added and removed by this flush."""
+    today = date.today()
+    previous = session.info.pop('grocery_previous', {})
+    changes = []
+    for meal in session.new:
+        if isinstance(meal, Meal):
+            changes.append((_meal_state(meal), 1))
+    for meal in session.deleted:
+        if isinstance(meal, Meal) and meal.id in previous:
+            changes.append((previous[meal.id], -1))
+    for meal in session.dirty:
+        if isinstance(meal, Meal) and meal.id in previous:
+            state = _meal_state(meal)
+            if state != previous[meal.id]:
+                changes.append((previous[meal.id], -1))
+                changes.append((state, 1))
+
+    changes = [(state, sign) for state, sign in changes if _counts(state, today)]
+    if changes:
+        session.info.setdefault('grocery_changes', []).extend(changes)
+
+    # Changed ingredient listings or servings of a recipe affect every meal
+    # it is planned for, those lists are recomputed as a whole
+    recipes = set()
+    for obj in set(session.new) | set(session.dirty) | set(session.deleted):
+        if isinstance(obj, RecipeIngredient):
+            recipes.add(obj.recipe_id)
+        elif isinstance(obj, Recipe) and inspect(obj).attrs.servings.history.has_changes():
+            recipes.add(obj.id)
+    recipes.discard(None)
+    if recipes:
+        session.info.setdefault('grocery_recipes', set()).update(recipes)
+
+    # Ingredients moved in or out of the pantry
+    pantry = {obj.id for obj in session.dirty
+              if isinstance(obj, Ingredient) and inspect(obj).attrs.pantry.history.has_changes()}
+    if pantry:
+        session.info.setdefault('grocery_pantry', set()).update(pantry)
+
+
+@event.listens_for(db.session, 'after_flush_postexec')
+def _apply(session, flush_context):
+    """Apply the difference of changed meals and pantry items to the
+    materialized lists."""
+    recipes = session.info.pop('grocery_recipes', None)
+    changes = session.info.pop('grocery_changes', None)
+    pantry = session.info.pop('grocery_pantry', None)
+
+    # Lists with meals of changed recipes are computed again instead
+    rebuilt = set()
+    if recipes:
+        owners = session.query(Meal.user_id).distinct() \
+                        .filter(Meal.recipe_id.in_(recipes)) \
+                        .filter(Meal.day >= date.today())
+        rebuilt = {row[0] for row in owners}
+        for user_id in rebuilt:
+            rebuild(user_id)
+    changes = [change for change in changes or () if change[0][0] not in rebuilt]
+    if changes:
+        _apply_changes(session.connection(), changes)
+
+    if pantry:
+        # Rows of the ingredients are replaced, after the meal changes which
+        # may have touched them
+        table = Grocery.__table__
+        session.connection().execute(table.delete().where(table.c.ingredient_id.in_(pantry)))
+        owners = session.query(Meal.user_id).distinct() \
+                        .join(RecipeIngredient, RecipeIngredient.recipe_id == Meal.recipe_id) \
+                        .filter(RecipeIngredient.ingredient_id.in_(pantry)) \
+                        .filter(Meal.day >= date.today())
+        for user_id, in owners:
+            rebuild(user_id, pantry)
+
+
+def _apply_changes(connection, changes):
+    """Apply (meal state, +1 or -1) changes to the materialized lists."""
+    deltas = defaultdict(float)
+    for (user_id, recipe_id, meal_servings, day), sign in changes:
+        if not isinstance(day, datetime):
+            day = datetime.combine(day, datetime.min.time())
+        amount = scaled_amount(servings(default_servings(user_id),
+                                        literal(meal_servings)))
+        rows = connection.execute(
+            select([RecipeIngredient.ingredient_id, amount])
+            .select_from(RecipeIngredient.__table__
+                         .join(Recipe.__table__)
+                         .join(Ingredient.__table__))
+            .where(RecipeIngredient.recipe_id == recipe_id)
+            .where(Ingredient.pantry.is_(False)))
+        for ingredient_id, value in rows:
+            deltas[user_id, ingredient_id, day] += sign * (value or 0)
+
+    table = Grocery.__table__
+    for (user_id, ingredient_id, day), delta in deltas.items():
+        row = (table.c.ingredient_id == ingredient_id) & (table.c.day == day)
+        owner = table.c.user_id.is_(None) if user_id is None else table.c.user_id == user_id
+        result = connection.execute(table.update().where(owner).where(row)
+                                         .values(amount=table.c.amount + delta))
+        if result.rowcount == 0 and delta > 0:
+            connection.execute(table.insert().values(
+                user_id=user_id, ingredient_id=ingredient_id, day=day, amount=delta))
+        elif delta < 0:
+            connection.execute(table.delete().where(owner).where(row)
+                                    .where(table.c.amount <= 1e-9))
@@ -0,0 +1,222 @@
+"""Processing and storage of uploaded recipe images.
+
+An upload is only checked and read in the request; resizing and encoding
+happens in a small worker pool so the request returns immediately. Every
+image is written as JPEG and WebP in several widths (never wider than the
+original), without any metadata. The widths are recorded on the recipe, the
+templates turn them into srcset attributes. Until processing finishes the
+recipe keeps its previous image.
+
+Images are stored under the hash of their content: variants of
+``<hash>.jpg`` are named ``<hash>-<width>.jpg`` and ``<hash>-<width>.webp``,
+the widest variant is ``<hash>.jpg`` (and ``<hash>.webp``) itself. A file
+never changes once written, so identical uploads share their files and the
+files are served as immutable. Files no recipe refers to anymore are removed
+by collect().
+"""
+import hashlib
+import io
+import logging
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image, ImageOps, UnidentifiedImageError
+from app import app, db
+from models import Recipe
+
+LOGGER = logging.getLogger(__name__)
+
+MEDIA_PATH = os.path.join(os.path.dirname(app.instance_path), app.config['UPLOAD_FOLDER'])
+MEDIA_URL = '/media/'
+
+# Cache lifetime in seconds of content-addressed files and of all others
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+MUTABLE_MAX_AGE = 3600
+
+# File names of content-addressed images
+HASH_LENGTH = 32
+STORED_NAME = re.compile(r'^(?P<hash>[0-9a-f]{%d})(-\d+)?\.(jpg|webp)(\.\d+\.tmp)?$' % HASH_LENGTH)
+
+WIDTHS = sorted(int(width) for width in str(app.config['IMAGE_WIDTHS']).split(','))
+QUALITY = int(app.config['IMAGE_QUALITY'])
+FORMATS = {'jpg': 'JPEG', 'webp': 'WEBP'}
+
+# EXIF orientation tag and its values turning the image by 90 degrees
+ORIENTATION = 0x0112
+ROTATED = (5, 6, 7, 8)
+
+_executor = ThreadPoolExecutor(max_workers=int(app.config['IMAGE_WORKERS']),
+                               thread_name_prefix='images')
+
+
+class InvalidImage(ValueError):
+    pass
+
+
+def variant(img, width=None, ext='jpg'):
+    """Return the file name of an image variant (None: the widest)."""
+    stem = os.path.splitext(img)[0]
+    if width is None:
+        return '{}.{}'.format(stem, ext)
+    return '{}-{}.{}'.format(stem, width, ext)
+
+
+def widths(recipe):
+    """Return the widths of the variants of a recipe image, narrowest first."""
+    if not recipe.img_widths:
+        return []
+    return [int(width) for width in recipe.img_widths.split(',')]
+
+
+def url(recipe, width=None, ext='jpg'):
+    """Return the url of the narrowest variant at least width pixels wide.
+
+    Images without variants are returned as is.
+    """
+    available = widths(recipe)
+    if not available:
+        return MEDIA_URL + (recipe.img or 'default.jpg')
+
+    for candidate in available[:-1]:
+        if width is not None and candidate >= width:
+            return MEDIA_URL + variant(recipe.img, candidate, ext)
+    return MEDIA_URL + variant(recipe.img, ext=ext)
+
+
+def srcset(recipe, ext='jpg'):
+    """Return the srcset attribute value for all variants of a recipe image."""
+    available = widths(recipe)
+    candidates = ['{}{} {}w'.format(MEDIA_URL, variant(recipe.img, width, ext), width)
+                  for width in available[:-1]]
+    if available:
+        candidates.append('{}{} {}w'.format(MEDIA_URL, variant(recipe.img, ext=ext),
+                                            available[-1]))
+    return ', '.join(candidates)
+
+
+def _flatten(image):
+    """Return image as RGB, with transparent parts on a white background."""
+    image = ImageOps.exif_transpose(image)
+    if image.mode in ('RGBA', 'LA') or 'transparency' in image.info:
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, 'white')
+        background.paste(image, mask=image.getchannel('A'))
+        return background
+    return image.convert('RGB')
+
+
+def _sizes(width):
+    """Return the variant widths for an image of width pixels."""
+    widest = min(width, WIDTHS[-1])
+    return [size for size in WIDTHS if size < widest] + [widest]
+
+
+def immutable(filename):
+    """Check whether filename is a content-addressed (never changing) file."""
+    return STORED_NAME.match(filename) is not None and not filename.endswith('.tmp')
+
+
+def digest(data):
+    """Return the content hash of image data.
+
+    The variant settings are part of the hash, other widths or another
+    quality give other files.
+    """
+    hash = hashlib.sha256(data)
+    hash.update(repr((WIDTHS, QUALITY)).encode())
+    return hash.hexdigest()[:HASH_LENGTH]
+
+
+def stored(img, sizes):
+    """Check whether all variants of img are written."""
+    names = [variant(img, None if size == sizes[-1] else size, ext)
+             for size in sizes for ext in FORMATS]
+    return all(os.path.exists(os.path.join(MEDIA_PATH, name)) for name in names)
+
+
+def render(data, img):
+    """Write all variants of image data for the image file name img.
+
+    Returns the list of written widths.
+    """
+    image = Image.open(io.BytesIO(data))
+    width, height = image.size
+    if image.getexif().get(ORIENTATION) in ROTATED:
+        width = height
+
+    sizes = _sizes(width)
+    if stored(img, sizes):
+        return sizes
+
+    image = _flatten(image)
+    for size in sizes:
+        height = max(1, round(image.height * size / image.width))
+        resized = image.resize((size, height), Image.LANCZOS) if size < image.width else image
+        for ext, format in FORMATS.items():
+            name = variant(img, None if size == sizes[-1] else size, ext)
+            # Write next to the target and rename, readers never see a
+            # partially written file
+            path = os.path.join(MEDIA_PATH, name)
+            temporary = '{}.{}.tmp'.format(path, threading.get_ident())
+            resized.save(temporary, format, quality=QUALITY, optimize=True)
+            os.replace(temporary, path)
+    return sizes
+
+
+def process(recipe_id, data, img):
+    """Render the variants of an uploaded image and record them on the recipe."""
+    with app.app_context():
+        try:
+            sizes = render(data, img)
+        except (OSError, ValueError, Image.DecompressionBombError):
+            LOGGER.exception("Processing image of recipe %s failed", recipe_id)
+            return
+
+        recipe = Recipe.query.get(recipe_id)
+        if recipe is None:
+            return
+        recipe.img = img
+        recipe.img_widths = ','.join(str(size) for size in sizes)
+        db.session.commit()
+        LOGGER.info("Processed image of recipe %s (%s)", recipe_id, recipe.img_widths)
+
+
+def submit(recipe, upload):
+    """Queue an uploaded file for processing as image of recipe.
+
+    The file is only verified here, an InvalidImage is raised when it isn't
+    a readable image. Returns the future of the processing.
+    """
+    data = upload.read()
+    try:
+        with Image.open(io.BytesIO(data)) as image:
+            image.verify()
+    except (UnidentifiedImageError, OSError, SyntaxError, Image.DecompressionBombError):
+        raise InvalidImage(upload.filename)
+
+    return _executor.submit(process, recipe.id, data, digest(data) + '.jpg')
+
+
+def collect(grace=3600, dry_run=False):
+    """Remove stored image files no recipe refers to.
+
+    Files younger than grace seconds are kept, they may belong to an upload
+    still being processed. Returns the names of the removed files.
+    """
+    used = {os.path.splitext(img)[0] for img, in db.session.query(Recipe.img)
+            .filter(Recipe.img.isnot(None))}
+    threshold = time.time() - grace
+
+    removed = []
+    for entry in os.scandir(MEDIA_PATH):
+        match = STORED_NAME.match(entry.name)
+        if not match or match.group('hash') in used:
+            continue
+        if entry.stat().st_mtime > threshold:
+            continue
+        if not dry_run:
+            os.remove(entry.path)
+        removed.append(entry.name)
+    return removed
@@ -0,0 +1,295 @@
+"""In-memory inverted index from ingredients to recipes.
+
+The index answers "which recipes can I cook with these ingredients, missing
+at most k of them" without touching the database. Recipes are numbered by
+position; an ingredient used by many recipes keeps its recipes as a bitset
+(a Python int with a bit per position), a rare one as a sorted array of
+positions, whichever is smaller.
+
+To count the pantry ingredients of all recipes at once, the bitsets of the
+pantry ingredients are added up in bit-sliced counters (``at_least[i]``
+holds the recipes using i or more of them), a handful of big-int operations
+per ingredient. Bitsets of rare ingredients are made when needed and kept
+for a while. A recipe of n ingredients using i pantry ingredients misses
+n - i, so with a bitset of the recipes of every size the recipes missing
+exactly k are a few more operations away.
+
+Every process keeps its own index, built on first use. Before a query the
+recipes changed since (by update time, with some slack for transactions
+committing late) are compared by version and re-indexed; deleted recipes
+rebuild the whole index.
+"""
+import bisect
+import logging
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from datetime import timedelta
+from app import db
+from sqlalchemy import func, select
+from models import Recipe, RecipeIngredient
+
+LOGGER = logging.getLogger(__name__)
+
+# Highest number of missing ingredients a query may allow
+MAX_MISSING = 5
+
+# Recipes changed up to this long before the last seen change are checked
+LOOKBACK = timedelta(seconds=10)
+
+# Changing more recipes than this at once rebuilds the index
+REBUILD_THRESHOLD = 1000
+
+# Number of bitsets of rare ingredients kept between queries
+CACHED_BITSETS = 256
+
+
+def _bitset(positions, size):
+    """Return the bitset of positions."""
+    data = bytearray((size + 7) // 8)
+    for position in positions:
+        data[position >> 3] |= 1 << (position & 7)
+    return int.from_bytes(data, 'little')
+
+
+try:
+    _count = int.bit_count
+except AttributeError:  # Python < 3.10
+    def _count(bits):
+        return bin(bits).count('1')
+
+
+class IngredientIndex:
+    """Postings of the recipes of every ingredient."""
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.clear()
+
+    def clear(self):
+        self.ids = array('I')          # recipe id by position
+        self.versions = array('I')     # recipe version by position
+        self.position = {}             # position by recipe id
+        self.listings = []             # ingredient ids by position
+        self.by_size = {}              # bitset by number of ingredients
+        self.dense = {}                # bitset by ingredient id
+        self.sparse = {}               # sorted positions by ingredient id
+        self._bitsets = OrderedDict()  # bitsets of rare ingredients, by use
+        self.watermark = None
+        self.state = None
+        self.settled = 0
+
+    def __len__(self):
+        return len(self.ids)
+
+    def build(self, recipes, listings):
+        """Index recipes from (id, version, updated_at) and (recipe id,
+        ingredient id) rows, both ordered by recipe id."""
+        self.clear()
+        for id, version, updated_at in recipes:
+            self.position[id] = len(self.ids)
+            self.ids.append(id)
+            self.versions.append(version or 0)
+            self.listings.append(())
+            if updated_at and (self.watermark is None or updated_at > self.watermark):
+                self.watermark = updated_at
+
+        grouped = {}
+        for recipe_id, ingredient_id in listings:
+            position = self.position.get(recipe_id)
+            if position is not None:
+                grouped.setdefault(position, {})[ingredient_id] = None
+        postings = {}
+        for position, ingredients in grouped.items():
+            self.listings[position] = tuple(ingredients)
+            for ingredient_id in ingredients:
+                postings.setdefault(ingredient_id, []).append(position)
+
+        size = len(self.ids)
+        for ingredient_id, positions in postings.items():
+            # A bitset takes size / 8 bytes, an array 4 bytes per recipe
+            if len(positions) * 32 >= size:
+                self.dense[ingredient_id] = _bitset(positions, size)
+            else:
+                self.sparse[ingredient_id] = array('I', sorted(positions))
+        by_size = {}
+        for position, listing in enumerate(self.listings):
+            by_size.setdefault(len(listing), []).append(position)
+        self.by_size = {count: _bitset(positions, size) for count, positions in by_size.items()}
+
+    def _remove(self, position):
+        listing = self.listings[position]
+        for ingredient_id in listing:
+            if ingredient_id in self.dense:
+                self.dense[ingredient_id] &= ~(1 << position)
+            else:
+                postings = self.sparse[ingredient_id]
+                del postings[bisect.bisect_left(postings, position)]
+        self.by_size[len(listing)] &= ~(1 << position)
+
+    def _add(self, position, listing):
+        for ingredient_id in listing:
+            if ingredient_id in self.dense:
+                self.dense[ingredient_id] |= 1 << position
+            else:
+                bisect.insort(self.sparse.setdefault(ingredient_id, array('I')), position)
+        self.listings[position] = listing
+        self.by_size[len(listing)] = self.by_size.get(len(listing), 0) | 1 << position
+
+    def update(self, recipes, listings):
+        """Re-index changed recipes from (id, version, updated_at) rows and
+        all (recipe id, ingredient id) rows of these recipes."""
+        grouped = {}
+        for recipe_id, ingredient_id in listings:
+            grouped.setdefault(recipe_id, {})[ingredient_id] = None
+
+        for id, version, updated_at in recipes:
+            position = self.position.get(id)
+            if position is None:
+                position = self.position[id] = len(self.ids)
+                self.ids.append(id)
+                self.versions.append(0)
+                self.listings.append(())
+                self.by_size[0] = self.by_size.get(0, 0) | 1 << position
+            self._remove(position)
+            self._add(position, tuple(grouped.get(id, ())))
+            self.versions[position] = version or 0
+            if updated_at and (self.watermark is None or updated_at > self.watermark):
+                self.watermark = updated_at
+        self._bitsets.clear()
+
+    def bits(self, ingredient_id):
+        """Return the bitset of the recipes using an ingredient."""
+        if ingredient_id in self.dense:
+            return self.dense[ingredient_id]
+        if ingredient_id not in self.sparse:
+            return 0
+        bits = self._bitsets.pop(ingredient_id, None)
+        if bits is None:
+            bits = _bitset(self.sparse[ingredient_id], len(self.ids))
+        self._bitsets[ingredient_id] = bits
+        while len(self._bitsets) > CACHED_BITSETS:
+            self._bitsets.popitem(last=False)
+        return bits
+
+    def among(self, recipe_ids):
+        """Return the bitset of the recipes with given ids, for match()."""
+        size = len(self.ids)
+        return _bitset((self.position[id] for id in recipe_ids if id in self.position), size)
+
+    def listing(self, recipe_id):
+        """Return the ingredient ids of a recipe."""
+        position = self.position.get(recipe_id)
+        return self.listings[position] if position is not None else ()
+
+    def match(self, pantry, missing=0, limit=24, among=None):
+        """Rank recipes by the ingredients missing from pantry.
+
+        Returns the (recipe id, number of missing ingredients) of at most
+        limit recipes missing at most missing ingredients, fewest missing
+        first and the most pantry ingredients used next, and the number of
+        recipes missing 0..missing ingredients. Recipes without ingredients
+        are left out, as are those not in the among bitset if given.
+        """
+        missing = max(0, min(missing, MAX_MISSING))
+        sizes = sorted((count for count, bits in self.by_size.items() if count and bits),
+                       reverse=True)
+        depth = sizes[0] if sizes else 0
+
+        # at_least[i]: recipes using i or more pantry ingredients
+        at_least = [(1 << len(self.ids)) - 1] + [0] * (depth + 1)
+        used = 0
+        for ingredient_id in set(pantry):
+            bits = self.bits(ingredient_id)
+            if not bits:
+                continue
+            used = min(used + 1, depth)
+            for level in range(used, 0, -1):
+                at_least[level] |= at_least[level - 1] & bits
+
+        counts, results = [], []
+        for level in range(missing + 1):
+            # Recipes of n ingredients using exactly n - level of the pantry,
+            # most pantry ingredients first
+            found = 0
+            for count in sizes:
+                if count < level:
+                    break
+                bits = self.by_size[count] & at_least[count - level] & ~at_least[count - level + 1]
+                if among is not None:
+                    bits &= among
+                if not bits:
+                    continue
+                found += _count(bits)
+                while bits and len(results) < limit:
+                    lowest = bits & -bits
+                    results.append((self.ids[lowest.bit_length() - 1], level))
+                    bits ^= lowest
+            counts.append(found)
+        return results, counts
+
+
+index = IngredientIndex()
+
+
+def _listings(recipe_ids=None):
+    query = select([RecipeIngredient.recipe_id, RecipeIngredient.ingredient_id])
+    if recipe_ids is not None:
+        query = query.where(RecipeIngredient.recipe_id.in_(recipe_ids))
+    return db.session.execute(query.order_by(RecipeIngredient.recipe_id))
+
+
+def rebuild():
+    """Build the index of this process from scratch."""
+    with index.lock:
+        recipes = db.session.execute(
+            select([Recipe.id, Recipe.version, Recipe.updated_at]).order_by(Recipe.id))
+        index.build(recipes.fetchall(), _listings())
+        LOGGER.info("Indexed the ingredients of %s recipes", len(index))
+
+
+def refresh():
+    """Bring the index up to date with the database.
+
+    A change of the number of recipes or of the last update time is
+    noticed with one query. After a change the recently updated recipes are
+    compared by version for LOOKBACK, as transactions which started before
+    may still commit changes with earlier update times.
+    """
+    with index.lock:
+        # Separate subqueries, together they would scan the whole table
+        state = tuple(db.session.execute(select([
+            select([func.count()]).select_from(Recipe.__table__).as_scalar(),
+            select([func.max(Recipe.updated_at)]).as_scalar()])).first())
+        if index.watermark is None:
+            rebuild()
+            index.state = state
+            return
+        if state == index.state and time.monotonic() >= index.settled:
+            return
+
+        recent = db.session.execute(
+            select([Recipe.id, Recipe.version, Recipe.updated_at])
+            .where(Recipe.updated_at >= index.watermark - LOOKBACK)).fetchall()
+        changed = [row for row in recent if row.id not in index.position
+                   or index.versions[index.position[row.id]] != (row.version or 0)]
+        if len(changed) > REBUILD_THRESHOLD:
+            rebuild()
+        elif changed:
+            index.update(changed, _listings([row.id for row in changed]))
+        if len(index) != state[0]:
+            # Recipes were deleted
+            rebuild()
+
+        if state != index.state:
+            index.settled = time.monotonic() + LOOKBACK.total_seconds()
+        index.state = state
+
+
+def match(pantry, missing=0, limit=24):
+    """Rank recipes by the ingredients missing from pantry, see
+    IngredientIndex.match()."""
+    refresh()
+    with index.lock:
+        return index.match(pantry, missing, limit)
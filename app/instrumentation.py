@@ -0,0 +1,258 @@
+"""Opt-in instrumentation of requests.
+
+When INSTRUMENTATION is enabled every request records its number of SQL
+statements, the time spent in the database and in rendering templates and
+its slowest statements. This is added to the response as a Server-Timing
+header (shown by the network tab of browsers) and logged as one line per
+request. Requests slower than INSTRUMENTATION_SLOW_REQUEST seconds also log
+their slowest statements.
+
+Latencies are collected in histograms per endpoint which /metrics exposes in
+the Prometheus text format. They are kept per process, every uWSGI worker
+reports its own requests. Only scrapers sending METRICS_TOKEN as bearer token
+or connecting from an address in METRICS_ALLOW get them.
+
+Requests to the paths starting with one of PROFILE_PATHS are profiled with
+cProfile at PROFILE_RATE (1.0 profiles all of them), the profiles are
+written to PROFILE_FOLDER in the instance folder and can be read with pstats
+or snakeviz.
+"""
+import cProfile
+import heapq
+import hmac
+import logging
+import os
+import random
+import threading
+import time
+from app import app
+from flask import abort, g, has_request_context, request
+from jinja2 import Template
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+LOGGER = logging.getLogger(__name__)
+
+
+def _enabled(value):
+    return str(value).lower() in ('1', 'true', 'yes', 'on')
+
+
+ENABLED = _enabled(app.config['INSTRUMENTATION'])
+SLOW_QUERIES = int(app.config['INSTRUMENTATION_SLOW_QUERIES'])
+SLOW_REQUEST = float(app.config['INSTRUMENTATION_SLOW_REQUEST'])
+
+PROFILE_PATHS = [path for path in str(app.config['PROFILE_PATHS']).split(',') if path]
+PROFILE_RATE = float(app.config['PROFILE_RATE'])
+PROFILE_FOLDER = os.path.join(app.instance_path, app.config['PROFILE_FOLDER'])
+
+METRICS_TOKEN = str(app.config['METRICS_TOKEN'])
+METRICS_ALLOW = {address.strip() for address in str(app.config['METRICS_ALLOW']).split(',')
+                 if address.strip()}
+
+# Upper bounds in seconds of the latency histogram buckets
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Length of statements in logs
+STATEMENT_LENGTH = 200
+
+
+class Measurement:
+    """Timings of the current request."""
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.queries = 0
+        self.sql = 0.0
+        self.render = 0.0
+        self.rendering = False
+        self.slowest = []
+        self.profile = None
+
+    def executed(self, statement, duration):
+        self.queries += 1
+        self.sql += duration
+        entry = (duration, self.queries, statement)
+        if len(self.slowest) < SLOW_QUERIES:
+            heapq.heappush(self.slowest, entry)
+        else:
+            heapq.heappushpop(self.slowest, entry)
+
+
+class Histograms:
+    """Per endpoint latency histograms and totals, safe between threads."""
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, labels, duration, queries, sql):
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = {
+                    'buckets': [0] * len(self.buckets), 'count': 0,
+                    'sum': 0.0, 'queries': 0, 'sql': 0.0}
+            for index, bound in enumerate(self.buckets):
+                if duration <= bound:
+                    series['buckets'][index] += 1
+            series['count'] += 1
+            series['sum'] += duration
+            series['queries'] += queries
+            series['sql'] += sql
+
+    def exposition(self):
+        """Return the metrics in the Prometheus text format."""
+        with self._lock:
+            series = sorted((labels, dict(values, buckets=list(values['buckets'])))
+                            for labels, values in self._series.items())
+
+        lines = ['# HELP suechef_request_duration_seconds Request latency by endpoint.',
+                 '# TYPE suechef_request_duration_seconds histogram']
+        for (endpoint, method), values in series:
+            labels = 'endpoint="{}",method="{}"'.format(endpoint, method)
+            for bound, count in zip(self.buckets, values['buckets']):
+                lines.append('suechef_request_duration_seconds_bucket{{{},le="{}"}} {}'.format(
+                    labels, bound, count))
+            lines.append('suechef_request_duration_seconds_bucket{{{},le="+Inf"}} {}'.format(
+                labels, values['count']))
+            lines.append('suechef_request_duration_seconds_sum{{{}}} {}'.format(labels, values['sum']))
+            lines.append('suechef_request_duration_seconds_count{{{}}} {}'.format(
+                labels, values['count']))
+
+        for name, key, help in (
+                ('suechef_request_queries_total', 'queries', 'SQL statements by endpoint.'),
+                ('suechef_request_sql_seconds_total', 'sql', 'Time spent in SQL by endpoint.')):
+            lines.append('# HELP {} {}'.format(name, help))
+            lines.append('# TYPE {} counter'.format(name))
+            for (endpoint, method), values in series:
+                lines.append('{}{{endpoint="{}",method="{}"}} {}'.format(
+                    name, endpoint, method, values[key]))
+        return '\n'.join(lines) + '\n'
+
+
+histograms = Histograms()
+
+
+def current():
+    """Return the Measurement of the current request, or None."""
+    if has_request_context():
+        return g.get('measurement')
+    return None
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_start', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    duration = time.perf_counter() - conn.info['query_start'].pop()
+    measurement = current()
+    if measurement is not None:
+        measurement.executed(statement, duration)
+
+
+class TimedTemplate(Template):
+    """Template measuring the time of outermost renders."""
+
+    def render(self, *args, **kwargs):
+        measurement = current()
+        if measurement is None or measurement.rendering:
+            return super().render(*args, **kwargs)
+
+        measurement.rendering = True
+        start = time.perf_counter()
+        try:
+            return super().render(*args, **kwargs)
+        finally:
+            measurement.render += time.perf_counter() - start
+            measurement.rendering = False
+
+
+def _profiled():
+    """Decide whether to profile the current request."""
+    return any(request.path.startswith(path) for path in PROFILE_PATHS) \
+        and random.random() < PROFILE_RATE
+
+
+def start():
+    """Start measuring a request."""
+    measurement = g.measurement = Measurement()
+    if PROFILE_PATHS and _profiled():
+        measurement.profile = cProfile.Profile()
+        try:
+            measurement.profile.enable()
+        except ValueError:
+            # Another profiler is active in this thread
+            measurement.profile = None
+
+
+def _save_profile(profile):
+    """Write a request profile, returns its file name."""
+    os.makedirs(PROFILE_FOLDER, exist_ok=True)
+    name = '{}-{}-{}.prof'.format(request.endpoint or 'none',
+                                  time.strftime('%Y%m%d%H%M%S'), os.getpid())
+    profile.dump_stats(os.path.join(PROFILE_FOLDER, name))
+    return name
+
+
+def finish(response):
+    """Add the timings to the response, the metrics and the log."""
+    measurement = current()
+    if measurement is None:
+        return response
+    duration = time.perf_counter() - measurement.start
+
+    profile = None
+    if measurement.profile is not None:
+        measurement.profile.disable()
+        profile = _save_profile(measurement.profile)
+
+    endpoint = request.endpoint or 'none'
+    histograms.observe((endpoint, request.method), duration,
+                       measurement.queries, measurement.sql)
+
+    timings = ['db;dur={:.1f};desc="{} queries"'.format(measurement.sql * 1000, measurement.queries),
+               'render;dur={:.1f}'.format(measurement.render * 1000),
+               'total;dur={:.1f}'.format(duration * 1000)]
+    if profile:
+        timings.append('profile;desc="{}"'.format(profile))
+    response.headers.add('Server-Timing', ', '.join(timings))
+
+    metrics = {'method': request.method, 'path': request.path, 'endpoint': endpoint,
+               'status': response.status_code, 'duration_ms': round(duration * 1000, 1),
+               'queries': measurement.queries, 'sql_ms': round(measurement.sql * 1000, 1),
+               'render_ms': round(measurement.render * 1000, 1)}
+    LOGGER.info(' '.join('{}=%s'.format(key) for key in metrics), *metrics.values(),
+                extra={'request_metrics': metrics})
+    if duration >= SLOW_REQUEST:
+        for seconds, number, statement in sorted(measurement.slowest, reverse=True):
+            LOGGER.warning("Slow request %s: statement %s took %.1fms: %s", request.path,
+                           number, seconds * 1000, ' '.join(statement.split())[:STATEMENT_LENGTH])
+    return response
+
+
+def _authorized():
+    """Check whether the request may read the metrics."""
+    if request.remote_addr in METRICS_ALLOW:
+        return True
+    scheme, _, token = request.headers.get('Authorization', '').partition(' ')
+    return bool(METRICS_TOKEN) and scheme.lower() == 'bearer' \
+        and hmac.compare_digest(token.encode(), METRICS_TOKEN.encode())
+
+
+def metrics():
+    """Expose the request metrics of this process to Prometheus."""
+    if not _authorized():
+        abort(403)
+    return histograms.exposition(), 200, {'Content-Type': 'text/plain; version=0.0.4'}
+
+
+if ENABLED:
+    event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+    event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+    app.jinja_env.template_class = TimedTemplate
+    app.before_request(start)
+    app.after_request(finish)
+    app.add_url_rule('/metrics', 'metrics', metrics)
@@ -0,0 +1,173 @@
+"""Logging set up from the configuration.
+
+LOG_LEVEL sets the level of all loggers, LOG_LEVELS overrides it for single
+loggers (``sqlalchemy.engine=INFO,views=DEBUG``). Records are written to
+stderr or LOG_FILE as text or, with LOG_FORMAT ``json``, as one JSON object
+per line.
+
+Handlers don't run in the thread logging a record: the record is put on a
+queue and written by a listener thread of the process, so requests never
+wait for a disk or pipe. The listener is started on the first record in
+every process, uWSGI workers forked from a master that already logged get
+their own.
+
+Every request gets an id, taken from the X-Request-ID header (set by a proxy)
+or generated. It is part of all records logged in the request and returned
+in the X-Request-ID response header.
+"""
+import atexit
+import copy
+import json
+import logging
+import os
+import queue
+import re
+import sys
+import threading
+import uuid
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, WatchedFileHandler
+from flask import g, has_request_context, request
+
+REQUEST_ID_HEADER = 'X-Request-ID'
+VALID_REQUEST_ID = re.compile(r'^[\w.:-]{1,64}$')
+
+TEXT_FORMAT = '%(asctime)s %(levelname)s [%(request_id)s] %(name)s: %(message)s'
+
+# Extra attributes of records added to JSON output
+EXTRA_FIELDS = ('request_metrics',)
+
+
+class RequestIdFilter(logging.Filter):
+    """Add the id of the current request to records."""
+
+    def filter(self, record):
+        record.request_id = g.get('request_id', '-') if has_request_context() else '-'
+        return True
+
+
+class JSONFormatter(logging.Formatter):
+    """Format records as a JSON object."""
+
+    def format(self, record):
+        data = {
+            'time': datetime.fromtimestamp(record.created, timezone.utc)
+                            .isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'request_id': getattr(record, 'request_id', '-'),
+            'process': record.process,
+        }
+        for field in EXTRA_FIELDS:
+            if hasattr(record, field):
+                data[field] = getattr(record, field)
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            data['exception'] = record.exc_text
+        if record.stack_info:
+            data['stack'] = record.stack_info
+        return json.dumps(data, default=str)
+
+
+class AsyncHandler(QueueHandler):
+    """Hand records to handlers in a listener thread of the process."""
+
+    def __init__(self, handlers):
+        super().__init__(queue.SimpleQueue())
+        self.handlers = handlers
+        self._listener = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def prepare(self, record):
+        # The message and traceback are formatted now, the arguments may
+        # change or be gone by the time the listener gets the record
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = record.exc_text or logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def _start(self):
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            # Forked from a process with a listener, which isn't running here
+            self.queue = queue.SimpleQueue()
+            self._listener = QueueListener(self.queue, *self.handlers,
+                                           respect_handler_level=True)
+            self._listener.start()
+            self._pid = os.getpid()
+
+    def enqueue(self, record):
+        if self._pid != os.getpid():
+            self._start()
+        self.queue.put_nowait(record)
+
+    def close(self):
+        """Write all queued records and stop the listener."""
+        with self._lock:
+            if self._listener is not None and self._pid == os.getpid():
+                self._listener.stop()
+            self._listener = self._pid = None
+        for handler in self.handlers:
+            handler.close()
+        super().close()
+
+
+def _levels(value):
+    """Parse 'logger=LEVEL,...' into a dict."""
+    levels = {}
+    for item in filter(None, str(value).split(',')):
+        name, _, level = item.partition('=')
+        levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+def _async(value):
+    return str(value).lower() in ('1', 'true', 'yes', 'on')
+
+
+def configure(app):
+    """Set up logging from the configuration of app."""
+    config = app.config
+    if config['LOG_FILE']:
+        handler = WatchedFileHandler(config['LOG_FILE'], encoding='utf-8')
+    else:
+        handler = logging.StreamHandler(sys.stderr)
+    if config['LOG_FORMAT'] == 'json':
+        handler.setFormatter(JSONFormatter())
+    else:
+        handler.setFormatter(logging.Formatter(TEXT_FORMAT))
+
+    if _async(config['LOG_ASYNC']):
+        handler = AsyncHandler([handler])
+        atexit.register(handler.close)
+    handler.addFilter(RequestIdFilter())
+
+    root = logging.getLogger()
+    for previous in root.handlers[:]:
+        root.removeHandler(previous)
+        previous.close()
+    root.addHandler(handler)
+    root.setLevel(str(config['LOG_LEVEL']).upper())
+    for name, level in _levels(config['LOG_LEVELS']).items():
+        logging.getLogger(name).setLevel(level)
+
+    app.before_request(_assign_request_id)
+    app.after_request(_add_request_id)
+
+
+def _assign_request_id():
+    given = request.headers.get(REQUEST_ID_HEADER, '')
+    g.request_id = given if VALID_REQUEST_ID.match(given) else uuid.uuid4().hex
+
+
+def _add_request_id(response):
+    if 'request_id' in g:
+        response.headers[REQUEST_ID_HEADER] = g.request_id
+    return response
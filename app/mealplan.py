@@ -0,0 +1,225 @@
+"""Meal plan generator.
+
+Fills the open days until the next grocery day with recipes which share
+ingredients, so the grocery list stays short. A plan is scored by the number
+of ingredients to buy: the distinct ingredients of its recipes, leaving out
+pantry items and the ingredients of meals planned already.
+
+The search runs on the ingredient index (see ingredientindex.py), where "the
+recipes missing the fewest ingredients of a set" is a bitset query of a few
+milliseconds, whatever the size of the library:
+
+1. greedy: starting from a random recipe, every next day gets a recipe
+   adding the fewest new ingredients to the plan, a random one among equals;
+2. local search: a recipe is replaced by one adding fewer ingredients to the
+   rest of the plan, until no recipe can be improved.
+
+Both steps are repeated from STARTS random recipes, the best plan wins.
+Recipes are drawn from the user's own recipes (UserRecipe) matching the
+constraints (categories, tags, the longest preparation time) which weren't
+planned in the last RECENT_DAYS days or in the plan's days.
+"""
+import logging
+import random
+from datetime import date, datetime, timedelta
+import ingredientindex
+import usersettings
+from app import db
+from sqlalchemy import func, or_
+from models import Category, Ingredient, Meal, Recipe, Tag, UserRecipe
+
+LOGGER = logging.getLogger(__name__)
+
+WEEKDAYS = ('mon', 'tue', 'wed', 'thu', 'fri', 'sat', 'sun')
+
+# Plans cover at least MIN_DAYS and at most MAX_DAYS days
+MIN_DAYS = 7
+MAX_DAYS = 14
+
+# Recipes planned this many days before aren't planned again
+RECENT_DAYS = 14
+
+# Number of random starts and the most rounds of local search per start
+STARTS = 4
+ROUNDS = 5
+
+
+class Constraints:
+    """Recipes a plan may use."""
+
+    def __init__(self, categories=(), tags=(), max_prep_time=None):
+        self.categories = list(categories)
+        self.tags = list(tags)
+        self.max_prep_time = max_prep_time
+
+    def apply(self, query):
+        """Filter a query of recipes by the constraints."""
+        if self.categories:
+            names = [name.lower() for name in self.categories]
+            query = query.filter(Recipe.category.has(func.lower(Category.name).in_(names)))
+        if self.tags:
+            query = query.filter(Recipe.tags.any(Tag.name.in_(self.tags)))
+        if self.max_prep_time is not None:
+            query = query.filter(func.coalesce(Recipe.prep_time, 0) <= self.max_prep_time)
+        return query
+
+
+class Plan:
+    """Recipes by day and the ingredients to buy for them."""
+
+    def __init__(self, days, recipes, ingredients):
+        self.days = days
+        self.recipes = recipes
+        self.ingredients = ingredients
+
+    def __len__(self):
+        return len(self.recipes)
+
+
+def horizon(grocery_day, today=None):
+    """Return the days from today until the next grocery day.
+
+    The next grocery day is at least MIN_DAYS ahead, a sooner one is skipped.
+    """
+    today = today or date.today()
+    weekday = WEEKDAYS.index(grocery_day) if grocery_day in WEEKDAYS else WEEKDAYS.index('sat')
+    ahead = (weekday - today.weekday()) % 7 or 7
+    if ahead < MIN_DAYS:
+        ahead += 7
+    return [today + timedelta(days=offset) for offset in range(ahead)]
+
+
+def _meals(user_id, start, end):
+    """Query the meals of a user and the household from start until end."""
+    return Meal.query.filter(or_(Meal.user_id == user_id, Meal.user_id.is_(None))) \
+                     .filter(Meal.day >= datetime.combine(start, datetime.min.time())) \
+                     .filter(Meal.day < datetime.combine(end, datetime.min.time()))
+
+
+class Search:
+    """Search of a plan over the ingredient index, see the module docstring."""
+
+    def __init__(self, index, have, allowed, rng):
+        self.index = index
+        self.have = frozenset(have)
+        self.allowed = allowed
+        self.rng = rng
+
+    def ingredients(self, recipe_id):
+        return set(self.index.listing(recipe_id)) - self.have
+
+    def cost(self, plan):
+        """Return the ingredients to buy for the recipes of plan."""
+        needed = set()
+        for recipe_id in plan:
+            needed.update(self.ingredients(recipe_id))
+        return needed
+
+    def _best(self, have, plan, missing=ingredientindex.MAX_MISSING, limit=1):
+        """Return the recipes adding the fewest ingredients to have (at most
+        missing), which aren't in plan yet."""
+        among = self.allowed & ~self.index.among(plan) if plan else self.allowed
+        results, _ = self.index.match(have, missing, limit, among)
+        return results
+
+    def greedy(self, days, first):
+        plan = [first]
+        needed = self.ingredients(first)
+        while len(plan) < days:
+            results = self._best(self.have | needed, plan, limit=8)
+            if not results:
+                break
+            fewest = [id for id, missing in results if missing == results[0][1]]
+            choice = self.rng.choice(fewest)
+            plan.append(choice)
+            needed |= self.ingredients(choice)
+        return plan
+
+    def improve(self, plan):
+        """Replace recipes by ones adding fewer ingredients to the others."""
+        for _ in range(ROUNDS):
+            improved = False
+            for day, recipe_id in enumerate(plan):
+                others = self.cost(plan[:day] + plan[day + 1:])
+                added = len(self.ingredients(recipe_id) - others)
+                if not added:
+                    continue
+                results = self._best(self.have | others, plan, added - 1)
+                if results:
+                    plan[day] = results[0][0]
+                    improved = True
+            if not improved:
+                break
+        return plan
+
+
+def generate(user_id, constraints=None, days=None, seed=None, today=None):
+    """Generate a plan for the open days of a user.
+
+    Days default to the days until the next grocery day of the user. Returns
+    a Plan with the recipe ids of the open days, sorted by day; days for
+    which no recipe matches stay open.
+    """
+    constraints = constraints or Constraints()
+    today = today or date.today()
+    if days is None:
+        days = horizon(usersettings.effective(user_id).get('grocery_day'), today)
+    else:
+        days = [today + timedelta(days=offset) for offset in range(days)]
+    end = days[-1] + timedelta(days=1)
+
+    planned = _meals(user_id, today, end).all()
+    taken = {meal.day.date() for meal in planned}
+    recent = {recipe_id for recipe_id, in _meals(user_id, today - timedelta(days=RECENT_DAYS), end)
+              .with_entities(Meal.recipe_id).filter(Meal.recipe_id.isnot(None))}
+    open_days = [day for day in days if day not in taken]
+    if not open_days:
+        return Plan([], [], set())
+
+    own = db.session.query(UserRecipe.recipe_id).filter(UserRecipe.author_id == user_id)
+    candidates = [id for id, in constraints.apply(db.session.query(Recipe.id))
+                  .filter(Recipe.id.in_(own)) if id not in recent]
+    pantry = {id for id, in db.session.query(Ingredient.id).filter(Ingredient.pantry)}
+    rng = random.Random(seed)
+
+    ingredientindex.refresh()
+    index = ingredientindex.index
+    with index.lock:
+        have = set(pantry)
+        for meal in planned:
+            if meal.recipe_id:
+                have.update(index.listing(meal.recipe_id))
+        search = Search(index, have, index.among(candidates), rng)
+        candidates = [id for id in candidates if index.listing(id)]
+
+        # The most days planned first, the fewest ingredients to buy next
+        plans = [search.improve(search.greedy(len(open_days), first))
+                 for first in rng.sample(candidates, min(STARTS, len(candidates)))]
+        best = min(plans, key=lambda plan: (-len(plan), len(search.cost(plan))), default=[])
+        return Plan(open_days[:len(best)], best, search.cost(best))
+
+
+def save(user_id, meals):
+    """Plan (day, recipe id) meals for a user on the days still open.
+
+    Returns the planned meals.
+    """
+    if not meals:
+        return []
+    days = sorted(day for day, _ in meals)
+    taken = {meal.day.date() for meal in _meals(user_id, days[0], days[-1] + timedelta(days=1))}
+    existing = {id for id, in db.session.query(Recipe.id)
+                .filter(Recipe.id.in_([recipe_id for _, recipe_id in meals]))}
+
+    planned = []
+    for day, recipe_id in meals:
+        if day in taken or recipe_id not in existing:
+            continue
+        meal = Meal(datetime.combine(day, datetime.min.time()))
+        meal.user_id = user_id
+        meal.recipe_id = recipe_id
+        db.session.add(meal)
+        planned.append(meal)
+        taken.add(day)
+    LOGGER.info("Planned %s meals for user %s", len(planned), user_id)
+    return planned
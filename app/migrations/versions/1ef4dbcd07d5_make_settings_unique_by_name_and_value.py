@@ -0,0 +1,104 @@
+"""Make settings unique by name and value
+
+Revision ID: 1ef4dbcd07d5
+Revises: 71a40358467a
+Create Date: 2026-10-18 18:12:40.528114
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '1ef4dbcd07d5'
+down_revision = '71a40358467a'
+branch_labels = None
+depends_on = None
+
+setting = sa.table('setting',
+    sa.column('id', sa.Integer()),
+    sa.column('name', sa.String()),
+    sa.column('value', sa.String()),
+    sa.column('site', sa.Boolean()),
+)
+user_setting = sa.table('user_setting',
+    sa.column('user_id', sa.Integer()),
+    sa.column('setting_id', sa.Integer()),
+)
+
+# Names of the site settings created by the generator, before settings had
+# a site flag
+SITE_NAMES = ('grocery_day', 'default_servings', 'allow_user_registration', 'default_language')
+
+
+def mark_site_settings():
+    """Mark the oldest setting of every site name no user is linked to as
+    site setting.
+
+    Later settings of these names without users are leftovers of changed
+    user settings and are deleted, so every name has one site value.
+    """
+    connection = op.get_bind()
+    orphans = connection.execute(
+        sa.select([setting.c.id, setting.c.name])
+        .where(setting.c.name.in_(SITE_NAMES))
+        .where(~setting.c.id.in_(sa.select([user_setting.c.setting_id])))
+        .order_by(setting.c.id))
+    site, leftovers = {}, []
+    for id, name in orphans:
+        if site.setdefault(name, id) != id:
+            leftovers.append(id)
+    if site:
+        connection.execute(setting.update().where(setting.c.id.in_(list(site.values())))
+                           .values(site=True))
+    if leftovers:
+        connection.execute(setting.delete().where(setting.c.id.in_(leftovers)))
+
+
+def merge_duplicates():
+    """Merge settings with equal names and values into the oldest one.
+
+    Users of a duplicate are linked to the kept setting, which is a site
+    setting when one of the duplicates was.
+    """
+    connection = op.get_bind()
+    keep, site = {}, {}
+    for id, name, value, is_site in connection.execute(
+            sa.select([setting.c.id, setting.c.name, setting.c.value, setting.c.site])
+            .order_by(setting.c.id)):
+        kept = keep.setdefault((name, value), id)
+        site[kept] = site.get(kept, False) or bool(is_site)
+        if kept == id:
+            continue
+
+        linked = {row[0] for row in connection.execute(
+            sa.select([user_setting.c.user_id]).where(user_setting.c.setting_id == kept))}
+        moved = {row[0] for row in connection.execute(
+            sa.select([user_setting.c.user_id]).where(user_setting.c.setting_id == id))}
+        connection.execute(user_setting.delete().where(user_setting.c.setting_id == id))
+        if moved - linked:
+            connection.execute(user_setting.insert(), [
+                {'user_id': user_id, 'setting_id': kept} for user_id in moved - linked])
+        connection.execute(setting.delete().where(setting.c.id == id))
+
+    for id in (id for id, is_site in site.items() if is_site):
+        connection.execute(setting.update().where(setting.c.id == id).values(site=True))
+
+
+def upgrade():
+    with op.batch_alter_table('setting', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('site', sa.Boolean(), nullable=False, server_default=sa.false()))
+
+    mark_site_settings()
+    merge_duplicates()
+
+    with op.batch_alter_table('setting', schema=None) as batch_op:
+        batch_op.drop_index('ix_setting_name_value')
+        batch_op.create_unique_constraint('uq_setting_name_value', ['name', 'value'])
+
+
+def downgrade():
+    with op.batch_alter_table('setting', schema=None) as batch_op:
+        batch_op.drop_constraint('uq_setting_name_value', type_='unique')
+        batch_op.create_index('ix_setting_name_value', ['name', 'value'], unique=False)
+        batch_op.drop_column('site')
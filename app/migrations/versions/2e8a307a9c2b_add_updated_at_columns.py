@@ -0,0 +1,50 @@
+"""Add update times to recipes, meals, categories and tags
+
+Revision ID: 2e8a307a9c2b
+Revises: b92622dbf093
+Create Date: 2026-10-18 16:31:55.840127
+
+"""
+from datetime import datetime
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '2e8a307a9c2b'
+down_revision = 'b92622dbf093'
+branch_labels = None
+depends_on = None
+
+# Tables and whether their update time is indexed
+TABLES = (
+    ('recipe', True),
+    ('meal', True),
+    ('category', False),
+    ('tag', False),
+)
+
+
+def upgrade():
+    # Existing rows get the time of the migration
+    now = datetime.utcnow()
+    for table, indexed in TABLES:
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.add_column(sa.Column('updated_at', sa.DateTime(), nullable=True))
+
+        op.execute(sa.table(table, sa.column('updated_at', sa.DateTime()))
+                   .update().values(updated_at=now))
+
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.alter_column('updated_at', existing_type=sa.DateTime(), nullable=False)
+            if indexed:
+                batch_op.create_index(batch_op.f('ix_{}_updated_at'.format(table)),
+                                      ['updated_at'], unique=False)
+
+
+def downgrade():
+    for table, indexed in reversed(TABLES):
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            if indexed:
+                batch_op.drop_index(batch_op.f('ix_{}_updated_at'.format(table)))
+            batch_op.drop_column('updated_at')
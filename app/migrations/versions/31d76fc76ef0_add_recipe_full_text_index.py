@@ -0,0 +1,72 @@
+"""Add recipe full-text index
+
+Revision ID: 31d76fc76ef0
+Revises: bb8c139a446e
+Create Date: 2026-10-18 09:47:03.529716
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '31d76fc76ef0'
+down_revision = 'bb8c139a446e'
+branch_labels = None
+depends_on = None
+
+# The index is maintained outside the models, see fulltext.py. Its tables
+# are written out here, so this revision keeps working when fulltext.py
+# changes.
+SQLITE_CREATE = """
+CREATE VIRTUAL TABLE IF NOT EXISTS recipe_fts USING fts5(
+    name, intro, description, directions, tags, ingredients,
+    tokenize = 'unicode61 remove_diacritics 2',
+    prefix = '2 3'
+)"""
+
+SQLITE_INSERT = """
+INSERT INTO recipe_fts (rowid, name, intro, description, directions, tags, ingredients)
+SELECT r.id, r.name, r.intro, r.description, r.directions,
+       (SELECT group_concat(t.name, ' ') FROM recipe_tag rt
+          JOIN tag t ON t.id = rt.tag_id WHERE rt.recipe_id = r.id),
+       (SELECT group_concat(i.name, ' ') FROM recipe_ingredient ri
+          JOIN ingredient i ON i.id = ri.ingredient_id WHERE ri.recipe_id = r.id)
+FROM recipe r"""
+
+MYSQL_CREATE = """
+CREATE TABLE IF NOT EXISTS recipe_search (
+    recipe_id INTEGER NOT NULL PRIMARY KEY,
+    name VARCHAR(128), intro TEXT, description TEXT, directions TEXT,
+    tags TEXT, ingredients TEXT,
+    FULLTEXT KEY recipe_search_fulltext
+        (name, intro, description, directions, tags, ingredients)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4"""
+
+MYSQL_INSERT = """
+INSERT INTO recipe_search (recipe_id, name, intro, description, directions, tags, ingredients)
+SELECT r.id, r.name, r.intro, r.description, r.directions,
+       (SELECT GROUP_CONCAT(t.name SEPARATOR ' ') FROM recipe_tag rt
+          JOIN tag t ON t.id = rt.tag_id WHERE rt.recipe_id = r.id),
+       (SELECT GROUP_CONCAT(i.name SEPARATOR ' ') FROM recipe_ingredient ri
+          JOIN ingredient i ON i.id = ri.ingredient_id WHERE ri.recipe_id = r.id)
+FROM recipe r"""
+
+
+def upgrade():
+    name = op.get_bind().dialect.name
+    if name == 'sqlite':
+        op.execute('DROP TABLE IF EXISTS recipe_fts')
+        op.execute(SQLITE_CREATE)
+        op.execute(SQLITE_INSERT)
+    elif name == 'mysql':
+        op.execute('DROP TABLE IF EXISTS recipe_search')
+        op.execute(MYSQL_CREATE)
+        op.execute(MYSQL_INSERT)
+
+
+def downgrade():
+    name = op.get_bind().dialect.name
+    if name == 'sqlite':
+        op.execute('DROP TABLE IF EXISTS recipe_fts')
+    elif name == 'mysql':
+        op.execute('DROP TABLE IF EXISTS recipe_search')
@@ -0,0 +1,59 @@
+"""Aggregate recipe ratings by sum and count
+
+Revision ID: 71a40358467a
+Revises: 2e8a307a9c2b
+Create Date: 2026-10-18 17:05:23.381164
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '71a40358467a'
+down_revision = '2e8a307a9c2b'
+branch_labels = None
+depends_on = None
+
+recipe = sa.table('recipe',
+    sa.column('id', sa.Integer()),
+    sa.column('rating', sa.Integer()),
+    sa.column('rating_sum', sa.Integer()),
+    sa.column('rating_count', sa.Integer()),
+)
+user_recipe = sa.table('user_recipe',
+    sa.column('recipe_id', sa.Integer()),
+    sa.column('rating', sa.Integer()),
+)
+
+
+def upgrade():
+    with op.batch_alter_table('recipe', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('rating_sum', sa.Integer(), nullable=False, server_default='0'))
+
+    # Recompute the totals from the ratings of the users, the stored
+    # averages were not reliable
+    rated = sa.and_(user_recipe.c.recipe_id == recipe.c.id, user_recipe.c.rating > 0)
+    op.execute(recipe.update().values(
+        rating_sum=sa.select([sa.func.coalesce(sa.func.sum(user_recipe.c.rating), 0)])
+                     .where(rated).as_scalar(),
+        rating_count=sa.select([sa.func.count()]).where(rated).as_scalar(),
+    ))
+
+    with op.batch_alter_table('recipe', schema=None) as batch_op:
+        batch_op.alter_column('rating_count', existing_type=sa.Integer(), nullable=False,
+                              server_default='0')
+        batch_op.drop_column('rating')
+
+
+def downgrade():
+    with op.batch_alter_table('recipe', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('rating', sa.Integer(), nullable=True))
+        batch_op.alter_column('rating_count', existing_type=sa.Integer(), nullable=True,
+                              server_default=None)
+
+    op.execute(recipe.update().values(rating=sa.case(
+        [(recipe.c.rating_count > 0, recipe.c.rating_sum / recipe.c.rating_count)], else_=0)))
+
+    with op.batch_alter_table('recipe', schema=None) as batch_op:
+        batch_op.drop_column('rating_sum')
@@ -0,0 +1,43 @@
+"""Add recipe shuffle key for random sampling
+
+Revision ID: 84edbb7e039c
+Revises: 31d76fc76ef0
+Create Date: 2026-10-18 11:02:55.804117
+
+"""
+import random
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '84edbb7e039c'
+down_revision = '31d76fc76ef0'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('recipe', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('shuffle', sa.Integer(), nullable=True))
+
+    # Give existing recipes a random key before making the column required
+    recipe = sa.table('recipe', sa.column('id', sa.Integer), sa.column('shuffle', sa.Integer))
+    connection = op.get_bind()
+    ids = [row[0] for row in connection.execute(sa.select([recipe.c.id]))]
+    if ids:
+        connection.execute(
+            recipe.update()
+                  .where(recipe.c.id == sa.bindparam('recipe_id'))
+                  .values(shuffle=sa.bindparam('key')),
+            [{'recipe_id': id, 'key': random.randrange(2 ** 31)} for id in ids])
+
+    with op.batch_alter_table('recipe', schema=None) as batch_op:
+        batch_op.alter_column('shuffle', existing_type=sa.Integer(), nullable=False)
+        batch_op.create_index(batch_op.f('ix_recipe_shuffle'), ['shuffle'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('recipe', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_recipe_shuffle'))
+        batch_op.drop_column('shuffle')
@@ -0,0 +1,26 @@
+"""Add recipe version for the fragment cache
+
+Revision ID: b92622dbf093
+Revises: c30adf02a4d6
+Create Date: 2026-10-18 15:47:12.503881
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b92622dbf093'
+down_revision = 'c30adf02a4d6'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('recipe', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('version', sa.Integer(), nullable=False, server_default='0'))
+
+
+def downgrade():
+    with op.batch_alter_table('recipe', schema=None) as batch_op:
+        batch_op.drop_column('version')
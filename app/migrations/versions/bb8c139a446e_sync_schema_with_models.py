@@ -0,0 +1,58 @@
+"""Sync schema with models (user recipes, user settings, recipe details)
+
+Revision ID: bb8c139a446e
+Revises: 608c58b3ea93
+Create Date: 2026-10-18 09:12:41.118204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'bb8c139a446e'
+down_revision = '608c58b3ea93'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('user_recipe',
+    sa.Column('author_id', sa.Integer(), nullable=False),
+    sa.Column('recipe_id', sa.Integer(), nullable=False),
+    sa.Column('notes', sa.Text(), nullable=True),
+    sa.Column('rating', sa.Integer(), nullable=True),
+    sa.Column('saved', sa.Boolean(), nullable=True),
+    sa.ForeignKeyConstraint(['author_id'], ['user.id'], ),
+    sa.ForeignKeyConstraint(['recipe_id'], ['recipe.id'], ),
+    sa.PrimaryKeyConstraint('author_id', 'recipe_id')
+    )
+    op.create_table('user_setting',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('setting_id', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['setting_id'], ['setting.id'], ),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('user_id', 'setting_id')
+    )
+    with op.batch_alter_table('recipe', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('author', sa.String(length=128), nullable=False, server_default=''))
+        batch_op.add_column(sa.Column('img', sa.String(length=256), nullable=True))
+        batch_op.add_column(sa.Column('source', sa.String(length=128), nullable=True))
+        batch_op.add_column(sa.Column('source_url', sa.String(length=256), nullable=True))
+        batch_op.add_column(sa.Column('rating_count', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('directions', sa.Text(), nullable=True))
+        batch_op.add_column(sa.Column('published', sa.Boolean(), nullable=False, server_default=sa.false()))
+
+
+def downgrade():
+    with op.batch_alter_table('recipe', schema=None) as batch_op:
+        batch_op.drop_column('published')
+        batch_op.drop_column('directions')
+        batch_op.drop_column('rating_count')
+        batch_op.drop_column('source_url')
+        batch_op.drop_column('source')
+        batch_op.drop_column('img')
+        batch_op.drop_column('author')
+
+    op.drop_table('user_setting')
+    op.drop_table('user_recipe')
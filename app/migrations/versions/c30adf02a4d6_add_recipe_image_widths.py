@@ -0,0 +1,26 @@
+"""Add widths of recipe image variants
+
+Revision ID: c30adf02a4d6
+Revises: b13779e17b35
+Create Date: 2026-10-18 15:02:41.218734
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c30adf02a4d6'
+down_revision = 'b13779e17b35'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('recipe', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('img_widths', sa.String(length=64), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('recipe', schema=None) as batch_op:
+        batch_op.drop_column('img_widths')
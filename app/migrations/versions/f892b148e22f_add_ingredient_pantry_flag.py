@@ -0,0 +1,26 @@
+"""Add pantry flag to ingredients
+
+Revision ID: f892b148e22f
+Revises: 8b1666f5c885
+Create Date: 2026-10-18 13:21:09.664310
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f892b148e22f'
+down_revision = '8b1666f5c885'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('ingredient', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('pantry', sa.Boolean(), nullable=False, server_default=sa.false()))
+
+
+def downgrade():
+    with op.batch_alter_table('ingredient', schema=None) as batch_op:
+        batch_op.drop_column('pantry')
@@ -1,23 +1,35 @@
+import random
+from datetime import datetime
 from app import db
 from flask_login import UserMixin
+from sqlalchemy import event, inspect, select
 from werkzeug.security import generate_password_hash, check_password_hash
 
 recipe_tag = db.Table(
     'recipe_tag',
     db.Column('recipe_id', db.Integer, db.ForeignKey('recipe.id'), primary_key=True),
-    db.Column('tag_id', db.Integer, db.ForeignKey('tag.id'), primary_key=True)
+    db.Column('tag_id', db.Integer, db.ForeignKey('tag.id'), primary_key=True, index=True)
 )
 
+# Shuffle keys are drawn uniformly from [0, SHUFFLE_RANGE), see sampling.py
+SHUFFLE_RANGE = 2 ** 31
+
+
+def random_shuffle_key():
+    """Return a new random shuffle key for a recipe."""
+    return random.randrange(SHUFFLE_RANGE)
+
+
 user_setting = db.Table(
     'user_setting',
     db.Column('user_id', db.Integer, db.ForeignKey('user.id'), primary_key=True),
-    db.Column('setting_id', db.Integer, db.ForeignKey('setting.id'), primary_key=True)
+    db.Column('setting_id', db.Integer, db.ForeignKey('setting.id'), primary_key=True, index=True)
 )
 
 
 class User(UserMixin, db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    name = db.Column(db.String(128), nullable=False)
+    name = db.Column(db.String(128), nullable=False, unique=True, index=True)
     email = db.Column(db.String(128), nullable=False)
     password = db.Column(db.String(128), nullable=False)
     
@@ -36,19 +48,29 @@ class User(UserMixin, db.Model):
 
 
 class Setting(db.Model):
+    """A setting value, shared by all users who chose it.
+
+    Site settings are the defaults of all users (see usersettings.py).
+    """
+    __table_args__ = (
+        db.UniqueConstraint('name', 'value', name='uq_setting_name_value'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(32), nullable=False)
     value = db.Column(db.String(128), nullable=True)
+    site = db.Column(db.Boolean, default=False, nullable=False)
 
     users = db.relationship("User", secondary=user_setting, back_populates='settings')
     
-    def __init__(self, name, value):
+    def __init__(self, name, value, site=False):
         self.name = name
         self.value = value
+        self.site = site
 
 class UserRecipe(db.Model):
     author_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
-    recipe_id = db.Column(db.Integer, db.ForeignKey('recipe.id'), primary_key=True)
+    recipe_id = db.Column(db.Integer, db.ForeignKey('recipe.id'), primary_key=True, index=True)
     notes = db.Column(db.Text)
     rating = db.Column(db.Integer, default=0)
     saved = db.Column(db.Boolean)
@@ -69,6 +91,7 @@ class Recipe(db.Model):
     name = db.Column(db.String(128), nullable=False)
     author = db.Column(db.String(128), nullable=False)
     img = db.Column(db.String(256))
+    img_widths = db.Column(db.String(64))
     source = db.Column(db.String(128))
     source_url = db.Column(db.String(256))
 
@@ -79,10 +102,11 @@ class Recipe(db.Model):
     intro = db.Column(db.Text)
     description = db.Column(db.Text, nullable=False)
     
-    rating = db.Column(db.Integer, default=0)
-    rating_count = db.Column(db.Integer, default=0)
+    # Ratings are aggregated by atomic increments, see ratings.py
+    rating_sum = db.Column(db.Integer, default=0, nullable=False)
+    rating_count = db.Column(db.Integer, default=0, nullable=False)
 
-    category_id = db.Column(db.Integer, db.ForeignKey('category.id'), nullable=True)
+    category_id = db.Column(db.Integer, db.ForeignKey('category.id'), nullable=True, index=True)
     category = db.relationship('Category', back_populates='recipes')
 
     ingredients = db.relationship('RecipeIngredient', back_populates='recipe')
@@ -93,12 +117,43 @@ class Recipe(db.Model):
     
     published = db.Column(db.Boolean, default=False, nullable=False)
 
-    def calc_rating(self, rating):
-        self.rating = (self.rating + rating)/self.rating_count
+    shuffle = db.Column(db.Integer, default=random_shuffle_key, nullable=False, index=True)
+
+    # Incremented and set by every change of the recipe or its listings,
+    # see touch() below
+    version = db.Column(db.Integer, default=0, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False, index=True)
+
+    @property
+    def rating(self):
+        """Average rating of all users, 0 when not rated yet."""
+        if not self.rating_count:
+            return 0
+        return self.rating_sum / self.rating_count
+
+
+class RecipeBand(db.Model):
+    """Bucket of a recipe in one band of its MinHash signature.
+
+    Derived from the recipe features, see recommendations.py.
+    """
+    band = db.Column(db.SmallInteger, primary_key=True, autoincrement=False)
+    bucket = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    recipe_id = db.Column(db.Integer, primary_key=True, autoincrement=False, index=True)
+
+
+class SimilarRecipe(db.Model):
+    """A recipe recommended with another one, see recommendations.py."""
+    recipe_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    similar_id = db.Column(db.Integer, primary_key=True, autoincrement=False, index=True)
+    score = db.Column(db.Float, nullable=False)
+
 
 class Category(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    name = db.Column(db.String(128), nullable=False)
+    name = db.Column(db.String(128), nullable=False, unique=True, index=True)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow,
+                           onupdate=datetime.utcnow, nullable=False)
 
     recipes = db.relationship('Recipe', back_populates='category')
 
@@ -111,6 +166,9 @@ class Ingredient(db.Model):
     name = db.Column(db.String(128), nullable=False)
     unit = db.Column(db.String(128), nullable=False)
 
+    # Pantry items are assumed in stock and left out of grocery lists
+    pantry = db.Column(db.Boolean, default=False, nullable=False)
+
     # shopping_category = db.Column()
 
     def __init__(self, name, unit):
@@ -118,10 +176,29 @@ class Ingredient(db.Model):
         self.unit = unit
 
 
+class Unit(db.Model):
+    """A spelling of a unit, see units.py.
+
+    Spellings of one unit share its symbol. Units of the same dimension
+    convert by their factor: the amount of the dimension's base unit in one
+    unit.
+    """
+    name = db.Column(db.String(32), primary_key=True)
+    symbol = db.Column(db.String(32), nullable=False)
+    dimension = db.Column(db.String(32), nullable=False)
+    factor = db.Column(db.Float, nullable=False)
+
+    def __init__(self, name, symbol, dimension, factor):
+        self.name = name
+        self.symbol = symbol
+        self.dimension = dimension
+        self.factor = factor
+
+
 class RecipeIngredient(db.Model):
     recipe_id = db.Column(db.Integer, db.ForeignKey('recipe.id'), primary_key=True)
-    ingredient_id = db.Column(db.Integer, db.ForeignKey('ingredient.id'), primary_key=True)
-    amount = db.Column(db.Integer)
+    ingredient_id = db.Column(db.Integer, db.ForeignKey('ingredient.id'), primary_key=True, index=True)
+    amount = db.Column(db.Float)
     scaling = db.Column(db.Float, default=1)
 
     recipe = db.relationship("Recipe", back_populates='ingredients')
@@ -137,15 +214,22 @@ class RecipeIngredient(db.Model):
 
 class Meal(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    day = db.Column(db.DateTime, nullable=False)
+    day = db.Column(db.DateTime, nullable=False, index=True)
     name = db.Column(db.String(128), nullable=True)
     note = db.Column(db.Text, nullable=True)
     servings = db.Column(db.Integer, nullable=True)
 
-    recipe_id = db.Column(db.Integer, db.ForeignKey('recipe.id'))
+    recipe_id = db.Column(db.Integer, db.ForeignKey('recipe.id'), index=True)
     recipe = db.relationship('Recipe')
 
-    def __init__(self, day, recipe=None, name=None, note=None, servings=None):
+    # Meals without user are planned for the whole household
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True, index=True)
+    user = db.relationship('User')
+
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow,
+                           onupdate=datetime.utcnow, nullable=False, index=True)
+
+    def __init__(self, day, recipe=None, name=None, note=None, servings=None, user=None):
         self.day = day
 
         if recipe is not None:
@@ -156,25 +240,112 @@ class Meal(db.Model):
             self.note = note
         if servings is not None:
             self.servings = servings
+        if user is not None:
+            self.user = user
 
 
 class Grocery(db.Model):
+    """Item on the grocery list of a user.
+
+    Items with an ingredient are maintained from the planned meals, a row
+    per meal day, see grocerylist.py. Items with only a name are added
+    manually and have no day.
+    """
+    __table_args__ = (
+        db.Index('ix_grocery_user_id_ingredient_id_day', 'user_id', 'ingredient_id', 'day'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(128), nullable=True)
-    
-    #meal_id = db.Column(db.Integer, db.ForeignKey('meal.id'))
-    #meal = db.relationship('Meal')
-    
-    #ingredient_id = db.Column(db.Integer, db.ForeignKey('ingredient.id'))
-    #ingredient = db.relationship('Ingredient')
+    amount = db.Column(db.Float, nullable=True)
+    day = db.Column(db.DateTime, nullable=True)
+
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True)
+    user = db.relationship('User')
+
+    ingredient_id = db.Column(db.Integer, db.ForeignKey('ingredient.id'), nullable=True)
+    ingredient = db.relationship('Ingredient')
 
 
 
 class Tag(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    name = db.Column(db.String(128), nullable=False)
+    name = db.Column(db.String(128), nullable=False, unique=True, index=True)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow,
+                           onupdate=datetime.utcnow, nullable=False)
 
     recipes = db.relationship('Recipe', secondary=recipe_tag, back_populates='tags')
 
     def __init__(self, name):
         self.name = name
+
+
+def touched_recipe_ids(session):
+    """Collect the ids of recipes changed by the current flush.
+
+    Meant to be called from an ``after_flush`` session event. Besides recipes
+    themselves, changed ingredient listings and renamed tags, ingredients or
+    categories mark the related recipes as touched.
+    """
+    ids = set()
+    renamed_tags, renamed_ingredients, renamed_categories = set(), set(), set()
+    for obj in set(session.new) | set(session.dirty) | set(session.deleted):
+        if isinstance(obj, Recipe):
+            ids.add(obj.id)
+        elif isinstance(obj, RecipeIngredient):
+            ids.add(obj.recipe_id)
+            ids.update(inspect(obj).attrs.recipe_id.history.deleted)
+        elif isinstance(obj, Tag) and inspect(obj).attrs.name.history.deleted:
+            renamed_tags.add(obj.id)
+        elif isinstance(obj, Ingredient) and inspect(obj).attrs.name.history.deleted:
+            renamed_ingredients.add(obj.id)
+        elif isinstance(obj, Category) and inspect(obj).attrs.name.history.deleted:
+            renamed_categories.add(obj.id)
+
+    connection = session.connection()
+    if renamed_tags:
+        ids.update(row[0] for row in connection.execute(
+            select([recipe_tag.c.recipe_id])
+            .where(recipe_tag.c.tag_id.in_(renamed_tags))))
+    if renamed_ingredients:
+        table = RecipeIngredient.__table__
+        ids.update(row[0] for row in connection.execute(
+            select([table.c.recipe_id])
+            .where(table.c.ingredient_id.in_(renamed_ingredients))))
+    if renamed_categories:
+        table = Recipe.__table__
+        ids.update(row[0] for row in connection.execute(
+            select([table.c.id])
+            .where(table.c.category_id.in_(renamed_categories))))
+
+    ids.discard(None)
+    return ids
+
+
+@event.listens_for(db.session, 'after_flush')
+def _collect_touched(session, flush_context):
+    """Remember which recipes are changed by this flush."""
+    ids = touched_recipe_ids(session)
+    if ids:
+        session.info.setdefault('touched_recipe_ids', set()).update(ids)
+
+
+@event.listens_for(db.session, 'after_flush_postexec')
+def touch(session, flush_context):
+    """Increment the version and update time of changed recipes.
+
+    This runs within the flushing transaction, so changes of listings, tags
+    or categories are visible on the recipe row as well (fragment cache keys
+    and HTTP validators are derived from it).
+    """
+    ids = session.info.pop('touched_recipe_ids', None)
+    if not ids:
+        return
+
+    table = Recipe.__table__
+    session.connection().execute(table.update().where(table.c.id.in_(ids))
+                                      .values(version=table.c.version + 1,
+                                              updated_at=datetime.utcnow()))
+    for recipe in session.identity_map.values():
+        if isinstance(recipe, Recipe) and recipe.id in ids:
+            session.expire(recipe, ['version', 'updated_at'])
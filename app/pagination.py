@@ -0,0 +1,78 @@
+"""Keyset (cursor) pagination.
+
+Instead of OFFSET, a page starts right after the sort key of the last item
+of the previous page. The sort key must be unique (end it with a primary
+key) and every page costs a single bounded query, however deep the reader
+scrolls. Cursors are the opaque, url-safe encoding of such a sort key.
+"""
+import base64
+import json
+from sqlalchemy import and_, or_
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode(values):
+    """Encode sort key values as an opaque cursor."""
+    data = json.dumps(list(values), separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(data).decode().rstrip('=')
+
+
+def decode(cursor, length):
+    """Decode a cursor into a list with the expected number of values."""
+    try:
+        data = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        values = json.loads(data)
+    except (ValueError, TypeError):
+        raise InvalidCursor(cursor)
+
+    if not isinstance(values, list) or len(values) != length:
+        raise InvalidCursor(cursor)
+    return values
+
+
+def after(keys, values):
+    """Return the condition selecting rows sorted after given key values.
+
+    This is the row value comparison (k1, k2, ...) > (v1, v2, ...) written
+    out, since not every database supports tuple comparisons.
+    """
+    clauses = []
+    for i, (key, value) in enumerate(zip(keys, values)):
+        equal = [k == v for k, v in zip(keys[:i], values[:i])]
+        clauses.append(and_(*equal, key > value))
+    return or_(*clauses)
+
+
+def page(query, keys, values=None, limit=24):
+    """Return up to limit items of query sorted after given key values.
+
+    The query is ordered ascending by the given key expressions, which must
+    identify a row uniquely. Besides the items, the key values of the last
+    item are returned when more items follow, otherwise None.
+    """
+    labelled = [key.label('_key{}'.format(i)) for i, key in enumerate(keys)]
+    query = query.add_columns(*labelled).order_by(*keys)
+    if values:
+        query = query.filter(after(keys, values))
+
+    rows = query.limit(limit + 1).all()
+    items = [row[0] for row in rows[:limit]]
+    last = None
+    if len(rows) > limit:
+        last = list(rows[limit - 1][1:])
+
+    return items, last
+
+
+def paginate(query, keys, cursor=None, limit=24):
+    """Return a page of items of query and the cursor of the next page.
+
+    See page() for the requirements of the keys. The next cursor is None on
+    the last page.
+    """
+    values = decode(cursor, len(keys)) if cursor else None
+    items, last = page(query, keys, values, limit)
+    return items, encode(last) if last is not None else None
@@ -5,5 +5,11 @@ echo "Run flask migration upgrades (show current version first)"
 flask db current
 flask db upgrade
 
+echo "Rebuild grocery lists (drops meals of the past)"
+flask groceries rebuild
+
+echo "Compute similar recipes"
+flask recipes similar --if-empty
+
 echo "Compile translation files"
 flask translate compile
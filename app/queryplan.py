@@ -0,0 +1,70 @@
+"""Query plans of the core queries of the application.
+
+The queries below mirror the hot paths of the views. Printing their plans
+(``flask explain``) shows whether the database uses the expected indexes, so
+a missing index or a regression in a query is visible at a glance.
+"""
+from collections import OrderedDict
+from datetime import date
+import fulltext
+import sampling
+from app import db
+from models import User, Setting, Category, Tag, UserRecipe, Recipe, Meal
+
+
+def core_queries():
+    """Return an ordered mapping of query names to ORM queries."""
+    queries = OrderedDict()
+    pivot = sampling.pivot()
+
+    queries['home: inspiration'] = Recipe.query \
+        .filter(Recipe.shuffle >= pivot) \
+        .order_by(Recipe.shuffle, Recipe.id).limit(4)
+    queries['home: meal planning'] = Meal.query \
+        .filter(Meal.day >= date.today()).order_by(Meal.day)
+    queries['login: user by name'] = User.query.filter_by(name='name')
+    queries['locale: setting by name'] = Setting.query \
+        .filter(Setting.name == 'default_language')
+    queries['profile: setting by name and value'] = Setting.query \
+        .filter_by(name='grocery_day').filter_by(value='sat')
+    listing = Recipe.query.filter(Recipe.shuffle >= pivot)
+    queries['recipes: listing page'] = listing \
+        .order_by(Recipe.shuffle, Recipe.id).limit(25)
+    queries['recipes: category filter'] = listing \
+        .filter(Recipe.category.has(Category.name.in_(['main']))) \
+        .order_by(Recipe.shuffle, Recipe.id).limit(25)
+    queries['recipes: tag filter'] = listing \
+        .filter(Recipe.tags.any(Tag.name.in_(['vegetarian']))) \
+        .order_by(Recipe.shuffle, Recipe.id).limit(25)
+
+    hits = fulltext.ranked('example')
+    queries['search: full-text'] = Recipe.query \
+        .join(hits, hits.c.id == Recipe.id) \
+        .order_by(hits.c.score, Recipe.id).limit(10)
+
+    queries['recipe: user rating'] = UserRecipe.query \
+        .filter_by(recipe_id=1).filter_by(author_id=1)
+    return queries
+
+
+def explain(connection, query):
+    """Return the plan rows of the database for the given ORM query."""
+    dialect = connection.dialect
+    compiled = query.statement.compile(dialect=dialect)
+    if dialect.name == 'sqlite':
+        prefix = 'EXPLAIN QUERY PLAN '
+    else:
+        prefix = 'EXPLAIN '
+
+    if dialect.positional:
+        params = tuple(compiled.params[name] for name in compiled.positiontup)
+    else:
+        params = compiled.params
+    return connection.execute(prefix + str(compiled), params).fetchall()
+
+
+def report():
+    """Yield (name, sql, plan rows) of all core queries."""
+    with db.engine.connect() as connection:
+        for name, query in core_queries().items():
+            yield name, str(query.statement), explain(connection, query)
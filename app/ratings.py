@@ -0,0 +1,51 @@
+"""Recipe ratings.
+
+Every user rates a recipe at most once (UserRecipe.rating, 0 is unrated).
+The recipe keeps the sum and number of these ratings, its average is derived
+from both. A rating changes the sum by the difference with the user's
+previous rating in a single UPDATE statement, so concurrent raters never
+overwrite each other's changes and sum and count always agree.
+"""
+from datetime import datetime
+from app import db
+from sqlalchemy import case, func, select
+from models import Recipe, UserRecipe
+
+# Ratings range from 1 to MAX_RATING stars
+MAX_RATING = 5
+
+
+def valid(rating):
+    """Check whether rating is a number of stars."""
+    return isinstance(rating, int) and not isinstance(rating, bool) \
+        and 1 <= rating <= MAX_RATING
+
+
+def rate(recipe_id, user_id, rating):
+    """Store the rating of a user for a recipe in the current transaction.
+
+    Returns False when the recipe doesn't exist.
+    """
+    recipes = Recipe.__table__
+    user_recipes = UserRecipe.__table__
+    own = (user_recipes.c.recipe_id == recipe_id) & (user_recipes.c.author_id == user_id)
+
+    # The previous rating is read by the same statement which updates the
+    # totals; the recipe row stays locked until the transaction ends.
+    previous = func.coalesce(select([user_recipes.c.rating]).where(own).as_scalar(), 0)
+    result = db.session.execute(
+        recipes.update().where(recipes.c.id == recipe_id).values(
+            rating_sum=recipes.c.rating_sum + rating - previous,
+            rating_count=recipes.c.rating_count + case([(previous == 0, 1)], else_=0),
+            # Rating changes show on the cached recipe pages
+            version=recipes.c.version + 1,
+            updated_at=datetime.utcnow(),
+        ))
+    if result.rowcount == 0:
+        return False
+
+    result = db.session.execute(user_recipes.update().where(own).values(rating=rating))
+    if result.rowcount == 0:
+        db.session.execute(user_recipes.insert().values(
+            recipe_id=recipe_id, author_id=user_id, rating=rating))
+    return True
@@ -0,0 +1,307 @@
+"""Similar recipe recommendations.
+
+Recipes are compared by their features: ingredients, tags and category. The
+similarity of two recipes is the Jaccard index of their feature sets, the
+share of all their features they have in common.
+
+Comparing all pairs of recipes is quadratic, candidates are found by
+locality-sensitive hashing instead. Every recipe has a MinHash signature of
+BANDS * ROWS hashes, each the minimum of a hash function over its features,
+which two recipes share with a probability of their similarity. The
+signature is cut into BANDS bands of ROWS hashes, hashed to a bucket per
+band in the recipe_band table. Recipes sharing buckets of at most MAX_BUCKET
+recipes are candidates, most shared buckets first; the exact similarity of
+the best CANDIDATES decides the TOP_SIMILAR recipes kept in the
+similar_recipe table, which a recipe page reads with one indexed lookup.
+
+Session events refresh recipes whose ingredients, tags or category changed
+within the flushing transaction: their buckets and lists are replaced, they
+are added to the lists of their candidates where they rank high enough and
+lists which included them are computed again. Bulk imports refresh once at
+the end; ``flask recipes similar`` rebuilds everything (a minute or two for
+100k recipes), which the container does on start when nothing is computed.
+"""
+import heapq
+import logging
+import random
+import struct
+import zlib
+from collections import Counter, defaultdict
+from app import db
+from sqlalchemy import and_, bindparam, event, func, inspect, or_, select
+from models import Recipe, RecipeBand, RecipeIngredient, SimilarRecipe, recipe_tag
+
+LOGGER = logging.getLogger(__name__)
+
+# Signature of BANDS bands of ROWS hashes: recipes with a similarity of 0.5
+# share a band with a probability of 99%, of 0.25 with 40%
+BANDS = 32
+ROWS = 3
+
+# Buckets of more recipes (sharing only common features, like salt and the
+# main course category) don't make candidates
+MAX_BUCKET = 300
+
+# Candidates compared exactly and recipes kept, per recipe
+CANDIDATES = 100
+TOP_SIMILAR = 10
+
+# Refreshing more recipes than this at once rebuilds all recommendations
+REBUILD_THRESHOLD = 1000
+
+# Rows per INSERT statement of a rebuild
+BATCH_SIZE = 5000
+
+_PRIME = 2 ** 31 - 1
+
+# Fixed hash functions (a * x + b) % _PRIME, buckets stored by one process
+# are looked up by all others
+_random = random.Random(5381)
+_COEFFICIENTS = [(_random.randrange(1, _PRIME), _random.randrange(_PRIME))
+                 for _ in range(BANDS * ROWS)]
+_hashes = {}
+
+
+def _feature_hashes(feature):
+    hashes = _hashes.get(feature)
+    if hashes is None:
+        hashes = _hashes[feature] = tuple((a * feature + b) % _PRIME for a, b in _COEFFICIENTS)
+    return hashes
+
+
+def signature(features):
+    """Return the MinHash signature of a non-empty set of features."""
+    return tuple(map(min, zip(*map(_feature_hashes, features))))
+
+
+def buckets(signature):
+    """Return the bucket of a signature in every band."""
+    data = struct.pack('<{}I'.format(len(signature)), *signature)
+    size = ROWS * 4
+    return [zlib.crc32(data[start:start + size]) & 0x7fffffff
+            for start in range(0, len(data), size)]
+
+
+def similarity(features, other):
+    """Return the Jaccard index of two sets of features."""
+    common = len(features & other)
+    return common / (len(features) + len(other) - common)
+
+
+def features(connection, ids=None):
+    """Return the features of recipes (all without ids) by recipe id.
+
+    Features are numbers: ingredient, tag and category ids, tagged by their
+    remainder modulo 3. Recipes without features are left out.
+    """
+    recipe, listing = Recipe.__table__, RecipeIngredient.__table__
+    queries = (
+        (select([listing.c.recipe_id, listing.c.ingredient_id]), listing.c.recipe_id, 0),
+        (select([recipe_tag.c.recipe_id, recipe_tag.c.tag_id]), recipe_tag.c.recipe_id, 1),
+        (select([recipe.c.id, recipe.c.category_id]).where(recipe.c.category_id.isnot(None)),
+         recipe.c.id, 2),
+    )
+    found = defaultdict(set)
+    for query, key, kind in queries:
+        params = {}
+        if ids is not None:
+            query = query.where(key.in_(bindparam('ids', expanding=True)))
+            params['ids'] = list(ids)
+        for id, value in connection.execute(query, **params):
+            found[id].add(value * 3 + kind)
+    return found
+
+
+def _rank(id, candidates, known):
+    """Return the (score, id) of candidates similar to recipe id, best first."""
+    scored = ((similarity(known[id], known[other]), other)
+              for other in candidates if other in known)
+    return sorted((item for item in scored if item[0] > 0), reverse=True)
+
+
+def _candidates(connection, ids):
+    """Return the best candidates by recipe id, from the stored buckets."""
+    table = RecipeBand.__table__
+    own, other, member = table.alias('own'), table.alias('other'), table.alias('member')
+    size = select([func.count()]).where(and_(member.c.band == own.c.band,
+                                             member.c.bucket == own.c.bucket)).as_scalar()
+    rows = connection.execute(
+        select([own.c.recipe_id, other.c.recipe_id, func.count()])
+        .select_from(own.join(other, and_(other.c.band == own.c.band,
+                                          other.c.bucket == own.c.bucket)))
+        .where(own.c.recipe_id.in_(bindparam('ids', expanding=True)))
+        .where(size <= MAX_BUCKET)
+        .where(other.c.recipe_id != own.c.recipe_id)
+        .group_by(own.c.recipe_id, other.c.recipe_id), ids=list(ids))
+    shared = defaultdict(list)
+    for id, candidate, count in rows:
+        shared[id].append((count, candidate))
+    return {id: [candidate for _, candidate in heapq.nlargest(CANDIDATES, found)]
+            for id, found in shared.items()}
+
+
+def _insert(connection, table, rows):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= BATCH_SIZE:
+            connection.execute(table.insert(), batch)
+            batch = []
+    if batch:
+        connection.execute(table.insert(), batch)
+
+
+def rebuild(connection):
+    """Compute the recommendations of all recipes from scratch."""
+    bands, similar = RecipeBand.__table__, SimilarRecipe.__table__
+    known = features(connection)
+    members = defaultdict(list)
+    keys = {}
+    for id, found in known.items():
+        keys[id] = list(enumerate(buckets(signature(found))))
+        for key in keys[id]:
+            members[key].append(id)
+
+    connection.execute(bands.delete())
+    connection.execute(similar.delete())
+    # In primary key order, inserts append to the index
+    _insert(connection, bands, ({'band': band, 'bucket': bucket, 'recipe_id': id}
+                                for (band, bucket), ids in sorted(members.items())
+                                for id in ids))
+
+    def rows():
+        for id, items in keys.items():
+            shared = Counter()
+            for key in items:
+                if len(members[key]) <= MAX_BUCKET:
+                    shared.update(members[key])
+            del shared[id]
+            candidates = shared if len(shared) <= CANDIDATES else \
+                [candidate for candidate, _ in shared.most_common(CANDIDATES)]
+            for score, other in _rank(id, candidates, known)[:TOP_SIMILAR]:
+                yield {'recipe_id': id, 'similar_id': other, 'score': score}
+
+    _insert(connection, similar, rows())
+    LOGGER.info("Computed the similar recipes of %s recipes", len(keys))
+
+
+def refresh(connection, ids):
+    """Refresh the recommendations after changes of the recipes with ids.
+
+    Ids of deleted recipes are removed from the recommendations.
+    """
+    ids = set(ids) - {None}
+    if not ids:
+        return
+    bands, similar = RecipeBand.__table__, SimilarRecipe.__table__
+    ids_param = bindparam('ids', expanding=True)
+
+    known = features(connection, ids)
+    connection.execute(bands.delete().where(bands.c.recipe_id.in_(ids_param)), ids=list(ids))
+    rows = [{'band': band, 'bucket': bucket, 'recipe_id': id}
+            for id, found in known.items()
+            for band, bucket in enumerate(buckets(signature(found)))]
+    if rows:
+        connection.execute(bands.insert(), rows)
+
+    # Lists including the changed recipes are computed again
+    affected = {row[0] for row in connection.execute(
+        select([similar.c.recipe_id]).where(similar.c.similar_id.in_(ids_param)),
+        ids=list(ids))} - ids
+    connection.execute(similar.delete().where(or_(
+        similar.c.recipe_id.in_(bindparam('lists', expanding=True)),
+        similar.c.similar_id.in_(ids_param))), lists=list(ids | affected), ids=list(ids))
+
+    candidates = _candidates(connection, ids | affected)
+    missing = ({id for found in candidates.values() for id in found} | affected) - known.keys()
+    known.update(features(connection, missing))
+
+    rows, offers = [], defaultdict(list)
+    for id, found in candidates.items():
+        ranked = _rank(id, found, known)
+        rows.extend({'recipe_id': id, 'similar_id': other, 'score': score}
+                    for score, other in ranked[:TOP_SIMILAR])
+        if id in ids:
+            for score, other in ranked:
+                if other not in ids and other not in affected:
+                    offers[other].append((score, id))
+
+    # Changed recipes join the lists of their candidates they rank high in
+    current = defaultdict(list)
+    if offers:
+        for id, other, score in connection.execute(
+                select([similar.c.recipe_id, similar.c.similar_id, similar.c.score])
+                .where(similar.c.recipe_id.in_(ids_param)), ids=list(offers)):
+            current[id].append((score, other))
+    dropped = []
+    for id, offered in offers.items():
+        kept = set(heapq.nlargest(TOP_SIMILAR, current[id] + offered))
+        rows.extend({'recipe_id': id, 'similar_id': other, 'score': score}
+                    for score, other in offered if (score, other) in kept)
+        dropped.extend({'recipe_id': id, 'similar_id': other}
+                       for score, other in current[id] if (score, other) not in kept)
+    if dropped:
+        connection.execute(similar.delete().where(and_(
+            similar.c.recipe_id == bindparam('recipe_id'),
+            similar.c.similar_id == bindparam('similar_id'))), dropped)
+    if rows:
+        connection.execute(similar.insert(), rows)
+
+
+def update(connection, ids):
+    """Refresh the recommendations of many recipes, rebuilding them all when
+    that is cheaper."""
+    ids = list(ids)
+    if len(ids) > REBUILD_THRESHOLD:
+        rebuild(connection)
+    else:
+        refresh(connection, ids)
+
+
+def computed():
+    """Check whether the recommendations were computed for any recipe."""
+    return db.session.query(RecipeBand.recipe_id).first() is not None
+
+
+def similar(recipe_id, limit=TOP_SIMILAR, options=()):
+    """Return the recipes most similar to a recipe, most similar first."""
+    return Recipe.query.options(*options) \
+                       .join(SimilarRecipe, SimilarRecipe.similar_id == Recipe.id) \
+                       .filter(SimilarRecipe.recipe_id == recipe_id) \
+                       .order_by(SimilarRecipe.score.desc(), Recipe.id) \
+                       .limit(limit).all()
+
+
+def changed_recipe_ids(session):
+    """Collect the ids of recipes whose features change in the current
+    flush, meant for an ``after_flush`` event."""
+    ids = set()
+    for obj in set(session.new) | set(session.dirty) | set(session.deleted):
+        if isinstance(obj, RecipeIngredient):
+            ids.add(obj.recipe_id)
+            ids.update(inspect(obj).attrs.recipe_id.history.deleted)
+        elif isinstance(obj, Recipe):
+            attrs = inspect(obj).attrs
+            if obj in session.new or obj in session.deleted \
+                    or attrs.category_id.history.has_changes() \
+                    or attrs.category.history.has_changes() \
+                    or attrs.tags.history.has_changes():
+                ids.add(obj.id)
+    ids.discard(None)
+    return ids
+
+
+@event.listens_for(db.session, 'after_flush')
+def _collect(session, flush_context):
+    """Remember which recipes need new recommendations after this flush."""
+    ids = changed_recipe_ids(session)
+    if ids:
+        session.info.setdefault('similar_ids', set()).update(ids)
+
+
+@event.listens_for(db.session, 'after_flush_postexec')
+def _refresh(session, flush_context):
+    """Refresh the recommendations within the flushing transaction."""
+    ids = session.info.pop('similar_ids', None)
+    if ids:
+        refresh(session.connection(), ids)
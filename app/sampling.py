@@ -0,0 +1,89 @@
+"""Cheap random ordering of recipes.
+
+Every recipe carries a random ``shuffle`` key. A pivot derived from the
+current date rotates the order of those keys, so "random" listings stay the
+same for the whole day and across the pages of a listing, while a different
+selection shows up the next day. The rotated order consists of two segments,
+keys from the pivot upwards followed by the keys below the pivot. Both are
+range scans on the indexed key instead of sorting the whole table by
+``random()``.
+"""
+import hashlib
+from datetime import date
+import pagination
+from sqlalchemy import bindparam, select
+from models import Recipe, SHUFFLE_RANGE, random_shuffle_key
+
+
+def pivot(day=None):
+    """Return the shuffle pivot for the given day (default: today)."""
+    day = day or date.today()
+    digest = hashlib.sha1(day.isoformat().encode()).hexdigest()
+    return int(digest, 16) % SHUFFLE_RANGE
+
+
+def segments(pivot):
+    """Return the conditions of both segments of the rotated order."""
+    return [Recipe.shuffle >= pivot, Recipe.shuffle < pivot]
+
+
+def sample(query, k, day=None):
+    """Return k recipes of query in the random order of the day.
+
+    Uses at most two range scans on the shuffle index, starting at the pivot
+    and wrapping around to the lowest keys when needed.
+    """
+    recipes = []
+    for segment in segments(pivot(day)):
+        recipes += query.filter(segment) \
+                        .order_by(Recipe.shuffle, Recipe.id) \
+                        .limit(k - len(recipes)).all()
+        if len(recipes) == k:
+            break
+    return recipes
+
+
+def paginate(query, cursor=None, limit=24, day=None):
+    """Return a page of recipes in the random order of the day.
+
+    Works like pagination.paginate(), the cursor additionally holds the
+    segment of the rotated order the next page starts in.
+    """
+    keys = [Recipe.shuffle, Recipe.id]
+    start, values = 0, None
+    if cursor:
+        start, *values = pagination.decode(cursor, 1 + len(keys))
+        if start not in (0, 1):
+            raise pagination.InvalidCursor(cursor)
+        if values[0] is None:
+            values = None
+
+    recipes = []
+    conditions = segments(pivot(day))
+    for segment in range(start, len(conditions)):
+        if len(recipes) == limit:
+            return recipes, pagination.encode([segment, None, None])
+
+        items, last = pagination.page(query.filter(conditions[segment]), keys,
+                                      values, limit - len(recipes))
+        recipes += items
+        if last is not None:
+            return recipes, pagination.encode([segment] + last)
+        values = None
+
+    return recipes, None
+
+
+def reshuffle(session, batch_size=1000):
+    """Assign new shuffle keys to all recipes, returns the number of recipes."""
+    table = Recipe.__table__
+    statement = table.update() \
+                     .where(table.c.id == bindparam('recipe_id')) \
+                     .values(shuffle=bindparam('key'))
+    ids = [row[0] for row in session.execute(select([table.c.id]))]
+    for i in range(0, len(ids), batch_size):
+        session.execute(statement, [
+            {'recipe_id': id, 'key': random_shuffle_key()}
+            for id in ids[i:i + batch_size]
+        ])
+    return len(ids)
@@ -0,0 +1,69 @@
+"""Recipe ingredients scaled to other servings.
+
+Amounts follow the scaling factor of every ingredient listing, like grocery
+lists do (see grocerylist.py): all ingredients of a recipe are scaled by one
+query. Amounts are shown as cooks write them: small amounts as whole numbers
+and common fractions (1½, ⅔), others as decimals in the format of the
+locale.
+
+Scaled listings are kept in a process-level cache per recipe version,
+servings and locale, so switching the servings of a recipe page is a single
+indexed lookup of the recipe version.
+"""
+from flask_babel import format_decimal, get_locale
+from app import app, db
+from cache import TTLCache
+from sqlalchemy import literal
+import grocerylist
+from models import Recipe, RecipeIngredient
+
+# Most servings a recipe can be scaled to
+MAX_SERVINGS = 50
+
+# Fractions shown for small amounts, and the largest difference between an
+# amount and its fraction
+FRACTIONS = ((0, ''), (1 / 8, '⅛'), (1 / 4, '¼'), (1 / 3, '⅓'), (1 / 2, '½'),
+             (2 / 3, '⅔'), (3 / 4, '¾'), (1, ''))
+TOLERANCE = 0.03
+
+# Amounts from here on are rounded to whole numbers
+WHOLE = 10
+
+_cache = TTLCache(maxsize=int(app.config['SCALING_CACHE_SIZE']),
+                  ttl=int(app.config['SCALING_CACHE_TTL']))
+
+
+def friendly(amount):
+    """Format an amount as a whole number, a fraction or a decimal."""
+    if amount is None:
+        return ''
+    if amount >= WHOLE:
+        return format_decimal(round(amount), format='#,##0')
+
+    whole, rest = divmod(amount, 1)
+    value, symbol = min(FRACTIONS, key=lambda fraction: abs(fraction[0] - rest))
+    if abs(value - rest) > TOLERANCE or not (whole or value):
+        return format_decimal(amount, format='#,##0.#' if whole else '0.##')
+    whole = int(whole + (value == 1))
+    return '{}{}'.format(whole or '', symbol)
+
+
+def scale(recipe_id, servings):
+    """Return the (ingredient id, amount) of a recipe scaled to servings."""
+    amount = grocerylist.scaled_amount(literal(servings))
+    rows = db.session.query(RecipeIngredient.ingredient_id, amount) \
+                     .join(Recipe, Recipe.id == RecipeIngredient.recipe_id) \
+                     .filter(RecipeIngredient.recipe_id == recipe_id) \
+                     .order_by(RecipeIngredient.ingredient_id)
+    return [(id, max(value, 0) if value is not None else None) for id, value in rows]
+
+
+def scaled(recipe_id, version, servings):
+    """Return the scaled ingredients of a recipe version for the locale.
+
+    Returns a list of {id, amount, text} dicts, text is the friendly amount.
+    """
+    def compute():
+        return [{'id': id, 'amount': amount, 'text': friendly(amount)}
+                for id, amount in scale(recipe_id, servings)]
+    return _cache.get_or_set((recipe_id, version, servings, str(get_locale())), compute)
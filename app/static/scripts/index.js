@@ -72,4 +72,220 @@ class Profile extends Entity {
     }
 }
 
-export {Recipe, Profile};
\ No newline at end of file
+class RecipeListing {
+    _resource = '';
+    _cursor = null;
+    _loading = false;
+
+    constructor(resource, cursor) {
+        this._resource = resource
+        this._cursor = cursor
+    }
+
+    get done() {
+        return !this._cursor
+    }
+
+    async next() {
+        let url = new URL(this._resource, window.location.href)
+        url.searchParams.set('after', this._cursor)
+        let response = await fetch(url)
+
+        if (!response.ok) {
+            throw new Error(`Server response ${response.status}: `)
+        }
+
+        let json = await response.json()
+        this._cursor = json.next
+        return json.results
+    }
+
+    scroll(container, sentinel) {
+        let observer = new IntersectionObserver(async (entries) => {
+            if (!entries[0].isIntersecting || this._loading) {
+                return
+            }
+
+            this._loading = true
+            try {
+                for (let recipe of await this.next()) {
+                    let column = document.createElement('div')
+                    column.className = 'four wide column'
+                    column.innerHTML = recipe.card
+                    container.appendChild(column)
+                }
+            } finally {
+                this._loading = false
+            }
+
+            if (this.done) {
+                observer.disconnect()
+                sentinel.remove()
+            }
+        })
+        observer.observe(sentinel)
+    }
+}
+
+class PantryRecipes {
+    _resource = '';
+
+    constructor(resource) {
+        this._resource = resource
+    }
+
+    async load(missing) {
+        let url = new URL(this._resource, window.location.href)
+        url.searchParams.set('missing', missing)
+        let response = await fetch(url)
+
+        if (!response.ok) {
+            throw new Error(`Server response ${response.status}: `)
+        }
+        return response.json()
+    }
+
+    async show(container, missing) {
+        let json = await this.load(missing)
+        container.replaceChildren()
+        for (let recipe of json.results) {
+            let item = document.createElement('a')
+            item.className = 'item'
+            item.href = recipe.link
+
+            let image = document.createElement('img')
+            image.className = 'ui tiny image'
+            image.src = recipe.image
+            image.alt = ''
+            item.appendChild(image)
+
+            let content = document.createElement('div')
+            content.className = 'middle aligned content'
+            let header = document.createElement('div')
+            header.className = 'header'
+            header.textContent = recipe.title
+            content.appendChild(header)
+            if (recipe.missing.length) {
+                let description = document.createElement('div')
+                description.className = 'description'
+                description.textContent = '+ ' + recipe.missing.join(', ')
+                content.appendChild(description)
+            }
+            item.appendChild(content)
+            container.appendChild(item)
+        }
+        return json.results.length
+    }
+}
+
+class MealPlan {
+    _resource = '';
+    _days = [];
+
+    constructor(resource) {
+        this._resource = resource
+    }
+
+    async load(constraints, seed) {
+        let url = new URL(this._resource, window.location.href)
+        for (let [name, value] of constraints) {
+            if (value) {
+                url.searchParams.append(name, value)
+            }
+        }
+        if (seed) {
+            url.searchParams.set('seed', seed)
+        }
+        let response = await fetch(url)
+
+        if (!response.ok) {
+            throw new Error(`Server response ${response.status}: `)
+        }
+        return response.json()
+    }
+
+    async show(container, summary, constraints, seed) {
+        let json = await this.load(constraints, seed)
+        this._days = json.days
+        container.replaceChildren()
+        for (let planned of json.days) {
+            let row = document.createElement('tr')
+            let day = document.createElement('td')
+            day.textContent = new Date(planned.day + 'T00:00').toLocaleDateString(undefined, {
+                weekday: 'long', day: 'numeric', month: 'short'})
+            row.appendChild(day)
+
+            let cell = document.createElement('td')
+            let link = document.createElement('a')
+            link.href = planned.recipe.link
+            let image = document.createElement('img')
+            image.className = 'ui avatar image'
+            image.src = planned.recipe.image
+            image.alt = ''
+            link.appendChild(image)
+            link.append(planned.recipe.title)
+            cell.appendChild(link)
+            row.appendChild(cell)
+            container.appendChild(row)
+        }
+        summary.textContent = json.ingredients.length
+            ? `${json.ingredients.length} ingredients to buy: ${json.ingredients.join(', ')}`
+            : ''
+        return json.days.length
+    }
+
+    async save() {
+        let response = await fetch(this._resource, {
+            method: 'POST',
+            headers: {'Content-Type': 'application/json;charset=utf-8'},
+            body: JSON.stringify({
+                meals: this._days.map((planned) => ({day: planned.day, recipe: planned.recipe.id}))
+            })
+        })
+
+        if (!response.ok) {
+            throw new Error(`Server response ${response.status}: `)
+        }
+        return response.json()
+    }
+}
+
+class ScaledRecipe {
+    _resource = '';
+    _servings = null;
+    _loaded = new Map();
+
+    constructor(resource) {
+        this._resource = resource
+    }
+
+    async load(servings) {
+        if (!this._loaded.has(servings)) {
+            let url = new URL(this._resource, window.location.href)
+            url.searchParams.set('servings', servings)
+            let response = await fetch(url)
+
+            if (!response.ok) {
+                throw new Error(`Server response ${response.status}: `)
+            }
+            this._loaded.set(servings, await response.json())
+        }
+        return this._loaded.get(servings)
+    }
+
+    async show(table, servings) {
+        this._servings = servings
+        let json = await this.load(servings)
+        if (servings != this._servings) {
+            return
+        }
+        for (let ingredient of json.ingredients) {
+            let row = table.querySelector(`tr[data-ingredient="${ingredient.id}"]`)
+            if (row) {
+                row.querySelector('.amount').textContent = ingredient.text
+            }
+        }
+    }
+}
+
+export {Recipe, Profile, RecipeListing, PantryRecipes, MealPlan, ScaledRecipe};
\ No newline at end of file
@@ -0,0 +1,100 @@
+"""Statistics of the recipe collection.
+
+summary() returns all statistics in a single query: every statistic is a
+scalar subquery, registered with the @statistic decorator, of one SELECT.
+The statistics are the same for all users and kept under one entry of a
+process-level cache for STATS_CACHE_TTL seconds. A committed transaction
+which adds, changes or removes recipes, ingredients, tags or categories
+clears the cache of this process; other processes (and bulk imports) catch
+up when their entries expire.
+
+New statistics only need a function returning a scalar SELECT::
+
+    @statistic('published')
+    def _published():
+        return select([func.count(Recipe.id)]).where(Recipe.published)
+"""
+from collections import OrderedDict
+from app import app, db
+from cache import TTLCache
+from sqlalchemy import event, func, select
+from models import Category, Ingredient, Recipe, Tag
+
+STATISTICS = OrderedDict()
+
+# Changes to these models clear the cache
+MODELS = (Recipe, Ingredient, Tag, Category)
+
+_cache = TTLCache(maxsize=1, ttl=int(app.config['STATS_CACHE_TTL']))
+
+
+def statistic(name):
+    """Register a function returning the scalar SELECT of a statistic."""
+    def register(function):
+        STATISTICS[name] = function
+        return function
+    return register
+
+
+@statistic('recipes')
+def _recipes():
+    return select([func.count(Recipe.id)])
+
+
+@statistic('ingredients')
+def _ingredients():
+    return select([func.count(Ingredient.id)])
+
+
+@statistic('tags')
+def _tags():
+    return select([func.count(Tag.id)])
+
+
+@statistic('categories')
+def _categories():
+    return select([func.count(Category.id)])
+
+
+def _query():
+    columns = [function().as_scalar().label(name) for name, function in STATISTICS.items()]
+    row = db.session.execute(select(columns)).first()
+    return dict(zip(STATISTICS, row))
+
+
+def summary():
+    """Return the statistics as a dict."""
+    return dict(_cache.get_or_set('summary', _query))
+
+
+def invalidate():
+    """Drop all cached statistics of this process."""
+    _cache.clear()
+
+
+def changed(session):
+    """Clear the cache when the transaction of session commits.
+
+    Needed after writes which bypass the ORM, flushes are tracked already.
+    """
+    session.info['stats_changed'] = True
+
+
+@event.listens_for(db.session, 'after_flush')
+def _collect(session, flush_context):
+    """Remember whether this flush changed any counted rows."""
+    for obj in set(session.new) | set(session.dirty) | set(session.deleted):
+        if isinstance(obj, MODELS):
+            changed(session)
+            return
+
+
+@event.listens_for(db.session, 'after_commit')
+def _invalidate(session):
+    if session.info.pop('stats_changed', False):
+        invalidate()
+
+
+@event.listens_for(db.session, 'after_rollback')
+def _discard(session):
+    session.info.pop('stats_changed', None)
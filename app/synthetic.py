@@ -0,0 +1,239 @@
+"""Synthetic data for load tests and benchmarks.
+
+generate() fills the database with users, recipes and meal plans drawn from
+a seeded random generator, the same seed always gives the same data. The
+distributions follow real recipe collections: a few ingredients (onion,
+garlic, oil) and tags are in most recipes, most of them are rare. Recipes
+are written through the bulk import (see transfer.py), users, ratings and
+meals by multi-row INSERTs, so 100k recipes take a minute or two.
+
+All users get the password 'password'.
+"""
+import logging
+import random
+from datetime import date, datetime, timedelta
+from itertools import accumulate
+from app import db
+from sqlalchemy import and_, func, select
+from werkzeug.security import generate_password_hash
+import fulltext
+import grocerylist
+import transfer
+from models import Category, Grocery, Ingredient, Meal, Recipe, RecipeBand, RecipeIngredient, \
+    SHUFFLE_RANGE, Setting, SimilarRecipe, Tag, User, UserRecipe, recipe_tag, user_setting
+
+LOGGER = logging.getLogger(__name__)
+
+PASSWORD = 'password'
+
+CATEGORIES = (('Main', 50), ('Side dish', 12), ('Starter', 10), ('Desert', 10),
+              ('Breakfast', 9), ('Lunch', 9))
+
+SITE_SETTINGS = (('grocery_day', 'sat'), ('default_servings', '2'),
+                 ('allow_user_registration', 'true'), ('default_language', 'en'))
+
+TAGS = ('Vegetarian', 'Quick', 'Italian', 'Healthy', 'Indian', 'Vegan', 'Spicy',
+        'Comfort food', 'Lactose free', 'Gluten free', 'Mexican', 'Moroccan', 'Thai',
+        'Chinese', 'Japanese', 'French', 'Greek', 'Barbecue', 'One pot', 'Kids',
+        'Budget', 'Festive', 'Summer', 'Winter', 'Oven', 'Slow cooker', 'Low carb',
+        'High protein', 'Street food', 'Soup')
+
+# Ingredients are a base with an optional variety, the base decides the unit
+BASES = (('Onion', 'pc'), ('Garlic', 'clove'), ('Olive oil', 'tbsp'), ('Salt', 'tsp'),
+         ('Pepper', 'tsp'), ('Butter', 'g'), ('Tomato', 'g'), ('Rice', 'g'),
+         ('Pasta', 'g'), ('Potato', 'g'), ('Carrot', 'g'), ('Chicken', 'g'),
+         ('Beef', 'g'), ('Pork', 'g'), ('Fish', 'g'), ('Egg', 'pc'), ('Milk', 'ml'),
+         ('Cream', 'ml'), ('Cheese', 'g'), ('Flour', 'g'), ('Sugar', 'g'),
+         ('Lemon', 'pc'), ('Stock', 'ml'), ('Beans', 'g'), ('Lentils', 'g'),
+         ('Mushroom', 'g'), ('Pepper', 'pc'), ('Spinach', 'g'), ('Coriander', 'g'),
+         ('Basil', 'g'), ('Ginger', 'g'), ('Chili', 'pc'), ('Coconut milk', 'ml'),
+         ('Yoghurt', 'ml'), ('Bread', 'slice'), ('Cabbage', 'g'), ('Leek', 'pc'),
+         ('Courgette', 'g'), ('Aubergine', 'g'), ('Apple', 'pc'))
+VARIETIES = ('', 'red', 'white', 'fresh', 'dried', 'smoked', 'organic', 'green',
+             'sweet', 'baby', 'wild', 'black', 'young', 'aged', 'ground', 'whole')
+
+ADJECTIVES = ('Spicy', 'Creamy', 'Smoky', 'Quick', 'Classic', 'Roasted', 'Crispy',
+              'Grandma\'s', 'Rustic', 'Zesty', 'Hearty', 'Light', 'Golden', 'Sticky')
+DISHES = ('stew', 'curry', 'salad', 'soup', 'pie', 'bake', 'stir-fry', 'pasta',
+          'risotto', 'tajine', 'wraps', 'burger', 'omelette', 'casserole', 'tart')
+WORDS = ('add', 'stir', 'season', 'simmer', 'chop', 'slice', 'fry', 'bake', 'serve',
+         'the', 'and', 'until', 'golden', 'tender', 'minutes', 'with', 'gently',
+         'pan', 'oven', 'bowl', 'mix', 'heat', 'low', 'high', 'well', 'taste')
+
+
+def zipf_weights(count, exponent=1.1):
+    """Return cumulative weights making rank r about 1/r^exponent as likely."""
+    return list(accumulate(1 / (rank ** exponent) for rank in range(1, count + 1)))
+
+
+def sentence(rng, words=12):
+    """Return a random sentence."""
+    text = ' '.join(rng.choice(WORDS) for _ in range(words))
+    return text.capitalize() + '.'
+
+
+def ingredient_pool(rng, recipes):
+    """Return the (name, unit) ingredients to draw from, most popular first."""
+    size = min(len(BASES) * len(VARIETIES), 200 + recipes // 100)
+    pool = [(' '.join(filter(None, (variety, base.lower()))).capitalize(), unit)
+            for variety in VARIETIES for base, unit in BASES]
+    head, tail = pool[:len(BASES)], pool[len(BASES):]
+    rng.shuffle(tail)
+    return (head + tail)[:size]
+
+
+def recipes(rng, count, authors):
+    """Yield count recipe records for transfer.load()."""
+    pool = ingredient_pool(rng, count)
+    ingredient_weights = zipf_weights(len(pool))
+    tag_weights = zipf_weights(len(TAGS), 0.8)
+    categories = [name for name, weight in CATEGORIES]
+    category_weights = list(accumulate(weight for name, weight in CATEGORIES))
+
+    for number in range(count):
+        listing = {}
+        while len(listing) < max(2, min(20, int(rng.gauss(8, 3)))):
+            name, unit = rng.choices(pool, cum_weights=ingredient_weights)[0]
+            listing[name, unit] = {
+                'name': name, 'unit': unit,
+                'amount': rng.choice((1, 2, 3, 5, 10, 50, 100, 150, 200, 250, 400, 500)),
+                'scaling': rng.choice((1.0, 1.0, 1.0, 0.5, 0.75)),
+            }
+
+        yield {
+            'name': '{} {} {}'.format(rng.choice(ADJECTIVES), rng.choice(pool)[0].lower(),
+                                      rng.choice(DISHES)),
+            'author': rng.choice(authors),
+            'servings': rng.choice((1, 2, 2, 4, 4, 4, 6, 8)),
+            'prep_time': rng.choice((5, 10, 15, 20, 30, 45)),
+            'cook_time': rng.choice((0, 10, 15, 20, 30, 45, 60, 90, 120)),
+            'intro': sentence(rng, 8),
+            'description': ' '.join(sentence(rng) for _ in range(rng.randint(1, 4))),
+            'directions': '\n\n'.join(sentence(rng, 20) for _ in range(rng.randint(2, 8))),
+            'published': rng.random() < 0.9,
+            'shuffle': rng.randrange(SHUFFLE_RANGE),
+            'category': rng.choices(categories, cum_weights=category_weights)[0],
+            'tags': sorted({rng.choices(TAGS, cum_weights=tag_weights)[0]
+                            for _ in range(rng.choice((0, 1, 1, 2, 2, 3, 4)))}),
+            'ingredients': list(listing.values()),
+        }
+
+
+def _insert(table, rows, batch_size):
+    """Insert rows from an iterable in multi-row batches, returns the count."""
+    count, batch = 0, []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= batch_size:
+            db.session.execute(table.insert(), batch)
+            count += len(batch)
+            batch = []
+    if batch:
+        db.session.execute(table.insert(), batch)
+        count += len(batch)
+    return count
+
+
+def users(count, batch_size):
+    """Insert count users, returns their (id, name) rows."""
+    password = generate_password_hash(PASSWORD)
+    table = User.__table__
+    start = (db.session.execute(select([func.max(table.c.id)])).scalar() or 0) + 1
+    width = len(str(start + count))
+    _insert(table, ({'id': id, 'name': 'user{:0{}}'.format(id, width),
+                     'email': 'user{:0{}}@example.com'.format(id, width),
+                     'password': password} for id in range(start, start + count)),
+            batch_size)
+    return [(id, 'user{:0{}}'.format(id, width)) for id in range(start, start + count)]
+
+
+def ratings(rng, user_ids, recipe_ids, per_user, batch_size):
+    """Let every user rate about per_user popular recipes."""
+    weights = zipf_weights(len(recipe_ids), 0.9)
+
+    def rows():
+        for user_id in user_ids:
+            rated = set(rng.choices(recipe_ids, cum_weights=weights,
+                                    k=max(0, int(rng.gauss(per_user, per_user / 3)))))
+            for recipe_id in rated:
+                yield {'author_id': user_id, 'recipe_id': recipe_id,
+                       'rating': min(5, max(1, round(rng.gauss(3.8, 1))))}
+
+    count = _insert(UserRecipe.__table__, rows(), batch_size)
+
+    # Totals of all rated recipes in a single statement, as the migration
+    recipe, user_recipe = Recipe.__table__, UserRecipe.__table__
+    rated = and_(user_recipe.c.recipe_id == recipe.c.id, user_recipe.c.rating > 0)
+    db.session.execute(recipe.update().values(
+        rating_sum=select([func.coalesce(func.sum(user_recipe.c.rating), 0)])
+                   .where(rated).as_scalar(),
+        rating_count=select([func.count()]).where(rated).as_scalar()))
+    return count
+
+
+def meals(rng, user_ids, recipe_ids, start, days, batch_size):
+    """Plan a meal on most days for every user, returns the count."""
+    weights = zipf_weights(len(recipe_ids), 0.7)
+    now = datetime.utcnow()
+
+    def rows():
+        for user_id in user_ids:
+            for offset in range(days):
+                if rng.random() < 0.8:
+                    day = datetime.combine(start + timedelta(days=offset), datetime.min.time())
+                    yield {'user_id': user_id, 'day': day,
+                           'recipe_id': rng.choices(recipe_ids, cum_weights=weights)[0],
+                           'servings': rng.choice((None, None, 2, 4)),
+                           'updated_at': now}
+
+    return _insert(Meal.__table__, rows(), batch_size)
+
+
+def reset():
+    """Delete all data the generator creates."""
+    for table in (SimilarRecipe.__table__, RecipeBand.__table__,
+                  Grocery.__table__, Meal.__table__, UserRecipe.__table__,
+                  recipe_tag, RecipeIngredient.__table__, Recipe.__table__,
+                  Ingredient.__table__, Tag.__table__, Category.__table__,
+                  user_setting, Setting.__table__, User.__table__):
+        db.session.execute(table.delete())
+    fulltext.rebuild(db.session.connection())
+    db.session.commit()
+
+
+def generate(seed=0, users_count=100, recipes_count=10000, months=3, ratings_per_user=20,
+             today=None, batch_size=transfer.BATCH_SIZE):
+    """Generate a data set, returns a dict with the number of created rows.
+
+    Meals are planned from months before until two weeks after today.
+    """
+    rng = random.Random(seed)
+    today = today or date.today()
+    created = {}
+
+    if not db.session.query(Setting.id).filter(Setting.site).first():
+        _insert(Setting.__table__, ({'name': name, 'value': value, 'site': True}
+                                    for name, value in SITE_SETTINGS), batch_size)
+    created['users'] = users_count
+    user_rows = users(users_count, batch_size)
+    db.session.commit()
+
+    first = db.session.execute(select([func.max(Recipe.id)])).scalar() or 0
+    authors = [name for id, name in user_rows] or ['SueChef']
+    created['recipes'] = transfer.load(recipes(rng, recipes_count, authors), batch_size)
+    recipe_ids = [id for id, in db.session.execute(
+        select([Recipe.id]).where(Recipe.id > first).order_by(Recipe.id))]
+    if not recipe_ids:
+        return created
+
+    user_ids = [id for id, name in user_rows]
+    created['ratings'] = ratings(rng, user_ids, recipe_ids, ratings_per_user, batch_size)
+    start = today - timedelta(days=30 * months)
+    created['meals'] = meals(rng, user_ids, recipe_ids, start,
+                             (today - start).days + 14, batch_size)
+    db.session.commit()
+
+    for user_id in user_ids:
+        grocerylist.rebuild(user_id)
+    db.session.commit()
+    return created
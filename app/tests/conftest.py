@@ -0,0 +1,64 @@
+"""Test fixtures: the application on a temporary SQLite database.
+
+The application reads its configuration from the environment when it is
+imported, so the database is chosen before the first import. The schema is
+created by the migrations (which also fill the unit table) once per run,
+every test starts from empty tables.
+"""
+import os
+import sys
+import tempfile
+import pytest
+
+APP_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATABASE = os.path.join(tempfile.mkdtemp(prefix='groceries-test-'), 'test.db')
+
+os.environ.update(SQLALCHEMY_DATABASE_URI='sqlite:///' + DATABASE, SECRET_KEY='test',
+                  FRAGMENT_CACHE='', LOG_ASYNC='', LOG_LEVEL='WARNING')
+sys.path.insert(0, APP_ROOT)
+
+from app import app as flask_app, db  # noqa: E402
+
+# Tables filled by the migrations, kept between tests
+STATIC_TABLES = ('unit',)
+
+
+@pytest.fixture(scope='session')
+def app():
+    import flask_migrate
+    flask_app.config.update(TESTING=True, WTF_CSRF_ENABLED=False)
+    with flask_app.app_context():
+        flask_migrate.upgrade(directory=os.path.join(APP_ROOT, 'migrations'))
+    return flask_app
+
+
+@pytest.fixture
+def session(app):
+    """Database session of a test, the tables are emptied afterwards."""
+    import usersettings
+    with app.app_context():
+        yield db.session
+        db.session.rollback()
+        for table in reversed(db.metadata.sorted_tables):
+            if table.name not in STATIC_TABLES:
+                db.session.execute(table.delete())
+        db.session.commit()
+        usersettings._cache.clear()
+
+
+@pytest.fixture
+def user(session):
+    from models import User
+    user = User(name='alice', email='alice@example.com', password='')
+    user.set_password('secret')
+    session.add(user)
+    session.commit()
+    return user
+
+
+@pytest.fixture
+def client(app, user):
+    client = app.test_client()
+    response = client.post('/login', data={'username': 'alice', 'password': 'secret'})
+    assert response.status_code == 302
+    return client
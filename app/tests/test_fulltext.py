@@ -0,0 +1,16 @@
+"""Tests of the full-text recipe search."""
+from app import db
+import fulltext
+from models import Recipe
+
+
+def test_ranked(session):
+    soup = Recipe(name='Tomato soup', author='test', description='Warm.', servings=2)
+    salad = Recipe(name='Salad', author='test', description='With a tomato.', servings=2)
+    session.add_all([soup, salad])
+    session.commit()
+
+    hits = fulltext.ranked('tomat')
+    ids = [id for id, in db.session.query(hits.c.id).order_by(hits.c.score, hits.c.id)]
+    assert ids == [soup.id, salad.id]
+    assert fulltext.ranked('?!') is None
@@ -0,0 +1,185 @@
+"""Tests of the grocery list aggregation and /api/groceries."""
+from datetime import date, datetime, timedelta
+import pytest
+import grocerylist
+from models import Grocery, Ingredient, Meal, Recipe, RecipeIngredient, User
+
+START = date(2030, 3, 4)
+END = date(2030, 3, 11)
+
+
+def recipe(session, name, servings, listings):
+    """Add a recipe with (ingredient, amount, scaling) listings."""
+    recipe = Recipe(name=name, author='test', description='', servings=servings)
+    for ingredient, amount, scaling in listings:
+        listing = RecipeIngredient(ingredient, amount)
+        listing.scaling = scaling
+        recipe.ingredients.append(listing)
+    session.add(recipe)
+    return recipe
+
+
+def meal(session, recipe, day, servings=None):
+    session.add(Meal(day, recipe, servings=servings))
+
+
+@pytest.fixture
+def pantry(session):
+    """Ingredients of a pasta serving 4, basil is a pantry item."""
+    tomato, salt, basil = Ingredient('Tomato', 'g'), Ingredient('Salt', 'tsp'), \
+        Ingredient('Basil', 'g')
+    basil.pantry = True
+    pasta = recipe(session, 'Pasta', 4, [(tomato, 400, 1.0), (salt, 2, 0.5), (basil, 10, 1.0)])
+    session.commit()
+    return pasta
+
+
+def amounts(items):
+    return {(item.name, item.unit): pytest.approx(item.amount) for item in items}
+
+
+def test_scales_by_meal_servings(session, pantry):
+    meal(session, pantry, datetime(2030, 3, 5), servings=2)
+    session.commit()
+
+    # Salt follows half of the change in servings
+    assert amounts(grocerylist.aggregate(None, START, END)) == {
+        ('Tomato', 'g'): 200, ('Salt', 'tsp'): 1.5}
+
+
+def test_scales_by_default_servings(session, pantry):
+    meal(session, pantry, datetime(2030, 3, 5))
+    session.commit()
+
+    assert amounts(grocerylist.aggregate(None, START, END, 8)) == {
+        ('Tomato', 'g'): 800, ('Salt', 'tsp'): 3}
+    assert amounts(grocerylist.aggregate(None, START, END)) == {
+        ('Tomato', 'g'): 400, ('Salt', 'tsp'): 2}
+
+
+def test_scales_linearly_without_scaling(session):
+    rice = recipe(session, 'Rice', 2, [(Ingredient('Rice', 'g'), 150, None)])
+    meal(session, rice, datetime(2030, 3, 5), servings=3)
+    session.commit()
+
+    assert amounts(grocerylist.aggregate(None, START, END)) == {('Rice', 'g'): 225}
+
+
+def test_leaves_out_pantry_items(session, pantry):
+    meal(session, pantry, datetime(2030, 3, 5))
+    session.commit()
+
+    names = {item.name for item in grocerylist.aggregate(None, START, END)}
+    assert 'Basil' not in names
+
+
+def test_merges_by_ingredient_and_unit(session, pantry):
+    tomato = Ingredient.query.filter_by(name='Tomato').one()
+    soup = recipe(session, 'Soup', 4, [(tomato, 100, 1.0), (Ingredient('Tomato', 'kg'), 1, 1.0),
+                                       (Ingredient('Tomato', 'pc'), 3, 1.0)])
+    meal(session, pantry, datetime(2030, 3, 5))
+    meal(session, pantry, datetime(2030, 3, 6))
+    meal(session, soup, datetime(2030, 3, 7))
+    session.commit()
+
+    # Grams and kilos make one row, pieces don't convert to grams
+    assert amounts(grocerylist.aggregate(None, START, END)) == {
+        ('Tomato', 'kg'): 1.9, ('Tomato', 'pc'): 3, ('Salt', 'tsp'): 4}
+
+
+def test_window_includes_start_and_excludes_end(session, pantry):
+    meal(session, pantry, datetime(2030, 3, 3, 23, 59))
+    meal(session, pantry, datetime(2030, 3, 4))
+    meal(session, pantry, datetime(2030, 3, 10, 20, 0))
+    meal(session, pantry, datetime(2030, 3, 11))
+    session.commit()
+
+    assert amounts(grocerylist.aggregate(None, START, END)) == {
+        ('Tomato', 'g'): 800, ('Salt', 'tsp'): 4}
+    assert amounts(grocerylist.aggregate(None, END, date(2030, 3, 12))) == {
+        ('Tomato', 'g'): 400, ('Salt', 'tsp'): 2}
+
+
+def test_api(client, session, pantry):
+    meal(session, pantry, datetime(2030, 3, 5), servings=2)
+    other = User(name='bob', email='bob@example.com', password='')
+    session.add(Meal(datetime(2030, 3, 6), pantry, servings=4, user=other))
+    session.commit()
+
+    response = client.get('/api/groceries?start=2030-03-04&end=2030-03-11')
+    assert response.status_code == 200
+    json = response.get_json()
+    assert (json['start'], json['end']) == ('2030-03-04', '2030-03-11')
+    assert [(item['name'], item['unit'], item['amount']) for item in json['items']] == [
+        ('Salt', 'tsp', 1.5), ('Tomato', 'g', 200)]
+
+
+def test_api_null_amounts(client, session):
+    stock = recipe(session, 'Stock', 2, [(Ingredient('Water', 'ml'), None, 1.0)])
+    meal(session, stock, datetime(2030, 3, 5))
+    session.commit()
+
+    response = client.get('/api/groceries?start=2030-03-04&end=2030-03-11')
+    assert response.status_code == 200
+    assert response.get_json()['items'][0]['amount'] is None
+
+
+def test_api_default_window(client, session, pantry):
+    meal(session, pantry, datetime.combine(date.today(), datetime.min.time()))
+    session.commit()
+
+    json = client.get('/api/groceries').get_json()
+    assert json['start'] == date.today().isoformat()
+    assert {item['name'] for item in json['items']} == {'Tomato', 'Salt'}
+
+
+def test_api_invalid_dates(client):
+    assert client.get('/api/groceries?start=tomorrow').status_code == 400
+
+
+def test_listing_leaves_out_past_days(session, user, pantry):
+    tomato = pantry.ingredients[0].ingredient
+    session.add(Meal(datetime(2030, 3, 6), pantry, servings=4, user=user))
+    session.add(Grocery(ingredient=tomato, amount=100, user=user,
+                        day=datetime.combine(date.today() - timedelta(days=1), datetime.min.time())))
+    session.add(Grocery(name='Soap', user=user))
+    session.commit()
+
+    assert amounts(grocerylist.listing(user.id)) == {
+        ('Tomato', 'g'): 400, ('Salt', 'tsp'): 2, ('Soap', None): None}
+
+    grocerylist.rebuild(user.id)
+    session.commit()
+    assert session.query(Grocery).filter(Grocery.day < date.today()).count() == 0
+    assert grocerylist.drift(user.id) == {}
+
+
+def test_listing_follows_pantry(session, user, pantry):
+    tomato, basil = pantry.ingredients[0].ingredient, pantry.ingredients[2].ingredient
+    session.add(Meal(datetime(2030, 3, 5), pantry, servings=4, user=user))
+    session.commit()
+
+    tomato.pantry, basil.pantry = True, False
+    session.commit()
+    assert amounts(grocerylist.listing(user.id)) == {
+        ('Salt', 'tsp'): 2, ('Basil', 'g'): 10}
+    assert grocerylist.drift(user.id) == {}
+
+    tomato.pantry = False
+    session.commit()
+    assert amounts(grocerylist.listing(user.id)) == {
+        ('Tomato', 'g'): 400, ('Salt', 'tsp'): 2, ('Basil', 'g'): 10}
+    assert grocerylist.drift(user.id) == {}
+
+
+def test_aggregates_meals_of_user_and_household(session, user, pantry):
+    meal(session, pantry, datetime(2030, 3, 5))
+    session.add(Meal(datetime(2030, 3, 6), pantry, servings=4, user=user))
+    session.add(Meal(datetime(2030, 3, 7), pantry, servings=4,
+                     user=User(name='bob', email='bob@example.com', password='')))
+    session.commit()
+
+    assert amounts(grocerylist.aggregate(user.id, START, END)) == {
+        ('Tomato', 'g'): 800, ('Salt', 'tsp'): 4}
+    assert amounts(grocerylist.aggregate(None, START, END)) == {
+        ('Tomato', 'g'): 400, ('Salt', 'tsp'): 2}
@@ -0,0 +1,22 @@
+"""Tests of the meal plan generator."""
+from datetime import date
+import mealplan
+from models import Ingredient, Recipe, RecipeIngredient, UserRecipe
+
+
+def recipe(session, name, ingredient):
+    recipe = Recipe(name=name, author='test', description='', servings=2)
+    recipe.ingredients.append(RecipeIngredient(ingredient, 1))
+    session.add(recipe)
+    return recipe
+
+
+def test_plans_own_recipes(session, user):
+    rice = Ingredient('Rice', 'g')
+    own, other = recipe(session, 'Risotto', rice), recipe(session, 'Paella', rice)
+    user.recipes.append(UserRecipe(own))
+    session.commit()
+
+    plan = mealplan.generate(user.id, days=2, seed=1, today=date(2030, 3, 4))
+    assert plan.recipes == [own.id]
+    assert plan.days == [date(2030, 3, 4)]
@@ -0,0 +1,37 @@
+"""Tests of recipes scaled to other servings."""
+import scaling
+from models import Category, Ingredient, Recipe, RecipeIngredient
+
+
+def pasta(session):
+    recipe = Recipe(name='Pasta', author='test', description='', servings=4, img='default.jpg')
+    recipe.category = Category('Main')
+    recipe.ingredients.append(RecipeIngredient(Ingredient('Tomato', 'g'), 400))
+    recipe.ingredients.append(RecipeIngredient(Ingredient('Lemon', 'pc'), 1))
+    session.add(recipe)
+    session.commit()
+    return recipe
+
+
+def test_friendly():
+    assert [scaling.friendly(amount) for amount in (None, 0.5, 1.5, 0.34, 2.2, 12.4)] == [
+        '', '½', '1½', '⅓', '2.2', '12']
+
+
+def test_recipe_page_shows_default_servings(client, session):
+    recipe = pasta(session)
+
+    # The site default is 2 servings
+    html = client.get('/recipes/{}/pasta'.format(recipe.id)).get_data(as_text=True)
+    assert 'value="2"' in html
+    assert '>200</td>' in html and '>½</td>' in html
+
+
+def test_api_scaled(client, session):
+    recipe = pasta(session)
+
+    response = client.get('/api/recipes/{}/scaled?servings=6'.format(recipe.id))
+    assert response.status_code == 200
+    assert [(item['amount'], item['text']) for item in response.get_json()['ingredients']] == [
+        (600, '600'), (1.5, '1½')]
+    assert client.get('/api/recipes/{}/scaled?servings=0'.format(recipe.id)).status_code == 400
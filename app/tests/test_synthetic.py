@@ -0,0 +1,17 @@
+"""Tests of the synthetic data generator."""
+from datetime import date
+import synthetic
+from models import Recipe
+
+
+def generated(seed):
+    synthetic.reset()
+    synthetic.generate(seed, users_count=2, recipes_count=20, months=0, today=date(2030, 3, 4))
+    return [(recipe.name, recipe.shuffle) for recipe in Recipe.query.order_by(Recipe.id)]
+
+
+def test_same_seed_gives_same_data(session):
+    first = generated(7)
+    assert len(first) == 20
+    assert generated(7) == first
+    assert generated(8) != first
@@ -0,0 +1,58 @@
+"""Tests of the recipe import."""
+import json
+import pytest
+import transfer
+from models import Recipe
+
+
+def lines(count, fail_after=None):
+    for number in range(1, count + 1):
+        if number == fail_after:
+            raise RuntimeError('interrupted')
+        yield json.dumps({'name': 'Recipe {}'.format(number), 'servings': 2,
+                          'description': 'Cook it.'})
+
+
+def test_resumed_import_recommends_all_imported_recipes(session, tmp_path, monkeypatch):
+    updated = []
+    monkeypatch.setattr(transfer.recommendations, 'update',
+                        lambda connection, ids: updated.extend(ids))
+    checkpoint = str(tmp_path / 'import.checkpoint')
+
+    with pytest.raises(RuntimeError):
+        transfer.import_(lines(4, fail_after=3), checkpoint, batch_size=1)
+    first_id = transfer.load_checkpoint(checkpoint)[1]
+    assert transfer.load_checkpoint(checkpoint) == (2, first_id)
+
+    assert transfer.import_(lines(4), checkpoint, batch_size=1) == (2, 0)
+    assert updated == list(range(first_id, first_id + 4))
+
+
+@pytest.mark.parametrize('fields', [
+    {'ingredients': ['salt']},
+    {'ingredients': {'name': 'Salt', 'unit': 'g'}},
+    {'ingredients': [{'name': 'Salt', 'unit': 'g', 'amount': 'a pinch'}]},
+    {'tags': 'Indian'},
+    {'tags': ['Indian', 3]},
+])
+def test_parse_rejects_malformed_lists(fields):
+    line = json.dumps(dict({'name': 'Curry', 'servings': 2, 'description': 'Cook it.'}, **fields))
+    with pytest.raises(transfer.InvalidRecord):
+        transfer.parse(line, 1)
+
+
+def test_import_keeps_missing_amounts(session, monkeypatch):
+    monkeypatch.setattr(transfer.recommendations, 'update', lambda connection, ids: None)
+    record = {'name': 'Curry', 'servings': 2, 'description': 'Cook it.', 'tags': ['Indian'],
+              'ingredients': [{'name': 'Salt', 'unit': 'tsp', 'amount': None},
+                              {'name': 'Rice', 'unit': 'g', 'amount': None},
+                              {'name': 'Rice', 'unit': 'g', 'amount': 100},
+                              {'name': 'Rice', 'unit': 'g', 'amount': 50}]}
+
+    assert transfer.import_([json.dumps(record), '["salt"]']) == (1, 1)
+    recipe = Recipe.query.filter_by(name='Curry').one()
+    assert [tag.name for tag in recipe.tags] == ['Indian']
+    assert {listing.ingredient.name: listing.amount for listing in recipe.ingredients} == {
+        'Salt': None, 'Rice': 150}
+    assert {item['name']: item['amount'] for item in transfer.record(recipe)['ingredients']} == {
+        'Salt': None, 'Rice': 150}
@@ -0,0 +1,291 @@
+"""Bulk export and import of recipes as JSON Lines.
+
+Every line holds one recipe with its category, tags and ingredient listing::
+
+    {"name": "Fish curry", "author": "SueChef", "servings": 4, ...,
+     "category": "Main", "tags": ["Indian"],
+     "ingredients": [{"name": "Rice", "unit": "g", "amount": 320, "scaling": 1.0}]}
+
+Both directions work in batches, so memory use doesn't depend on the number
+of recipes. An import writes every batch with a few multi-row INSERTs in its
+own transaction. Categories, tags and ingredients are matched by name (and
+unit) through caches and only missing ones are created. After every
+committed batch the number of processed lines and the first imported id
+are written to a checkpoint file, an interrupted import continues after the
+last committed batch. The similar recipes (see recommendations.py) of all
+imported recipes, those of earlier runs included, are updated once at the
+end.
+
+Recipe ids are assigned by the import, so it shouldn't run while recipes
+are created through the application.
+"""
+import json
+import logging
+import os
+from app import db
+from sqlalchemy import func, select
+from sqlalchemy.orm import joinedload, selectinload
+import fulltext
+import pagination
+import recommendations
+from models import Category, Ingredient, Recipe, RecipeIngredient, Tag, recipe_tag, \
+    SHUFFLE_RANGE, random_shuffle_key
+
+LOGGER = logging.getLogger(__name__)
+
+BATCH_SIZE = 1000
+
+# Recipe columns exported and imported as is
+FIELDS = ('name', 'author', 'img', 'source', 'source_url', 'prep_time', 'cook_time',
+          'servings', 'intro', 'description', 'directions', 'published')
+REQUIRED = ('name', 'servings', 'description')
+
+
+class InvalidRecord(ValueError):
+    pass
+
+
+def record(recipe):
+    """Return the export record of a recipe."""
+    data = {field: getattr(recipe, field) for field in FIELDS}
+    data['category'] = recipe.category.name if recipe.category else None
+    data['tags'] = sorted(tag.name for tag in recipe.tags)
+    data['ingredients'] = [{
+        'name': listing.ingredient.name,
+        'unit': listing.ingredient.unit,
+        'amount': listing.amount,
+        'scaling': listing.scaling,
+    } for listing in recipe.ingredients]
+    return data
+
+
+def export(out, batch_size=BATCH_SIZE):
+    """Write all recipes to the file out, returns the number of recipes."""
+    query = Recipe.query.options(
+        joinedload(Recipe.category),
+        selectinload(Recipe.tags),
+        selectinload(Recipe.ingredients).joinedload(RecipeIngredient.ingredient))
+
+    count, last = 0, None
+    while True:
+        recipes, last = pagination.page(query, [Recipe.id], last, batch_size)
+        for recipe in recipes:
+            out.write(json.dumps(record(recipe), ensure_ascii=False) + '\n')
+        count += len(recipes)
+        # Loaded recipes aren't needed anymore, keep the session small
+        db.session.expunge_all()
+        if last is None:
+            return count
+
+
+class _Names:
+    """Get-or-create cache of the ids of named rows (categories, tags)."""
+
+    def __init__(self, model):
+        self.table = model.__table__
+        self.ids = {name: id for name, id in db.session.execute(
+            select([self.table.c.name, self.table.c.id]))}
+
+    def resolve(self, names):
+        """Make sure all names exist, returns nothing."""
+        missing = {name for name in names if name not in self.ids}
+        if missing:
+            db.session.execute(self.table.insert(), [{'name': name} for name in missing])
+            self.ids.update((name, id) for name, id in db.session.execute(
+                select([self.table.c.name, self.table.c.id])
+                .where(self.table.c.name.in_(missing))))
+
+
+class _Ingredients(_Names):
+    """Get-or-create cache of ingredient ids by (name, unit)."""
+
+    def __init__(self):
+        self.table = Ingredient.__table__
+        self.ids = {(name, unit): id for id, name, unit in db.session.execute(
+            select([self.table.c.id, self.table.c.name, self.table.c.unit]))}
+
+    def resolve(self, keys):
+        missing = {key for key in keys if key not in self.ids}
+        if missing:
+            db.session.execute(self.table.insert(), [
+                {'name': name, 'unit': unit, 'pantry': False} for name, unit in missing])
+            rows = db.session.execute(
+                select([self.table.c.id, self.table.c.name, self.table.c.unit])
+                .where(self.table.c.name.in_({name for name, unit in missing})))
+            for id, name, unit in rows:
+                self.ids.setdefault((name, unit), id)
+
+
+def parse(line, number):
+    """Parse and check an import line, raises InvalidRecord."""
+    try:
+        data = json.loads(line)
+    except ValueError as e:
+        raise InvalidRecord('line {}: {}'.format(number, e))
+
+    if not isinstance(data, dict):
+        raise InvalidRecord('line {}: not an object'.format(number))
+    for field in REQUIRED:
+        if data.get(field) in (None, ''):
+            raise InvalidRecord('line {}: missing {}'.format(number, field))
+    shuffle = data.get('shuffle')
+    if shuffle is not None and (not isinstance(shuffle, int) or isinstance(shuffle, bool)
+                                or not 0 <= shuffle < SHUFFLE_RANGE):
+        raise InvalidRecord('line {}: invalid shuffle key'.format(number))
+    tags = data.get('tags') or []
+    if not isinstance(tags, list) or not all(isinstance(tag, str) for tag in tags):
+        raise InvalidRecord('line {}: tags are not a list of names'.format(number))
+    ingredients = data.get('ingredients') or []
+    if not isinstance(ingredients, list) \
+            or not all(isinstance(ingredient, dict) for ingredient in ingredients):
+        raise InvalidRecord('line {}: ingredients are not a list of objects'.format(number))
+    for ingredient in ingredients:
+        if not ingredient.get('name') or not ingredient.get('unit'):
+            raise InvalidRecord('line {}: ingredient without name or unit'.format(number))
+        amount = ingredient.get('amount')
+        if amount is not None and (not isinstance(amount, (int, float))
+                                   or isinstance(amount, bool)):
+            raise InvalidRecord('line {}: ingredient amount is not a number'.format(number))
+    return data
+
+
+def _first_id():
+    return (db.session.execute(select([func.max(Recipe.id)])).scalar() or 0) + 1
+
+
+def _write(records, categories, tags, ingredients, author):
+    """Insert a batch of parsed records, returns the new recipe ids."""
+    categories.resolve({data['category'] for data in records if data.get('category')})
+    tags.resolve({tag for data in records for tag in data.get('tags') or []})
+    ingredients.resolve({(item['name'], item['unit']) for data in records
+                         for item in data.get('ingredients') or []})
+
+    start = _first_id()
+    recipes, listings, links = [], [], []
+    for id, data in enumerate(records, start):
+        recipe = {field: data.get(field) for field in FIELDS}
+        recipe['id'] = id
+        recipe['author'] = recipe['author'] or author
+        recipe['published'] = bool(recipe['published'])
+        recipe['img'] = recipe['img'] or 'default.jpg'
+        recipe['category_id'] = categories.ids.get(data.get('category'))
+        # Generated data brings its own shuffle key (see synthetic.py)
+        recipe['shuffle'] = data['shuffle'] if data.get('shuffle') is not None \
+            else random_shuffle_key()
+        recipes.append(recipe)
+
+        links.extend({'recipe_id': id, 'tag_id': tags.ids[tag]}
+                     for tag in set(data.get('tags') or []))
+
+        # The same ingredient listed twice is summed, it's a single row
+        # without amount when none of them has one
+        amounts = {}
+        for item in data.get('ingredients') or []:
+            ingredient_id = ingredients.ids[item['name'], item['unit']]
+            listing = amounts.setdefault(ingredient_id, {
+                'recipe_id': id, 'ingredient_id': ingredient_id,
+                'amount': None, 'scaling': item.get('scaling', 1.0)})
+            if item.get('amount') is not None:
+                listing['amount'] = (listing['amount'] or 0) + item['amount']
+        listings.extend(amounts.values())
+
+    db.session.execute(Recipe.__table__.insert(), recipes)
+    if listings:
+        db.session.execute(RecipeIngredient.__table__.insert(), listings)
+    if links:
+        db.session.execute(recipe_tag.insert(), links)
+    return [recipe['id'] for recipe in recipes]
+
+
+def _save_checkpoint(path, lines, first_id):
+    temporary = path + '.tmp'
+    with open(temporary, 'w') as f:
+        f.write('{} {}'.format(lines, first_id))
+    os.replace(temporary, path)
+
+
+def load_checkpoint(path):
+    """Return the number of lines processed by an earlier import and the
+    first id it imported (None if unknown)."""
+    try:
+        with open(path) as f:
+            values = [int(value) for value in f.read().split()]
+    except FileNotFoundError:
+        return 0, None
+    lines = values[0] if values else 0
+    return lines, values[1] if len(values) > 1 else None
+
+
+def _commit(batch, caches, author, checkpoint=None, lines=None, first_id=None):
+    """Write and commit a batch, then record the processed lines."""
+    ids = _write(batch, *caches, author)
+    fulltext.reindex(db.session.connection(), ids)
+    db.session.commit()
+    if checkpoint:
+        _save_checkpoint(checkpoint, lines, first_id)
+    return len(ids)
+
+
+def _recommend(first_id):
+    """Update the recommendations for the recipes imported from first_id on."""
+    ids = [row[0] for row in db.session.execute(
+        select([Recipe.id]).where(Recipe.id >= first_id))]
+    if ids:
+        recommendations.update(db.session.connection(), ids)
+        db.session.commit()
+
+
+def load(records, batch_size=BATCH_SIZE, author='import'):
+    """Insert recipe records (dicts as in an export) in committed batches.
+
+    Returns the number of inserted recipes.
+    """
+    caches = (_Names(Category), _Names(Tag), _Ingredients())
+    first_id = _first_id()
+    count, batch = 0, []
+    for data in records:
+        batch.append(data)
+        if len(batch) >= batch_size:
+            count += _commit(batch, caches, author)
+            batch = []
+
+    if batch:
+        count += _commit(batch, caches, author)
+    _recommend(first_id)
+    return count
+
+
+def import_(lines, checkpoint=None, batch_size=BATCH_SIZE, author='import', strict=False):
+    """Import recipes from an iterable of JSON lines.
+
+    Lines before the checkpoint are skipped. Invalid lines are logged and
+    skipped, or raise an InvalidRecord when strict. Returns the numbers of
+    imported and skipped recipes.
+    """
+    done, first_id = load_checkpoint(checkpoint) if checkpoint else (0, None)
+    caches = (_Names(Category), _Names(Tag), _Ingredients())
+    if first_id is None:
+        first_id = _first_id()
+    imported = skipped = 0
+
+    batch, number = [], done
+    for number, line in enumerate(lines, 1):
+        if number <= done or not line.strip():
+            continue
+        try:
+            batch.append(parse(line, number))
+        except InvalidRecord as e:
+            if strict:
+                raise
+            LOGGER.warning("Skipped %s", e)
+            skipped += 1
+        if len(batch) >= batch_size:
+            imported += _commit(batch, caches, author, checkpoint, number, first_id)
+            batch = []
+
+    if batch:
+        imported += _commit(batch, caches, author, checkpoint, number, first_id)
+    _recommend(first_id)
+    if checkpoint and os.path.exists(checkpoint):
+        os.remove(checkpoint)
+    return imported, skipped
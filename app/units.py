@@ -0,0 +1,75 @@
+"""Units of ingredient amounts.
+
+Ingredient units are free-form strings. The unit table maps their spellings
+('g', 'gram', 'ts', 'theelepel') to a canonical symbol, a dimension and a
+factor: the amount of the dimension's base unit (grams, millilitres) in one
+unit. Amounts of the same dimension convert by the ratio of their factors,
+units missing from the table only match their own spelling.
+
+The table is small and read once into a process-level cache. Sums over many
+rows don't go through Python: convert_sum() joins the unit table into a
+query, so the database converts and sums the amounts per group and Python
+only picks the unit of every sum from the cached table.
+"""
+import logging
+from cache import TTLCache
+from app import app, db
+from sqlalchemy import func
+from sqlalchemy.orm import aliased
+from models import Unit
+
+LOGGER = logging.getLogger(__name__)
+
+_cache = TTLCache(maxsize=1, ttl=int(app.config['UNITS_CACHE_TTL']))
+
+
+class Units:
+    """The unit table: symbols by dimension and factor."""
+
+    def __init__(self, rows):
+        self.by_factor = {(dimension, factor): symbol
+                          for symbol, dimension, factor in rows}
+
+
+def table():
+    """Return the cached unit table."""
+    def load():
+        return Units(db.session.query(Unit.symbol, Unit.dimension, Unit.factor).distinct())
+    return _cache.get_or_set(None, load)
+
+
+def convert_sum(query, amount, unit, group_by, columns=None):
+    """Sum amounts of compatible units per group in one query.
+
+    The unit table is joined to query on the unit column, amounts are
+    converted to the base unit of their dimension and summed per group_by
+    columns and dimension. Every sum is expressed in the largest unit it was
+    summed from, or the smallest one when it's less than one of the largest:
+    500 g and 1 kg make 1.5 kg, 1 tsp and 1 tbsp make 1.33 tbsp.
+
+    Returns (columns..., amount, unit) tuples, columns default to group_by.
+    Ingredients of another dimension or an unknown unit make separate rows.
+    """
+    units = table()
+    spelling = aliased(Unit)
+    name = func.lower(func.trim(unit))
+    dimension = func.coalesce(spelling.dimension, name)
+    factor = func.coalesce(spelling.factor, 1.0)
+    columns = list(columns if columns is not None else group_by)
+
+    rows = query.outerjoin(spelling, spelling.name == name) \
+                .with_entities(*columns, func.sum(amount * factor), func.min(factor),
+                               func.max(factor), func.min(unit), dimension) \
+                .group_by(*group_by, dimension)
+
+    results = []
+    for *values, total, smallest, largest, spelled, dimension in rows:
+        symbol = units.by_factor.get((dimension, largest))
+        if symbol is None:
+            # Unknown unit, summed as is
+            results.append((*values, total, spelled))
+            continue
+        if total is not None and total < largest and smallest != largest:
+            symbol, largest = units.by_factor[dimension, smallest], smallest
+        results.append((*values, total / largest if total is not None else None, symbol))
+    return results
@@ -0,0 +1,144 @@
+"""Cached lookup of user settings.
+
+Settings of a user are read with a single query and kept in a process-level
+LRU cache with a short TTL, so the locale selector and the settings page
+don't hit the database on every request. Saving the profile invalidates the
+entry of the user in this process; other processes pick up the change when
+their entry expires.
+
+Every (name, value) pair is stored once and shared by the users who chose
+it. save() links a user to the pairs with a fixed number of statements,
+however many settings are saved.
+"""
+from app import app, db
+from cache import TTLCache
+from flask import g
+from sqlalchemy import select
+from models import Setting, user_setting
+
+SETTING_DEFAULTS = {
+    "allow_user_registration" :  True,
+    "default_category"        :  ["main"],
+    "default_servings"        :  2,
+    "default_duration"        :  ["0-15"],
+    "default_language"        :  "en-us",
+    "grocery_day"             :  "sat",
+}
+
+# Site settings (Setting.site) are the defaults of all users
+SITE = None
+
+_cache = TTLCache(maxsize=int(app.config['SETTINGS_CACHE_SIZE']),
+                  ttl=int(app.config['SETTINGS_CACHE_TTL']))
+
+
+def _query(user_id):
+    """Query the settings of a user (or the site) as a dict.
+
+    Settings with multiple values for the same name become a list.
+    """
+    query = db.session.query(Setting.name, Setting.value)
+    if user_id is SITE:
+        query = query.filter(Setting.site)
+    else:
+        query = query.join(user_setting) \
+                     .filter(user_setting.c.user_id == user_id)
+
+    settings = dict()
+    for name, value in query.order_by(Setting.id):
+        if name not in settings:
+            settings[name] = value
+        elif isinstance(settings[name], list):
+            settings[name].append(value)
+        else:
+            settings[name] = [settings[name], value]
+    return settings
+
+
+def stored(user_id):
+    """Return the stored settings of a user (or SITE) from the cache."""
+    return _cache.get_or_set(user_id, lambda: _query(user_id))
+
+
+def effective(user_id):
+    """Return the settings of a user completed with defaults.
+
+    Defaults come from the site-wide settings first, SETTING_DEFAULTS next.
+    The returned dict is a shallow copy, its keys may be changed by the
+    caller.
+    """
+    settings = dict(SETTING_DEFAULTS)
+    settings.update(stored(SITE))
+    if user_id is not SITE:
+        settings.update(stored(user_id))
+    return settings
+
+
+def _lookup(pairs):
+    """Return the ids of the stored settings among (name, value) pairs."""
+    table = Setting.__table__
+    rows = db.session.execute(
+        select([table.c.id, table.c.name, table.c.value])
+        .where(table.c.name.in_({name for name, value in pairs}))
+        .where(table.c.value.in_({value for name, value in pairs})))
+    return {(name, value): id for id, name, value in rows if (name, value) in pairs}
+
+
+def _upsert(pairs):
+    """Make sure all (name, value) pairs are stored, returns their ids."""
+    ids = _lookup(pairs)
+    missing = pairs - set(ids)
+    if missing:
+        # Ignore pairs a concurrent request stored in the meantime
+        prefix = {'sqlite': 'OR IGNORE', 'mysql': 'IGNORE'}.get(db.session.bind.dialect.name)
+        insert = Setting.__table__.insert()
+        if prefix:
+            insert = insert.prefix_with(prefix)
+        db.session.execute(insert, [{'name': name, 'value': value, 'site': False}
+                                    for name, value in missing])
+        ids.update(_lookup(missing))
+    return ids
+
+
+def save(user_id, pairs):
+    """Replace the settings of a user by the given (name, value) pairs.
+
+    Only changed links between the user and the settings are written.
+    Returns the names of the changed settings.
+    """
+    pairs = {(name, str(value)) for name, value in pairs}
+    names = {id: name for (name, value), id in (_upsert(pairs) if pairs else {}).items()}
+
+    table = Setting.__table__
+    current = {id: name for id, name in db.session.execute(
+        select([table.c.id, table.c.name]).select_from(table.join(user_setting))
+        .where(user_setting.c.user_id == user_id))}
+
+    added = set(names) - set(current)
+    removed = set(current) - set(names)
+    if removed:
+        db.session.execute(user_setting.delete()
+                           .where(user_setting.c.user_id == user_id)
+                           .where(user_setting.c.setting_id.in_(removed)))
+    if added:
+        db.session.execute(user_setting.insert(),
+                           [{'user_id': user_id, 'setting_id': id} for id in added])
+    return {names[id] for id in added} | {current[id] for id in removed}
+
+
+def invalidate(user_id):
+    """Drop the cached settings of a user (or SITE)."""
+    _cache.delete(user_id)
+
+
+def locale(user):
+    """Return the locale for user, resolved once per request."""
+    if 'locale' not in g:
+        user_id = SITE if user.is_anonymous else user.id
+        language = effective(user_id).get('default_language')
+        if language not in app.config['LANGUAGES']:
+            language = stored(SITE).get('default_language')
+        if language not in app.config['LANGUAGES']:
+            language = app.config['LANGUAGES'][0]
+        g.locale = language
+    return g.locale
@@ -1,63 +1,180 @@
 import logging
-import os
+import conditional
+import fragments
+import fulltext
+import grocerylist
+import images
+import ingredientindex
+import mealplan
+import pagination
+import ratings
+import recommendations
+import sampling
+import scaling
+import stats
+import usersettings
 from app import app, db
-from flask import request, jsonify, render_template, redirect, url_for, flash
+from flask import request, jsonify, render_template, redirect, url_for, flash, abort, \
+    get_template_attribute, send_from_directory
 from flask_login import login_required, current_user, login_user, logout_user
 from werkzeug.security import generate_password_hash
-from sqlalchemy.sql.expression import func
+from sqlalchemy import func, select
+from sqlalchemy.orm import joinedload, raiseload, selectinload
 from slugify import slugify
 from forms import LoginForm, RecipeForm, RegisterForm
-from models import User, Setting, Category, Tag, UserRecipe, Recipe, Ingredient, \
+from models import User, Category, Tag, UserRecipe, Recipe, Ingredient, \
     RecipeIngredient, Meal
-from datetime import date, timedelta
+from datetime import date
 from collections import defaultdict
 
 LOGGER = logging.getLogger(__name__)
 
-MEDIA_PATH = os.path.join(os.path.dirname(app.instance_path), app.config['UPLOAD_FOLDER'])
+# Maximum number of results of the quick search
+SEARCH_LIMIT = 10
 
-SETTING_DEFAULTS = {
-    "allow_user_registration" :  True,
-    "default_category"        :  ["main"],
-    "default_servings"        :  2,
-    "default_duration"        :  ["0-15"],
-    "default_language"        :  "en-us",
-    "grocery_day"             :  "sat",
-}
+# Minimal width of the images of quick search results
+SEARCH_IMAGE_WIDTH = 160
+
+# Number of recipes per page of the recipe listing, and the most an API
+# client may ask for
+PAGE_SIZE = 24
+MAX_PAGE_SIZE = 100
+
+# Number of similar recipes shown on a recipe page
+SIMILAR_LIMIT = 4
+
+
+def loaders(*options):
+    """Return loader options for a query whose results go to a template.
+
+    Every relationship a template touches must be loaded eagerly by the given
+    options. In debug mode any other relationship raises on access, so a new
+    lazy load (and its query per rendered item) is caught during development.
+    """
+    if app.debug:
+        options += (raiseload('*'),)
+    return options
+
+
+def catalog_state():
+    """Return cheap values which change with every recipe, category or tag.
+
+    Returns these values and the last update time among them.
+    """
+    columns = []
+    for model in (Recipe, Category, Tag):
+        columns.append(select([func.max(model.updated_at)]).as_scalar())
+        columns.append(select([func.count(model.id)]).as_scalar())
+    state = tuple(db.session.query(*columns).one())
+    return state, max((value for value in state[::2] if value), default=None)
 
 
 @app.route('/')
 def home():
-    recipes = Recipe.query.order_by(func.random()).limit(4).all()
-    meals = Meal.query.filter(Meal.day >= date.today()) \
+    meal_state = db.session.query(func.max(Meal.updated_at), func.count(Meal.id)) \
+                           .filter(Meal.day >= date.today()).one()
+    tag = conditional.etag(date.today(), catalog_state()[0], tuple(meal_state))
+    response = conditional.not_modified(tag)
+    if response:
+        return response
+
+    recipes = sampling.sample(
+        Recipe.query.options(*loaders(joinedload(Recipe.category))), 4)
+    meals = Meal.query.options(*loaders(joinedload(Meal.recipe))) \
+                      .filter(Meal.day >= date.today()) \
                       .order_by(Meal.day).all()
 
     days = defaultdict(list)
     for meal in meals:
         days[str(meal.day)].append(meal)
 
-    return render_template('home.html', recipes=recipes, days=days)
+    return conditional.validated(
+        render_template('home.html', recipes=recipes, days=days), tag)
 
 
 @app.route('/scheduler')
 @login_required
 def scheduler():
-    return render_template('scheduler.html')
+    chosen = usersettings.effective(current_user.id).get('default_category') or []
+    if isinstance(chosen, str):
+        chosen = [chosen]
+    categories = [name for name, in db.session.query(Category.name).order_by(Category.name)]
+    tags = [name for name, in db.session.query(Tag.name).order_by(Tag.name)]
+    return render_template('scheduler.html', categories=categories, tags=tags,
+                           chosen=[name.lower() for name in chosen])
 
 
-@app.route('/recipes')
+@app.route('/api/mealplan')
 @login_required
-def recipes():
+def api_mealplan():
+    """Meal plan for the open days until the next grocery day.
+
+    Recipes are limited to the given 'category' and 'tag' names and to a
+    preparation time of 'max_prep_time' minutes. 'days' plans that many days
+    from today instead, 'seed' draws another plan.
+    """
+    try:
+        max_prep_time = request.args.get('max_prep_time')
+        max_prep_time = int(max_prep_time) if max_prep_time else None
+        days = request.args.get('days')
+        days = int(days) if days else None
+    except ValueError:
+        abort(400)
+    if days is not None and not 1 <= days <= mealplan.MAX_DAYS:
+        abort(400)
+    constraints = mealplan.Constraints(request.args.getlist('category'),
+                                       request.args.getlist('tag'), max_prep_time)
+
+    plan = mealplan.generate(current_user.id, constraints, days, request.args.get('seed'))
+    recipes = {recipe.id: recipe for recipe in Recipe.query.options(*loaders())
+               .filter(Recipe.id.in_(plan.recipes))}
+    names = [name for name, in db.session.query(Ingredient.name)
+             .filter(Ingredient.id.in_(plan.ingredients)).order_by(Ingredient.name)]
+
+    return jsonify({
+        'ingredients': names,
+        'days': [{
+            'day': day.isoformat(),
+            'recipe': {
+                'id': id,
+                'title': recipes[id].name,
+                'image': images.url(recipes[id], SEARCH_IMAGE_WIDTH),
+                'link': url_for('recipe', id=id, name=slugify(recipes[id].name)),
+            },
+        } for day, id in zip(plan.days, plan.recipes) if id in recipes]
+    })
+
+
+@app.route('/api/mealplan', methods=['POST'])
+@login_required
+def api_mealplan_save():
+    """Plan the given meals, a list of {day, recipe}, on days still open."""
+    try:
+        meals = [(date.fromisoformat(meal['day']), int(meal['recipe']))
+                 for meal in request.json['meals']]
+    except (KeyError, TypeError, ValueError):
+        abort(400)
+    planned = mealplan.save(current_user.id, meals)
+    db.session.commit()
+    return jsonify({'planned': len(planned)}), 201
+
+
+def recipe_filter():
+    """Read the recipe listing filter from the request arguments."""
     filter = dict()
     filter['query'] = request.args.get('query')
     filter['categories'] = request.args.getlist('category')
     filter['tags'] = request.args.getlist('tag')
+    return filter
 
-    day = request.args.get('day')
 
-    query = Recipe.query.order_by(func.random())
-    if filter['query']:
-        query = query.filter(Recipe.name.ilike('%{}%'.format(filter['query'])))
+def recipe_page(filter):
+    """Return a page of recipes matching filter and the next page cursor.
+
+    Search results are sorted by relevance, other listings in the random
+    order of the day.
+    """
+    query = Recipe.query.options(*loaders(joinedload(Recipe.category)))
     if filter['categories']:
         query = query.filter(Recipe.category.has(
                     Category.name.in_(filter['categories'])
@@ -67,13 +184,101 @@ def recipes():
                     Tag.name.in_(filter['tags'])
                 ))
 
-    recipes = query.all()
+    cursor = request.args.get('after')
+    hits = fulltext.ranked(filter['query'])
+    try:
+        if hits is not None:
+            query = query.join(hits, hits.c.id == Recipe.id)
+            return pagination.paginate(query, [hits.c.score, Recipe.id],
+                                       cursor, PAGE_SIZE)
+        return sampling.paginate(query, cursor, PAGE_SIZE)
+    except pagination.InvalidCursor:
+        abort(400)
+
+
+@app.route('/recipes')
+@login_required
+def recipes():
+    filter = recipe_filter()
+    day = request.args.get('day')
+
+    state, modified = catalog_state()
+    tag = conditional.etag(date.today(), state, sorted(request.args.items(multi=True)))
+    response = conditional.not_modified(tag, modified)
+    if response:
+        return response
+
+    recipes, cursor = recipe_page(filter)
     categories = Category.query.all()
     tags = Tag.query.all()
 
-    return render_template('recipes.html',
-                           recipes=recipes, categories=categories, tags=tags,
-                           filter=filter, day=day)
+    # Arguments to keep when requesting the next page
+    args = request.args.to_dict(flat=False)
+    args.pop('after', None)
+
+    return conditional.validated(
+        render_template('recipes.html',
+                        recipes=recipes, categories=categories, tags=tags,
+                        filter=filter, day=day, cursor=cursor, args=args),
+        tag, modified)
+
+
+@app.route('/api/recipes')
+@login_required
+def api_recipes():
+    """JSON listing of recipes, paginated by the 'after' cursor."""
+    recipes, cursor = recipe_page(recipe_filter())
+    card = get_template_attribute('macros.html', 'recipe_card')
+
+    results = []
+    for recipe in recipes:
+        results.append({
+            'id': recipe.id,
+            'title': recipe.name,
+            'description': recipe.intro,
+            'category': recipe.category.name if recipe.category else None,
+            'prep_time': recipe.prep_time,
+            'cook_time': recipe.cook_time,
+            'image': images.url(recipe),
+            'link': url_for('recipe', id=recipe.id, name=slugify(recipe.name)),
+            'card': str(card(recipe)),
+        })
+
+    return jsonify({'results': results, 'next': cursor})
+
+
+@app.route('/media/<filename>')
+def media(filename):
+    """Serve a recipe image.
+
+    Content-addressed images never change: they are cacheable forever and
+    their name is their (strong) ETag. In the docker image nginx serves
+    /media itself with the same headers (see nginx/media.conf), this route
+    only serves the development server.
+    """
+    if not images.immutable(filename):
+        if filename.endswith('.tmp'):
+            abort(404)
+        return send_from_directory(images.MEDIA_PATH, filename,
+                                   max_age=images.MUTABLE_MAX_AGE)
+
+    response = send_from_directory(images.MEDIA_PATH, filename,
+                                   etag=filename.rsplit('.', 1)[0],
+                                   max_age=images.IMMUTABLE_MAX_AGE)
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
+
+def upload_image(recipe, file):
+    """Queue an uploaded recipe image for processing."""
+    if not file:
+        return
+    try:
+        images.submit(recipe, file)
+    except images.InvalidImage:
+        LOGGER.warning("Invalid image uploaded for recipe %s", recipe.id)
+        flash('The uploaded file is not a valid image.')
 
 
 @app.route('/recipes/new', methods=["GET", "POST"])
@@ -98,19 +303,12 @@ def recipe_new():
             published = form.publish.data,
         )
         recipe.category = Category.query.filter_by(id=form.category.data).first()
+        recipe.img = 'default.jpg'
         user.recipes.append(UserRecipe(recipe,None, 0))
         session = db.session
         session.add(recipe)
         session.commit()
-        file = form.img.data
-        if file:
-            filename = file.filename.split('.')
-            filename = str(recipe.id) + "." + filename[1]
-            file.save(os.path.join(MEDIA_PATH, filename))
-            recipe.img = filename
-        else:
-            recipe.img = 'default.jpg'
-        session.commit()
+        upload_image(recipe, form.img.data)
         LOGGER.info("Created recipe %s", form.name.data)
         return redirect(url_for('recipe', id=recipe.id))
     else:
@@ -127,50 +325,107 @@ def search():
     query = request.args.get('q')
     result = {'results': []}
 
-    if query:
-        clauses = [Recipe.name.ilike('%{}%'.format(k)) for k in query.split()]
-        recipes = Recipe.query.filter(*clauses).all()
+    state, modified = catalog_state()
+    tag = conditional.etag(query, state)
+    response = conditional.not_modified(tag, modified)
+    if response:
+        return response
+
+    hits = fulltext.ranked(query)
+    if hits is not None:
+        recipes = Recipe.query.options(*loaders()) \
+                              .join(hits, hits.c.id == Recipe.id) \
+                              .order_by(hits.c.score, Recipe.id) \
+                              .limit(SEARCH_LIMIT).all()
         for recipe in recipes:
             result['results'].append({
                 'title': recipe.name,
                 'description': recipe.intro,
-                'image': '/static/food/{}'.format(recipe.img),
+                'image': images.url(recipe, SEARCH_IMAGE_WIDTH),
                 'link': url_for('recipe', id=recipe.id, name=slugify(recipe.name))
             })
 
-    return jsonify(result)
+    return conditional.validated(jsonify(result), tag, modified)
 
 
 @app.route('/recipes/<int:id>')
 @app.route('/recipes/<int:id>/<name>')
 @login_required
 def recipe(id, name=None):
-    recipe = Recipe.query.get_or_404(id)
-    user_recipe = UserRecipe.query.filter_by(recipe_id=id).filter_by(author_id=current_user.get_id()).first()
+    recipe = Recipe.query.options(*loaders()).get_or_404(id)
     slug = slugify(recipe.name)
 
     if slug != name:
         return redirect(url_for('recipe', id=recipe.id, name=slug))
 
-    return render_template('recipe.html', recipe=recipe, user_recipe=user_recipe)
+    user_recipe = UserRecipe.query.filter_by(recipe_id=id).filter_by(author_id=current_user.get_id()).first()
+    similar = recommendations.similar(recipe.id, SIMILAR_LIMIT,
+                                      loaders(joinedload(Recipe.category)))
+    servings = grocerylist.default_servings(current_user.id)
+    modified = max([recipe.updated_at] + [other.updated_at for other in similar])
+    tag = conditional.etag(recipe.id, recipe.version, user_recipe and user_recipe.rating, servings,
+                           *((other.id, other.version) for other in similar))
+    response = conditional.not_modified(tag, modified)
+    if response:
+        return response
+
+    # Amounts are shown for the default servings of the user, a page per
+    # number of servings
+    if servings == recipe.servings or not 1 <= (servings or 0) <= scaling.MAX_SERVINGS:
+        servings = None
+
+    # Relationships and amounts are only needed when the page isn't cached yet
+    amounts = None
+    if fragments.get('page', recipe, servings) is None:
+        Recipe.query.options(*loaders(
+            joinedload(Recipe.category),
+            selectinload(Recipe.tags),
+            selectinload(Recipe.ingredients).joinedload(RecipeIngredient.ingredient)
+        )).populate_existing().filter_by(id=id).one()
+        if servings:
+            amounts = {ingredient['id']: ingredient['text']
+                       for ingredient in scaling.scaled(recipe.id, recipe.version, servings)}
+
+    return conditional.validated(
+        render_template('recipe.html', recipe=recipe, user_recipe=user_recipe, similar=similar,
+                        servings=servings, amounts=amounts,
+                        max_servings=scaling.MAX_SERVINGS),
+        tag, modified)
+
+
+@app.route('/api/recipes/<int:id>/scaled')
+@login_required
+def api_recipe_scaled(id):
+    """Ingredient amounts of a recipe scaled to the given 'servings'."""
+    try:
+        servings = int(request.args['servings'])
+    except (KeyError, ValueError):
+        abort(400)
+    if not 1 <= servings <= scaling.MAX_SERVINGS:
+        abort(400)
+    state = db.session.query(Recipe.version, Recipe.updated_at).filter(Recipe.id == id).first()
+    if state is None:
+        abort(404)
+    version, modified = state
+    tag = conditional.etag(id, version, servings)
+    response = conditional.not_modified(tag, modified)
+    if response:
+        return response
+
+    return conditional.validated(jsonify({
+        'servings': servings,
+        'ingredients': scaling.scaled(id, version, servings),
+    }), tag, modified)
 
 
 @app.route('/recipes/<int:id>', methods=['PATCH'])
 @login_required
 def recipe_update(id):
-    user_recipe = UserRecipe.query.filter_by(recipe_id=id).filter_by(author_id=current_user.get_id()).first()
-    recipe = Recipe.query.get_or_404(id)
-    rating = request.json.get('rating')
-    if user_recipe:
-        if user_recipe.rating == 0:
-            recipe.rating_count += 1
-        user_recipe.rating = rating
-        recipe.rating = (recipe.rating + rating) / float(recipe.rating_count)
-    if not user_recipe:
-        user_recipe = UserRecipe(recipe)
-        user_recipe.rating = rating
-        recipe.rating_count += 1
-        recipe.calc_rating(rating)
+    rating = (request.get_json(silent=True) or {}).get('rating')
+    if not ratings.valid(rating):
+        abort(400)
+    if not ratings.rate(id, current_user.id, rating):
+        abort(404)
     db.session.commit()
     return '', 204
 
@@ -181,12 +436,6 @@ def recipe_edit(id):
     form = RecipeForm()
     form.category.choices = [(cat.id, cat.name) for cat in Category.query.order_by('name')]
     if form.validate_on_submit():
-        file = form.img.data
-        if file:
-            filename = file.filename.split('.')
-            filename = str(recipe.id) + "." + filename[1]
-            file.save(os.path.join(MEDIA_PATH, filename))
-            recipe.img = filename
         recipe.name = form.name.data
         recipe.prep_time = form.prep_time.data
         recipe.cook_time = form.cook_time.data
@@ -198,6 +447,7 @@ def recipe_edit(id):
         
         recipe.category = Category.query.filter_by(id=form.category.data).first()
         db.session.commit()
+        upload_image(recipe, form.img.data)
         LOGGER.info("Changes to recipe %s have been saved", form.name.data)
         return redirect(url_for('recipe', id=recipe.id))
     else:
@@ -207,10 +457,46 @@ def recipe_edit(id):
     return render_template('recipe_edit.html', recipe=recipe, form=form)
 
 
+def grocery_window():
+    """Read the grocery list window from the start and end arguments."""
+    start, end = grocerylist.default_window()
+    try:
+        if request.args.get('start'):
+            start = date.fromisoformat(request.args['start'])
+        if request.args.get('end'):
+            end = date.fromisoformat(request.args['end'])
+    except ValueError:
+        abort(400)
+    return start, end
+
+
 @app.route('/groceries')
 @login_required
 def groceries():
-    return render_template('groceries.html')
+    items = grocerylist.listing(current_user.id)
+
+    return render_template('groceries.html', items=items)
+
+
+@app.route('/api/groceries')
+@login_required
+def api_groceries():
+    """JSON grocery list of the meals of the user and the household planned
+    between start and end."""
+    start, end = grocery_window()
+    items = grocerylist.aggregate(current_user.id, start, end,
+                                  grocerylist.default_servings(current_user.id))
+
+    return jsonify({
+        'start': start.isoformat(),
+        'end': end.isoformat(),
+        'items': [{
+            'id': item.id,
+            'name': item.name,
+            'unit': item.unit,
+            'amount': round(item.amount, 2) if item.amount is not None else None,
+        } for item in items]
+    })
 
 
 @app.route('/pantry')
@@ -218,6 +504,49 @@ def groceries():
 def pantry():
     return render_template('pantry.html')
 
+
+@app.route('/api/pantry/recipes')
+@login_required
+def api_pantry_recipes():
+    """Recipes ranked by the number of ingredients missing from the pantry.
+
+    The pantry are the given 'ingredient' ids, by default all pantry
+    ingredients. At most 'missing' ingredients may be missing.
+    """
+    try:
+        pantry = {int(id) for id in request.args.getlist('ingredient')}
+        missing = int(request.args.get('missing', 2))
+        limit = min(int(request.args.get('limit', PAGE_SIZE)), MAX_PAGE_SIZE)
+    except ValueError:
+        abort(400)
+    if not 0 <= missing <= ingredientindex.MAX_MISSING or limit < 1:
+        abort(400)
+    if not pantry:
+        pantry = {id for id, in db.session.query(Ingredient.id).filter(Ingredient.pantry)}
+
+    ranked, counts = ingredientindex.match(pantry, missing, limit)
+    ids = [id for id, count in ranked]
+    recipes = {recipe.id: recipe for recipe in Recipe.query.options(*loaders())
+               .filter(Recipe.id.in_(ids))}
+    lacking = defaultdict(list)
+    for recipe_id, ingredient_id, name in db.session.query(
+            RecipeIngredient.recipe_id, Ingredient.id, Ingredient.name) \
+            .join(Ingredient, Ingredient.id == RecipeIngredient.ingredient_id) \
+            .filter(RecipeIngredient.recipe_id.in_(ids)):
+        if ingredient_id not in pantry:
+            lacking[recipe_id].append(name)
+
+    return jsonify({
+        'counts': counts,
+        'results': [{
+            'id': id,
+            'title': recipes[id].name,
+            'image': images.url(recipes[id], SEARCH_IMAGE_WIDTH),
+            'link': url_for('recipe', id=id, name=slugify(recipes[id].name)),
+            'missing': sorted(lacking[id]),
+        } for id, count in ranked if id in recipes]
+    })
+
 @app.route('/profile', methods=['GET', 'PATCH'])
 @login_required
 def profile():
@@ -230,64 +559,41 @@ def profile():
         if request.json.get('email'):
             user.email = request.json.get('email')
         settings = request.json.get('settings')
-        LOGGER.debug("These are the recieved settings: %s", settings)
+        changed = set()
         if settings:
-            user.settings = []
+            pairs = []
             for setting in settings:
-                LOGGER.debug("The individual setting: %s", setting)
-                try:
-                    k = str(next(iter(setting)))
-                    LOGGER.debug("Name: %s", k)
-                    v = setting[k]
-                    LOGGER.debug("Value: %s", v)
-                    if v:
-                        setting = Setting.query.filter_by(name=k).filter_by(value=v).first()
-                        if setting is None:
-                            setting = Setting(k, v)
-                        LOGGER.debug("Setting Object: %s", setting)
-                    else:
-                        LOGGER.debug("Skipping due to no value")
-                        continue
-                except:
-                    LOGGER.error("Setting query hit an exception!")
-                try:
-                    user.settings.append(setting)
-                except:
-                    LOGGER.error("Could not append to user settings")
+                if not isinstance(setting, dict) or not setting:
+                    LOGGER.warning("Skipped invalid setting %r", setting)
+                    continue
+                name, value = next(iter(setting.items()))
+                if value:
+                    pairs.append((str(name), value))
+            changed = usersettings.save(user.id, pairs)
+            db.session.expire(user, ['settings'])
         db.session.commit()
+        usersettings.invalidate(user.id)
+        if 'default_servings' in changed:
+            # Meals without servings follow the default servings
+            grocerylist.rebuild(user.id)
+            db.session.commit()
         return 'Settings saved', 204
-    return render_template('profile.html', user=user)
+
+    user_recipes = UserRecipe.query.options(*loaders(
+        joinedload(UserRecipe.recipe).joinedload(Recipe.category)
+    )).filter_by(author_id=user.id).all()
+    return render_template('profile.html', user=user, user_recipes=user_recipes)
     
 @app.route('/settings')
 @login_required
 def settings():
     user = current_user
 
-    count = {
-      'recipes': Recipe.query.count(),
-      'ingredients': Ingredient.query.count(),
-      'tags': Tag.query.count(),
-      'categories': Category.query.count()
-    }
-
-    # Query all settings and create a dict with the setting's name as key
-    settings = dict()
-    for s in user.settings:
-        name = s.name
-        if s.name in settings.keys():
-            if not isinstance(settings[name], str):
-                settings[name].append(s.value)
-            else:
-                settings[name] = [settings[name], s.value]
-            LOGGER.debug("Setting list: %s", settings[name])
-        else:
-            settings[name] = s.value
+    count = stats.summary()
 
+    # All settings as dict with the setting's name as key
+    settings = usersettings.effective(user.id)
     settings['available_languages'] = app.config['LANGUAGES']
-    for k, v in SETTING_DEFAULTS.items():
-        if k in settings:
-            continue
-        settings[k] = v
 
     return render_template('settings.html',
                            user=user, count=count, settings=settings)
@@ -370,184 +676,3 @@ def register():
 def logout():
     logout_user()
     return redirect(url_for('home'))
-
-
-@app.route('/generator', methods=['GET', 'POST'])
-def generator():
-    # Clear up database first
-    User.query.delete()
-    Setting.query.delete()
-    Category.query.delete()
-    Tag.query.delete()
-    Recipe.query.delete()
-    Ingredient.query.delete()
-    RecipeIngredient.query.delete()
-    Meal.query.delete()
-
-    grocery_day             = Setting('grocery_day', 'sat')
-    default_servings        = Setting('default_servings', '2')
-    allow_user_registration = Setting('allow_user_registration', 'true')
-    default_language        = Setting('default_language', 'en')
-
-    starter   = Category('Starter')
-    main      = Category('Main')
-    side_dish = Category('Side dish')
-    desert    = Category('Desert')
-    breakfast = Category('Breakfast')
-    lunch     = Category('Lunch')
-
-    vegetarian = Tag('Vegetarian')
-    indian     = Tag('Indian')
-    italian    = Tag('Italian')
-    moroccan   = Tag('Moroccan')
-    lactose    = Tag('Lactose free')
-
-    recipe1 = Recipe(
-        name='Fish curry', author="SueChef", servings=4, prep_time=15, cook_time=30,
-        category=main, intro='A delicious but simple curry', description="""
-            a description.""",
-        directions="""Wash and cook the rice.\n\nStart with oil and fry the
-            paste for 5 minutes. Add the fish and coconut milk. Poach fish until
-            tender. Finalize with coriander.""")
-
-    rice = Ingredient('Rice', 'g')
-    paste = Ingredient('Curry paste', 'ts')
-    fish = Ingredient('White fish', 'g')
-    coconut = Ingredient('Coconut milk', 'ml')
-    coriander = Ingredient('Coriander', 'g')
-
-    recipe1.ingredients.append(RecipeIngredient(rice, 320))
-    recipe1.ingredients.append(RecipeIngredient(paste, 3, 0.75))
-    recipe1.ingredients.append(RecipeIngredient(fish, 400))
-    recipe1.ingredients.append(RecipeIngredient(coconut, 150))
-    recipe1.ingredients.append(RecipeIngredient(coriander, 20))
-
-    recipe2 = Recipe(name='Pasta something', author="SueChef", servings=4, prep_time=20, cook_time=15, category=main,
-        intro='Quick pasta for a working day meal', description="""
-            a description.""",
-        directions="Start with bla bla and then\nDo some more steps\n\nEnjoy!")
-
-    recipe3 = Recipe(name='Weekend tajine', author="SueChef", servings=4, prep_time=30, cook_time=60, category=main,
-        intro='Something truly the waiting for during a weekend', description="""
-            a description.""",
-        directions="Start with bla bla and then\nDo some more steps\n\nEnjoy!")
-
-    recipe4 = Recipe(name='Fish curry', author="SueChef", servings=4, prep_time=15, cook_time=30, category=main,
-        intro='A delicious but simple curry', description="""
-            a description.""",
-        directions="Start with bla bla and then\nDo some more steps\n\nEnjoy!")
-
-    recipe5 = Recipe(name='Pasta something', author="SueChef", servings=4, prep_time=20, cook_time=15, category=main,
-        intro='Quick pasta for a working day meal', description="""
-            a description.""",
-        directions="Start with bla bla and then\nDo some more steps\n\nEnjoy!")
-
-    recipe6 = Recipe(name='Weekend tajine', author="SueChef", servings=4, prep_time=30, cook_time=60, category=main,
-        intro='Something truly the waiting for during a weekend', description="""
-            a description.""",
-        directions="Start with bla bla and then\nDo some more steps\n\nEnjoy!")
-
-    recipe7 = Recipe(name='Fish curry', author="SueChef", servings=4, prep_time=15, cook_time=30, category=main,
-        intro='A delicious but simple curry', description="""
-            a description.""",
-        directions="Start with bla bla and then\nDo some more steps\n\nEnjoy!")
-
-    recipe8 = Recipe(name='Pasta something', author="SueChef", servings=4, prep_time=20, cook_time=15, category=main,
-        intro='Quick pasta for a working day meal', description="""
-            a description.""",
-        directions="Start with bla bla and then\nDo some more steps\n\nEnjoy!")
-
-    recipe9 = Recipe(name='Weekend tajine', author="SueChef", servings=4, prep_time=30, cook_time=60, category=main,
-        intro='Something truly the waiting for during a weekend', description="""
-            a description.""",
-        directions="Start with bla bla and then\nDo some more steps\n\nEnjoy!")
-
-    recipe10 = Recipe(name='Fish curry', author="SueChef", servings=4, prep_time=15, cook_time=30, category=main,
-        intro='A delicious but simple curry', description="""
-            a description.""",
-        directions="Start with bla bla and then\nDo some more steps\n\nEnjoy!")
-
-    recipe11 = Recipe(name='Zaalouk', author="SueChef", servings=4, prep_time=15, cook_time=0, category=side_dish,
-        intro='Moroccan Vegetable side dish', description="""
-            a description.""",
-        directions="Cut the eggplants to cubes, if you like you can peel the eggplant not completely you leave some skin on them for the dark look.\n\nCut the tomato to fine slices")
-
-    recipe12 = Recipe(name='A very long title with multiple words', author="SueChef", servings=4, prep_time=30, cook_time=60, category=main,
-        intro='Something truly the waiting for during a weekend', description="""
-            a description.""",
-        directions="Start with bla bla and then\nDo some more steps\n\nEnjoy!")
-
-    session = db.session
-    session.add(grocery_day)
-    session.add(default_servings)
-    session.add(allow_user_registration)
-    session.add(default_language)
-    session.add(starter)
-    session.add(main)
-    session.add(side_dish)
-    session.add(desert)
-    session.add(breakfast)
-    session.add(lunch)
-    session.add(vegetarian)
-    session.add(indian)
-    session.add(italian)
-    session.add(moroccan)
-    session.add(lactose)
-    session.add(recipe1)
-    session.add(recipe2)
-    session.add(recipe3)
-    session.add(recipe4)
-    session.add(recipe5)
-    session.add(recipe6)
-    session.add(recipe7)
-    session.add(recipe8)
-    session.add(recipe9)
-    session.add(recipe10)
-    session.add(recipe11)
-    session.add(recipe12)
-
-    session.commit()
-
-    recipe1.tags.append(indian)
-    recipe1.tags.append(lactose)
-
-    recipe11.tags.append(moroccan)
-    
-    recipe1.img = 'default.jpg'
-    recipe2.img = 'default.jpg'
-    recipe3.img = 'default.jpg'
-    recipe4.img = 'default.jpg'
-    recipe5.img = 'default.jpg'
-    recipe6.img = 'default.jpg'
-    recipe7.img = 'default.jpg'
-    recipe8.img = 'default.jpg'
-    recipe9.img = 'default.jpg'
-    recipe10.img = 'default.jpg'
-    recipe11.img = 'default.jpg'
-    recipe12.img = 'default.jpg'
-
-    session.commit()
-
-    today = Meal(date.today(), recipe1)
-    tomorrow = Meal(date.today() + timedelta(days=1), recipe2)
-    tomorrow1 = Meal(date.today() + timedelta(days=1), name='Green salad', note='Use rocket salad from yesterday')
-    tomorrow2 = Meal(date.today() + timedelta(days=2),
-                     name='Rösti with lamb and red cabbage',
-                     note='Rösti from freezer, check lamb first!')
-    tomorrow3 = Meal(date.today() + timedelta(days=3), recipe3, servings=4)
-    tomorrow4 = Meal(date.today() + timedelta(days=4), name='Chicken biryani')
-    tomorrow5 = Meal(date.today() + timedelta(days=5), recipe9)
-    tomorrow6 = Meal(date.today() + timedelta(days=5), recipe11)
-
-    session.add(today)
-    session.add(tomorrow)
-    session.add(tomorrow1)
-    session.add(tomorrow2)
-    session.add(tomorrow3)
-    session.add(tomorrow4)
-    session.add(tomorrow5)
-    session.add(tomorrow6)
-
-    session.commit()
-
-    return redirect(url_for('home'))